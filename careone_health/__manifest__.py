@@ -3,7 +3,7 @@
 
 {
     'name': "CareOne Health Application",
-    'version': '2.0',
+    'version': '2.7',
     'category': '',
     "sequence":-1,
     'summary': 'Application developed for careone integration with EMR',
@@ -18,14 +18,19 @@
         'views/patient_view.xml',
         'views/patient_evaluation_form_view.xml',
         'views/patient_admission_view.xml',
+        'views/patient_medical_bed_views.xml',
+        'views/patient_early_warning_views.xml',
+        'views/patient_duplicate_views.xml',
         'views/patient_evaluation.xml',
         'views/pharmacy_config_stage_views.xml',
         'views/pharmacy_stock_batch_views.xml',
         'views/product_product_views.xml',
+        'views/patient_import_job_views.xml',
         'data/ir_sequence_data.xml',
         'security/security.xml',
         'security/ir.model.access.csv',
-        'data/ir_sequence_data.xml'
+        'data/ir_sequence_data.xml',
+        'data/ir_cron.xml',
     ],
     
     'installable': True,
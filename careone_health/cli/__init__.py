@@ -0,0 +1,2 @@
+from . import import_patients
+from . import benchmark_evaluations
@@ -0,0 +1,78 @@
+# cli/benchmark_evaluations.py
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from odoo.cli import Command
+from odoo.sql_db import db_connect
+from odoo.tools import config
+
+# the queries behind the evaluation list view, a search-view lookup and the
+# ORM prefetch of a record; plain SQL on patient_medical_evaluation only, so
+# the same command measures the table before and after its sections are split
+BENCHMARK_QUERIES = [
+    ('list', """
+        SELECT id, patient_id, evaluation_no, severity, evaluation_type, chief_complaint, state
+          FROM patient_medical_evaluation
+      ORDER BY id DESC
+         LIMIT 80
+    """),
+    ('search', """
+        SELECT id
+          FROM patient_medical_evaluation
+         WHERE description ILIKE %(term)s OR evaluation_no ILIKE %(term)s
+      ORDER BY id DESC
+         LIMIT 80
+    """),
+    ('prefetch', """
+        SELECT *
+          FROM patient_medical_evaluation
+      ORDER BY id DESC
+         LIMIT 1000
+    """),
+    ('seq scan', """
+        SELECT state, count(*)
+          FROM patient_medical_evaluation
+      GROUP BY state
+    """),
+]
+
+
+class BenchmarkEvaluations(Command):
+    """Time list, search and scan queries on patient_medical_evaluation"""
+    name = 'careone_benchmark_evaluations'
+
+    def run(self, args):
+        parser = argparse.ArgumentParser(
+            prog='%s %s' % (sys.argv[0].split(os.path.sep)[-1], self.name),
+            description=self.__doc__,
+        )
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='runs of each query; the median is reported')
+        parser.add_argument('--term', default='pain', help='text searched by the search query')
+        opts, odoo_args = parser.parse_known_args(args)
+
+        config.parse_config(odoo_args)
+        if not config['db_name']:
+            parser.error('a database is required (-d)')
+        with db_connect(config['db_name']).cursor() as cr:
+            cr.execute("""
+                SELECT count(*), pg_total_relation_size('patient_medical_evaluation'),
+                       coalesce(avg(pg_column_size(e.*)), 0)
+                  FROM patient_medical_evaluation e
+            """)
+            rows, size, width = cr.fetchone()
+            print('patient_medical_evaluation: %s rows, %.1f MB, average row %.0f bytes' % (
+                rows, size / 1024.0 / 1024.0, width))
+            params = {'term': '%%%s%%' % opts.term}
+            for label, query in BENCHMARK_QUERIES:
+                timings = []
+                for dummy in range(opts.iterations):
+                    started = time.perf_counter()
+                    cr.execute(query, params)
+                    cr.fetchall()
+                    timings.append((time.perf_counter() - started) * 1000)
+                print('%-10s median %8.2f ms   min %8.2f ms' % (
+                    label, statistics.median(timings), min(timings)))
@@ -0,0 +1,55 @@
+# cli/import_patients.py
+import argparse
+import os
+import sys
+
+import odoo
+from odoo.cli import Command
+from odoo.modules.registry import Registry
+from odoo.tools import config
+
+
+class ImportPatients(Command):
+    """Stream a CSV or JSON Lines file of patients into res.partner"""
+    name = 'careone_import_patients'
+
+    def run(self, args):
+        parser = argparse.ArgumentParser(
+            prog='%s %s' % (sys.argv[0].split(os.path.sep)[-1], self.name),
+            description=self.__doc__,
+        )
+        parser.add_argument('--file', dest='file_path', help='CSV or JSONL file to import')
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'jsonl'],
+                            help='file format, guessed from the extension by default')
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=1000,
+                            help='patients created and committed per chunk')
+        parser.add_argument('--resume', dest='job_id', type=int,
+                            help='resume the given import job from its last checkpoint')
+        opts, odoo_args = parser.parse_known_args(args)
+        if not opts.file_path and not opts.job_id:
+            parser.error('one of --file or --resume is required')
+
+        config.parse_config(odoo_args)
+        if not config['db_name']:
+            parser.error('a database is required (-d)')
+        registry = Registry(config['db_name'])
+        with registry.cursor() as cr:
+            env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+            Job = env['patient.import.job']
+            if opts.job_id:
+                job = Job.browse(opts.job_id).exists()
+                if not job:
+                    parser.error('import job %s not found' % opts.job_id)
+            else:
+                file_path = os.path.abspath(opts.file_path)
+                file_format = opts.file_format or ('jsonl' if file_path.endswith(('.jsonl', '.json')) else 'csv')
+                job = Job.create({
+                    'file_path': file_path,
+                    'file_format': file_format,
+                    'chunk_size': opts.chunk_size,
+                })
+                cr.commit()
+            job.run()
+            print('%s: %s, %s rows processed, %s created, %s failed, %.1f rows/s (job id %s)' % (
+                job.name, job.state, job.rows_done, job.rows_created, job.rows_failed,
+                job.rows_per_second, job.id))
@@ -10,6 +10,8 @@ from datetime import datetime
 import werkzeug.wrappers
 import functools
 
+from ..models.patient_medical_vital_sign import get_vital_sign_buffer
+
 _logger = logging.getLogger(__name__)
 
 def invalid_response(typ, message=None, status=401):
@@ -258,6 +260,66 @@ class PharmacyAPIController(http.Controller):
             _logger.error(f"Error fetching prescription lines: {str(e)}")
             return self._error_response(str(e))
     
+    @validate_token
+    @http.route('/api/v1/refills/due', type='http', auth='public', methods=['GET'], csrf=False)
+    def get_refills_due(self, **params):
+        """
+        GET /api/v1/refills/due
+        Description: Get prescription lines due for a refill or pending dispensing
+        
+        Parameters:
+        - branch_id (optional): Pharmacy branch ID
+        - within_days (optional): Due window in days from now (default 7)
+        - limit (optional): Maximum number of lines to return (default 200)
+        - offset (optional): Number of lines to skip (default 0)
+        
+        Returns:
+        - List of due lines ordered by expected_next_visit
+        
+        Example:
+        GET /api/v1/refills/due?branch_id=2&within_days=3
+        """
+        try:
+            lines = request.env['pharmacy.prescription.line'].sudo().get_refills_due(
+                branch_id=int(params['branch_id']) if params.get('branch_id') else None,
+                within_days=int(params.get('within_days') or 7),
+                limit=int(params.get('limit') or 200),
+                offset=int(params.get('offset') or 0),
+            )
+            
+            data = []
+            for line in lines:
+                data.append({
+                    'id': line.id,
+                    'history_id': {
+                        'id': line.history_id.id,
+                        'name': line.history_id.name,
+                        'branch_id': line.history_id.branch_id.id,
+                        'patient_id': {
+                            'id': line.history_id.patient_id.id,
+                            'name': line.history_id.patient_id.name,
+                            'patient_no': line.history_id.patient_id.patient_no,
+                            'phone': line.history_id.patient_id.phone,
+                        }
+                    } if line.history_id else None,
+                    'product_id': {
+                        'id': line.product_id.id,
+                        'name': line.product_id.name,
+                    },
+                    'quantity': line.quantity,
+                    'expected_next_visit': line.expected_next_visit.isoformat() if line.expected_next_visit else None,
+                    'end_date': line.end_date.isoformat() if line.end_date else None,
+                    'is_dispensed': line.is_dispensed,
+                    'refills_allowed': line.refills_allowed,
+                    'refills_remaining': line.refills_remaining,
+                    'refill_reminder_date': line.refill_reminder_date.isoformat() if line.refill_reminder_date else None,
+                })
+            
+            return self._success_response(data)
+        except Exception as e:
+            _logger.error(f"Error fetching refills due: {str(e)}")
+            return self._error_response(str(e))
+    
     @validate_token
     @http.route('/api/v1/partners', type='http', auth='public', methods=['GET'], csrf=False)
     def get_partners(self, **params):
@@ -393,6 +455,190 @@ class PharmacyAPIController(http.Controller):
             _logger.error(f"Error fetching pharmacy history: {str(e)}")
             return self._error_response(str(e))
     
+    @validate_token
+    @http.route('/api/v1/patients/<int:patient_id>/vitals', type='http', auth='public', methods=['GET'], csrf=False)
+    def get_patient_vitals(self, patient_id, **params):
+        """
+        GET /api/v1/patients/<patient_id>/vitals
+        Description: Vital signs time series of a patient
+        
+        Parameters:
+        - from (required): Start datetime (YYYY-MM-DD HH:MM:SS)
+        - to (optional): End datetime (default now)
+        - bucket (optional): Downsampling bucket, e.g. 300, 30s, 5m, 1h, 1d.
+          Without it the raw readings are returned.
+        
+        Returns:
+        - Raw readings, or one point per bucket with readings count and
+          <vital>_min, <vital>_max, <vital>_avg for temp, systolic, diastolic,
+          heart_rate, respiratory and oxy_saturate
+        
+        Example:
+        GET /api/v1/patients/45/vitals?from=2024-01-01 00:00:00&to=2024-01-31 00:00:00&bucket=1h
+        """
+        try:
+            if not params.get('from'):
+                return self._error_response("The 'from' parameter is required")
+            series = request.env['patient.vitalsigns'].sudo().get_series(
+                patient_id,
+                params['from'],
+                params.get('to') or datetime.now(),
+                bucket=params.get('bucket'),
+            )
+            return self._success_response(series)
+        except Exception as e:
+            _logger.error(f"Error fetching patient vitals: {str(e)}")
+            return self._error_response(str(e))
+
+    @validate_token
+    @http.route('/api/v1/patients/<int:patient_id>/timeline', type='http', auth='public', methods=['GET'], csrf=False)
+    def get_patient_timeline(self, patient_id, **params):
+        """
+        GET /api/v1/patients/<patient_id>/timeline
+        Description: Clinical timeline of a patient, newest first: evaluations,
+        vital signs, admissions, prescriptions and medical history in one stream
+
+        Parameters:
+        - limit (optional): Events per page (default 50, max 500)
+        - cursor (optional): next_cursor of the previous page
+        - types (optional): Comma-separated subset of evaluation, vitals,
+          admission, prescription, history
+
+        Returns:
+        - events: type, id, timestamp and data of each event
+        - next_cursor: cursor of the next page, null on the last page
+
+        Example:
+        GET /api/v1/patients/45/timeline?limit=20
+        GET /api/v1/patients/45/timeline?limit=20&cursor=2024-01-15T10:30:00|vitals|981
+        """
+        try:
+            patient = request.env['res.partner'].sudo().browse(patient_id).exists()
+            if not patient:
+                return self._error_response("Patient not found", status=404)
+            timeline = patient.get_timeline(
+                limit=min(int(params.get('limit', 50)), 500),
+                cursor=params.get('cursor'),
+                types=params['types'].split(',') if params.get('types') else None,
+            )
+            return self._success_response(timeline)
+        except Exception as e:
+            _logger.error(f"Error fetching patient timeline: {str(e)}")
+            return self._error_response(str(e))
+
+    @validate_token
+    @http.route('/api/v1/search/notes', type='http', auth='public', methods=['GET'], csrf=False)
+    def search_clinical_notes(self, **params):
+        """
+        GET /api/v1/search/notes
+        Description: Ranked full-text search in clinical notes, restricted to
+        the branches of the token user
+
+        Parameters:
+        - q (required): Search text; supports "quoted phrases", OR and -excluded words
+        - type (optional): evaluation or prescription (default evaluation)
+        - branch_id (optional): Branch ID, within the branches of the user
+        - limit (optional): Number of results (default 20, max 100)
+        - offset (optional): Number of results to skip
+
+        Searched fields:
+        - evaluation: chief_complaint, disease, info_diagnosis_discharge, hpi,
+          notes_complaint, treatment_plan
+        - prescription: diagnosis, notes
+
+        Returns:
+        - List of matches, best first, with rank and a highlighted snippet
+
+        Example:
+        GET /api/v1/search/notes?q=chest pain -trauma&type=evaluation&limit=10
+        """
+        try:
+            if not params.get('q'):
+                return self._error_response("The 'q' parameter is required")
+            models = {
+                'evaluation': 'patient.medical.evaluation',
+                'prescription': 'res.patient.pharmacy.history',
+            }
+            search_type = params.get('type', 'evaluation')
+            if search_type not in models:
+                return self._error_response("'type' must be evaluation or prescription")
+            Model = request.env[models[search_type]].sudo()
+            matches = Model.search_clinical_text(
+                params['q'],
+                branch_ids=[int(params['branch_id'])] if params.get('branch_id') else None,
+                limit=min(int(params.get('limit', 20)), 100),
+                offset=int(params.get('offset', 0)),
+            )
+            records = Model.browse([match['id'] for match in matches])
+            data = []
+            for match, rec in zip(matches, records):
+                date = rec.evaluation_start_date if search_type == 'evaluation' else rec.date
+                data.append({
+                    'type': search_type,
+                    'id': rec.id,
+                    'reference': rec.evaluation_no if search_type == 'evaluation' else rec.name,
+                    'patient_id': {
+                        'id': rec.patient_id.id,
+                        'name': rec.patient_id.name,
+                    } if rec.patient_id else None,
+                    'branch_id': rec.branch_id.id or None,
+                    'date': date.isoformat() if date else None,
+                    'rank': match['rank'],
+                    'snippet': match['snippet'],
+                })
+            return self._success_response(data)
+        except Exception as e:
+            _logger.error(f"Error searching clinical notes: {str(e)}")
+            return self._error_response(str(e))
+
+    @validate_token
+    @http.route('/api/v1/cohorts', type='http', auth='public', methods=['GET'], csrf=False)
+    def get_patient_cohort(self, **params):
+        """
+        GET /api/v1/cohorts
+        Description: Patient cohort count with breakdowns, computed in one aggregate query
+
+        Parameters (all optional, lists are comma-separated):
+        - age_min, age_max: Age range in years, from the date of birth
+        - gender: e.g. Female
+        - genotype: e.g. as,ss
+        - blood_group: e.g. o_pos,o_neg
+        - branch_id: Branch IDs
+        - condition_ids: Chronic condition IDs; patients must have all of them
+        - allergy_ids: Allergy IDs; patients must have all of them
+        - breakdowns: Any of gender, genotype, blood_group, branch, condition, allergy, age_band
+        - age_bands: Lower bounds of the age bands (default 0,5,18,36,60)
+
+        Returns:
+        - count and, per breakdown, the count of each value with its label
+
+        Example:
+        GET /api/v1/cohorts?genotype=as&age_min=18&age_max=35&condition_ids=4&branch_id=2&breakdowns=gender,age_band
+        """
+        try:
+            def split(name, cast=str):
+                return [cast(value) for value in params[name].split(',') if value] if params.get(name) else []
+
+            filters = {
+                'age_min': int(params['age_min']) if params.get('age_min') else None,
+                'age_max': int(params['age_max']) if params.get('age_max') else None,
+                'gender': split('gender'),
+                'genotype': split('genotype'),
+                'blood_group': split('blood_group'),
+                'branch_ids': split('branch_id', int),
+                'condition_ids': split('condition_ids', int),
+                'allergy_ids': split('allergy_ids', int),
+            }
+            cohort = request.env['res.partner'].sudo().get_cohort(
+                filters,
+                breakdowns=split('breakdowns'),
+                age_bands=split('age_bands', int) or None,
+            )
+            return self._success_response(cohort)
+        except Exception as e:
+            _logger.error(f"Error computing patient cohort: {str(e)}")
+            return self._error_response(str(e))
+
     @validate_token
     @http.route('/api/v1/journals', type='http', auth='public', methods=['GET'], csrf=False)
     def get_journals(self, **params):
@@ -672,6 +918,52 @@ class PharmacyAPIController(http.Controller):
             _logger.error(f"Error fetching branches: {str(e)}")
             return self._error_response(str(e))
     
+    @validate_token
+    @http.route('/api/v1/census', type='http', auth='public', methods=['GET'], csrf=False)
+    def get_ward_census(self, **params):
+        """
+        GET /api/v1/census
+        Description: Real-time ward census per branch
+        
+        Parameters:
+        - branch_id (optional): Branch ID; also returns the occupied beds of the branch
+        
+        Returns:
+        - Per branch: beds_total, beds_free, beds_occupied, beds_dirty, occupancy_rate,
+          inpatients, avg_length_of_stay_days, max_length_of_stay_days, pending_discharges
+        
+        Example:
+        GET /api/v1/census
+        GET /api/v1/census?branch_id=2
+        """
+        try:
+            branch_ids = [int(params['branch_id'])] if params.get('branch_id') else None
+            data = {
+                'branches': request.env['patient.medical.admission'].sudo().get_ward_census(branch_ids),
+            }
+            if branch_ids:
+                beds = request.env['patient.medical.bed'].sudo().search([
+                    ('branch_id', 'in', branch_ids), ('state', '=', 'occupied')])
+                data['occupied_beds'] = [{
+                    'bed_id': bed.id,
+                    'bed': bed.name,
+                    'room': bed.room_id.name,
+                    'ward': bed.room_id.ward,
+                    'admission_id': bed.admission_id.id,
+                    'patient_id': {
+                        'id': bed.patient_id.id,
+                        'name': bed.patient_id.name,
+                        'patient_no': bed.patient_id.patient_no,
+                    } if bed.patient_id else None,
+                    'occupied_since': bed.occupied_since.isoformat() if bed.occupied_since else None,
+                    'discharge_date': bed.admission_id.discharge_date.isoformat() if bed.admission_id.discharge_date else None,
+                } for bed in beds]
+            
+            return self._success_response(data)
+        except Exception as e:
+            _logger.error(f"Error fetching ward census: {str(e)}")
+            return self._error_response(str(e))
+    
     @validate_token
     @http.route('/api/v1/pharmacy-stages', type='http', auth='public', methods=['GET'], csrf=False)
     def get_pharmacy_stages(self, **params):
@@ -1298,6 +1590,175 @@ class PharmacyAPIController(http.Controller):
                 'data': None
             }
     
+    @validate_token
+    @http.route('/api/v1/partners/import', type='http', auth='public', methods=['POST'], csrf=False)
+    def import_partners(self, **params):
+        """
+        POST /api/v1/partners/import
+        Description: Bulk import patients from a CSV or JSON Lines file
+        
+        Request (multipart/form-data, or the raw file as request body):
+        - file: CSV (header row) or JSONL (one patient object per line)
+        - format (optional): csv or jsonl (default csv)
+        - chunk_size (optional): Patients per committed chunk (default 1000)
+        
+        Columns / keys: first_name, middle_name, last_name, gender, dob, phone,
+        mobile, email, street, city, blood_group, genotype, branch (id, name or code),
+        allergies and chronic_conditions (';'-separated in CSV, lists in JSONL),
+        next_of_kin (list in JSONL) or next_of_kin_first_name, ... columns in CSV
+        
+        Returns:
+        - The import job; it runs in the background and resumes after failures
+        
+        Example:
+        curl -H "token: ..." -F file=@patients.jsonl -F format=jsonl /api/v1/partners/import
+        """
+        try:
+            upload = request.httprequest.files.get('file')
+            stream = upload.stream if upload else request.httprequest.stream
+            job_vals = {}
+            if params.get('chunk_size'):
+                job_vals['chunk_size'] = int(params['chunk_size'])
+            job = request.env['patient.import.job'].sudo().create_from_stream(
+                stream, params.get('format', 'csv'), **job_vals)
+            request.env.ref('careone_health.ir_cron_patient_import').sudo()._trigger()
+            return self._success_response(self._import_job_data(job), message="Import queued")
+        except Exception as e:
+            _logger.error(f"Error importing partners: {str(e)}")
+            return self._error_response(str(e))
+    
+    @validate_token
+    @http.route('/api/v1/partners/import/<int:job_id>', type='http', auth='public', methods=['GET'], csrf=False)
+    def get_import_partners(self, job_id, **params):
+        """
+        GET /api/v1/partners/import/<job_id>
+        Description: Progress of a bulk patient import
+        
+        Example:
+        GET /api/v1/partners/import/12
+        """
+        try:
+            job = request.env['patient.import.job'].sudo().browse(job_id).exists()
+            if not job:
+                return self._error_response("Import job not found", status=404)
+            return self._success_response(self._import_job_data(job))
+        except Exception as e:
+            _logger.error(f"Error fetching import job: {str(e)}")
+            return self._error_response(str(e))
+    
+    def _import_job_data(self, job):
+        return {
+            'id': job.id,
+            'name': job.name,
+            'state': job.state,
+            'rows_done': job.rows_done,
+            'rows_created': job.rows_created,
+            'rows_failed': job.rows_failed,
+            'rows_per_second': job.rows_per_second,
+        }
+    
+    @validate_token
+    @http.route('/api/v1/vitals/ingest', type='http', auth='public', methods=['POST'], csrf=False)
+    def ingest_vitals(self, **params):
+        """
+        POST /api/v1/vitals/ingest
+        Description: Batched vital-sign ingestion for bedside monitors
+        
+        Request Body (JSON):
+        {
+            "readings": [
+                {
+                    "patient_id": 45,
+                    "evaluation_id": 12,            (optional, defaults to the open evaluation)
+                    "time": "2024-01-15 10:30:00",  (optional, defaults to now, UTC)
+                    "temp": 37.2,
+                    "systolic": 120,
+                    "diastolic": 80,
+                    "heart_rate": 72,
+                    "respiratory": 16,
+                    "oxy_saturate": 98
+                }
+            ]
+        }
+        
+        Parameters:
+        - buffered (optional): 1 to queue the readings in the worker's ingestion
+          buffer and answer at once. Buffered readings are written within about
+          5 seconds; they are lost if the worker stops before, so a monitor
+          using it must tolerate losing the last seconds of readings.
+        
+        Returns:
+        - 202 with the number of accepted readings and the rejected ones by index.
+          Unless buffered, the accepted readings are committed before answering.
+        - 503 when the ingestion buffer is full (retry later)
+        """
+        try:
+            data = json.loads(request.httprequest.data or b'{}')
+            readings = data.get('readings') if isinstance(data, dict) else data
+            if not isinstance(readings, list):
+                return self._error_response("'readings' must be a list")
+            VitalSigns = request.env['patient.vitalsigns'].sudo()
+            rows, errors = VitalSigns._prepare_readings(readings)
+            result = {
+                'accepted': len(rows),
+                'rejected': [{'index': index, 'message': message} for index, message in errors],
+            }
+            if params.get('buffered') not in ('1', 'true'):
+                # committed with the request, before the response is sent
+                VitalSigns._insert_readings(rows)
+            elif rows and not get_vital_sign_buffer(request.env.cr.dbname).add(rows):
+                return Response(
+                    json.dumps({'status': 'error', 'message': 'Ingestion buffer full, retry later', 'data': None}),
+                    status=503, mimetype='application/json', headers=[('Retry-After', '5')])
+            return Response(
+                json.dumps({'status': 'success', 'message': 'Readings accepted', 'data': result}),
+                status=202, mimetype='application/json')
+        except Exception as e:
+            _logger.error(f"Error ingesting vitals: {str(e)}")
+            return self._error_response(str(e))
+
+    @validate_token
+    @http.route('/api/v1/patients/deteriorating', type='http', auth='public', methods=['GET'], csrf=False)
+    def get_deteriorating_patients(self, **params):
+        """
+        GET /api/v1/patients/deteriorating
+        Description: Patients whose latest early warning score (NEWS2-style) is at
+        or above a threshold, worst first
+
+        Parameters:
+        - min_score (optional): Minimum score (default 5)
+        - branch_id (optional): Branch ID
+        - limit (optional): Maximum number of patients (default 100)
+
+        Returns:
+        - List of patients with their latest score, risk and reading time
+
+        Example:
+        GET /api/v1/patients/deteriorating?min_score=7&branch_id=2
+        """
+        try:
+            latest = request.env['patient.ews.latest'].sudo().get_deteriorating(
+                min_score=int(params.get('min_score', 5)),
+                branch_id=int(params['branch_id']) if params.get('branch_id') else None,
+                limit=int(params.get('limit', 100)),
+            )
+            data = [{
+                'patient_id': {
+                    'id': rec.patient_id.id,
+                    'name': rec.patient_id.name,
+                    'patient_no': rec.patient_id.patient_no,
+                },
+                'evaluation_id': rec.evaluation_id.id or None,
+                'branch_id': rec.branch_id.id or None,
+                'score': rec.score,
+                'risk': rec.risk,
+                'time': rec.time.isoformat() if rec.time else None,
+            } for rec in latest]
+            return self._success_response(data)
+        except Exception as e:
+            _logger.error(f"Error fetching deteriorating patients: {str(e)}")
+            return self._error_response(str(e))
+
     @validate_token
     @http.route('/api/v1/pharmacy-history', type='json', auth='public', methods=['POST'], csrf=False)
     def create_pharmacy_history(self, **params):
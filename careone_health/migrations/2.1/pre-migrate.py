@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Create the stored price_unit column on prescription lines before the
+    ORM does, and fill it from the stored subtotal. This keeps historical
+    totals unchanged instead of recomputing them from today's prices."""
+    if not version:
+        return
+    cr.execute("""
+        ALTER TABLE pharmacy_prescription_line
+        ADD COLUMN IF NOT EXISTS price_unit double precision
+    """)
+    cr.execute("""
+        UPDATE pharmacy_prescription_line
+           SET price_unit = CASE WHEN COALESCE(quantity, 0) = 0 THEN 0
+                                 ELSE COALESCE(price_subtotal, 0) / quantity END
+         WHERE price_unit IS NULL
+    """)
+    _logger.info("Captured price_unit on %s prescription lines", cr.rowcount)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Fill the new stored patient_id of vital signs with one UPDATE instead
+    of letting the ORM recompute it row by row."""
+    if not version:
+        return
+    cr.execute("""
+        ALTER TABLE patient_vitalsigns
+        ADD COLUMN IF NOT EXISTS patient_id integer
+    """)
+    cr.execute("""
+        UPDATE patient_vitalsigns v
+           SET patient_id = e.patient_id
+          FROM patient_medical_evaluation e
+         WHERE e.id = v.evaluation_id
+           AND v.patient_id IS NULL
+    """)
+    _logger.info("Set patient_id on %s vital signs", cr.rowcount)
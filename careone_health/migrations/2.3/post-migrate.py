@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Seed the latest early-warning score of every patient from their most
+    recent reading."""
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cr.execute("""
+        SELECT DISTINCT ON (patient_id) id
+          FROM patient_vitalsigns
+         WHERE patient_id IS NOT NULL
+      ORDER BY patient_id, time DESC, id DESC
+    """)
+    ids = [row[0] for row in cr.fetchall()]
+    for batch in split_every(5000, ids):
+        env['patient.ews.latest']._update_from_readings(list(batch))
+    _logger.info("Seeded latest early-warning scores for %s patients", len(ids))
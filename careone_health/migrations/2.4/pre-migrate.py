@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# evaluation columns moved to each one-to-one side table
+SECTIONS = {
+    'patient_medical_evaluation_exam': ('exam_id', [
+        'hdl', 'ldl', 'tag', 'systolic', 'diastolic', 'bpm', 'respiratory_rate', 'osat',
+        'malnutrition', 'dehydration', 'temperature', 'weight', 'height', 'bmi',
+        'head_circumference', 'abdominal_circ', 'edema', 'petechiae', 'hematoma', 'cyanosis',
+        'acropachy', 'nystagmus', 'miosis', 'mydriasis', 'palpebral_ptosis', 'arritmia',
+        'heart_murmurs', 'heart_extra_sounds', 'jugular_engorgement', 'ascites',
+        'lung_adventitious_sounds', 'bronchophony', 'increased_fremitus', 'decreased_fremitus',
+        'jaundice', 'lynphadenitis', 'breast_lump', 'breast_asymmetry', 'nipple_inversion',
+        'nipple_discharge', 'peau_dorange', 'gynecomastia', 'masses', 'hypotonia', 'hypertonia',
+        'pressure_ulcers', 'goiter', 'alopecia', 'xerosis', 'erithema', 'loc', 'loc_eyes',
+        'loc_verbal', 'loc_motor', 'violent', 'indication', 'orientation', 'memory',
+        'knowledge_current_events', 'judgment', 'abstraction', 'vocabulary',
+        'calculation_ability', 'object_recognition', 'praxis',
+    ]),
+    'patient_medical_evaluation_nursing': ('nursing_id', [
+        'diet', 'recent_weight_change', 'conditions_affecting_ecs', 'mucous_membranes', 'skin',
+        'skin_intact', 'special_care', 'wound_assessment', 'level_of_consciousness',
+        'seizure_tremor_fainting', 'difficulty_in_orientation', 'sensation', 'memory_deficit',
+        'impaired_decision_making', 'sleep_aids', 'pain', 'pain_score', 'location', 'frequency',
+        'duration', 'treatment', 'respirations', 'breath_sounds', 'shorthess_of_breath',
+        'shorthess_of_breath_trigger', 'cough', 'cough_type', 'respiratory_treatment',
+        'history', 'pulse', 'explain_edema', 'chest_pain', 'explain_chest_pain',
+        'gastrointestinal_bleeding', 'gastrointestinal_diarrhea',
+        'gastrointestinal_constipation', 'gastrointestinal_vomiting', 'gastrointestinal_nausea',
+        'gastrointestinal_gastrostomy', 'gastrointestinal_enteral_tube',
+        'gastrointestinal_abdominal_pain', 'change_in_appetite', 'explain_change_in_appetite',
+        'bowel_sounds', 'bowel_movement', 'bladder_control', 'bladder_frequency',
+        'blood_in_urine', 'difficulty_urinating', 'nocturnia', 'indwelling_catheter',
+        'mobility', 'assistive_devices', 'range_of_motion', 'activities_of_daily', 'vision',
+        'corrective_device', 'hearing', 'hearing_aid', 'nursing_assessment_notes', 'allergies',
+        'allergies_selection', 'allergy_cause', 'allergic_reaction_seen', 'current_medication',
+        'other_medications', 'other_allergies',
+    ]),
+    'patient_medical_evaluation_notes': ('notes_id', [
+        'notes_complaint', 'hpi', 'recommendation', 'disease', 'treatment_plan',
+        'info_diagnosis', 'directions', 'family_history_condition', 'dietary_history',
+        'social_history', 'notes', 'patient_discharge_date', 'discharge_admission_diagnosis',
+        'discharge_condition', 'discharge_final_diagnoses', 'present_illness_history',
+        'discharge_instructions', 'discharge_completed_by', 'evaluation_addendum',
+        'vital_signs_anthropometry_notes', 'info_diagnosis_discharge',
+    ]),
+}
+MAGIC_COLUMNS = ['create_uid', 'create_date', 'write_uid', 'write_date']
+
+
+def _table_stats(cr):
+    cr.execute("""
+        SELECT pg_total_relation_size('patient_medical_evaluation'),
+               coalesce((SELECT avg(pg_column_size(e.*)) FROM patient_medical_evaluation e), 0)
+    """)
+    return cr.fetchone()
+
+
+def migrate(cr, version):
+    """Move the cold clinical sections of patient_medical_evaluation to
+    one-to-one side tables with set-based copies, keeping the evaluation ids
+    as side ids, then drop the moved columns and rewrite the evaluation table
+    so its rows only carry the header columns."""
+    if not version:
+        return
+    size_before, width_before = _table_stats(cr)
+    cr.execute("""
+        SELECT column_name
+          FROM information_schema.columns
+         WHERE table_name = 'patient_medical_evaluation'
+    """)
+    existing = {row[0] for row in cr.fetchall()}
+    for table, (link, columns) in SECTIONS.items():
+        columns = [column for column in columns if column in existing]
+        cr.execute("""
+            CREATE TABLE {table} AS
+            SELECT {copied} FROM patient_medical_evaluation
+        """.format(table=table, copied=', '.join(['id'] + MAGIC_COLUMNS + columns)))
+        cr.execute("""
+            ALTER TABLE {table} ADD PRIMARY KEY (id);
+            CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id;
+            ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq');
+            SELECT setval('{table}_id_seq', coalesce((SELECT max(id) FROM {table}), 0) + 1, false);
+            ALTER TABLE patient_medical_evaluation ADD COLUMN {link} integer;
+            UPDATE patient_medical_evaluation SET {link} = id;
+        """.format(table=table, link=link))
+        if columns:
+            cr.execute("ALTER TABLE patient_medical_evaluation {drops}".format(
+                drops=', '.join('DROP COLUMN %s' % column for column in columns)))
+        _logger.info("Moved %s evaluation columns to %s", len(columns), table)
+    # dropped columns keep their space until the rows are rewritten
+    cr.execute("CLUSTER patient_medical_evaluation USING patient_medical_evaluation_pkey")
+    cr.execute("ANALYZE patient_medical_evaluation")
+    size_after, width_after = _table_stats(cr)
+    _logger.info("patient_medical_evaluation: %s -> %s bytes, average row %.0f -> %.0f bytes",
+                 size_before, size_after, width_before, width_after)
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Fill the clinical notes search vectors of existing evaluations and
+    prescriptions; the columns and GIN indexes are created by init()."""
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    for model in ('patient.medical.evaluation', 'res.patient.pharmacy.history'):
+        env[model]._init_search_vector()
+        _logger.info("Computed the search vector of %s %s records", cr.rowcount, model)
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Compute the duplicate detection blocking keys of existing patients."""
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    count = env['res.partner']._backfill_dedup_keys()
+    _logger.info("Computed the duplicate detection blocking keys of %s patients", count)
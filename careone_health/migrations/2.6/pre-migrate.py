@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Create the duplicate detection blocking key columns beforehand, so the
+    ORM does not compute them record by record for every partner on update;
+    the post-migration fills them in chunks."""
+    if not version:
+        return
+    cr.execute("""
+        ALTER TABLE res_partner
+            ADD COLUMN IF NOT EXISTS dedup_name_key varchar,
+            ADD COLUMN IF NOT EXISTS dedup_phone_key varchar
+    """)
+    _logger.info("Created the duplicate detection blocking key columns")
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Set the branch of the admissions without one (those recorded before
+    admissions had a branch) from their bed, or else from their first
+    evaluation, so the ward census counts them under their branch."""
+    if not version:
+        return
+    cr.execute("""
+        UPDATE patient_medical_admission a
+           SET branch_id = b.branch_id
+          FROM patient_medical_bed b
+         WHERE b.id = a.bed_id
+           AND a.branch_id IS NULL
+    """)
+    _logger.info("Set the branch of %s admissions from their bed", cr.rowcount)
+    cr.execute("""
+        UPDATE patient_medical_admission a
+           SET branch_id = e.branch_id
+          FROM (
+                SELECT DISTINCT ON (admission_id) admission_id, branch_id
+                  FROM patient_medical_evaluation
+                 WHERE admission_id IS NOT NULL AND branch_id IS NOT NULL
+              ORDER BY admission_id, id
+               ) e
+         WHERE e.admission_id = a.id
+           AND a.branch_id IS NULL
+    """)
+    _logger.info("Set the branch of %s admissions from their evaluations", cr.rowcount)
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
-from . import res_partner
+from . import ir_sequence
+from . import clinical_text_search
+from . import res_partner, patient_cohort, patient_duplicate
 from . import pharmacy_config_stage
 from . import product_product
 from . import pharmacy_prescription_line
 from . import res_patient_pharmacy_history, pharmacy_setup, patient_medical_history
-from . import patient_medical_admission
+from . import patient_medical_admission, patient_medical_bed
+from . import patient_medical_evaluation_section
 from . import patient_medical_evaluation
+from . import patient_early_warning
 from . import patient_medical_vital_sign
+from . import patient_import_job
 
@@ -0,0 +1,166 @@
+# models/clinical_text_search.py
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import sql
+
+# text search configuration of the clinical notes vectors and queries
+FTS_CONFIG = 'english'
+
+
+class ClinicalTextSearchMixin(models.AbstractModel):
+    '''Full-text search over the clinical notes of a model.
+
+    The model keeps a weighted `search_vector` tsvector column with a GIN
+    index, refreshed by the ORM whenever one of `_search_vector_weights`
+    fields is written. Fields delegated through _inherits are read from their
+    side table. Searches are restricted to the branches of the user.'''
+    _name = 'clinical.text.search.mixin'
+    _description = 'Clinical Notes Full-Text Search'
+
+    # {field name: tsvector weight}, set by the inheriting models
+    _search_vector_weights = {}
+
+    notes_search = fields.Char(string='Clinical Notes', compute='_compute_notes_search',
+                               search='_search_notes_search')
+
+    def init(self):
+        super().init()
+        if self._abstract or not self._search_vector_weights:
+            return
+        self.env.cr.execute("ALTER TABLE %s ADD COLUMN IF NOT EXISTS search_vector tsvector" % self._table)
+        sql.create_index(self.env.cr, '%s_search_vector_idx' % self._table,
+                         self._table, ['search_vector'], method='gin')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._update_search_vector()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if not self._search_vector_weights.keys().isdisjoint(vals):
+            self._update_search_vector()
+        return res
+
+    def _compute_notes_search(self):
+        self.notes_search = False
+
+    @api.model
+    def _search_vector_sources(self):
+        '''Return (columns, joins): the SQL column of each searched field,
+        keyed by field name, and the joins to the _inherits side tables.'''
+        columns, joins = {}, {}
+        for fname in self._search_vector_weights:
+            field = self._fields[fname]
+            if field.inherited:
+                parent = self.env[field.related_field.model_name]
+                alias = 'p_%s' % parent._table
+                joins[alias] = '%s %s ON %s.id = t.%s' % (
+                    parent._table, alias, alias, self._inherits[parent._name])
+                columns[fname] = '%s.%s' % (alias, fname)
+            else:
+                columns[fname] = 't.%s' % fname
+        return columns, joins
+
+    def _update_search_vector(self):
+        if self:
+            self._refresh_search_vector('AND t.id IN %s', [tuple(self.ids)])
+
+    @api.model
+    def _init_search_vector(self):
+        '''Compute the search vector of the whole table, with one UPDATE.'''
+        self._refresh_search_vector('', [])
+
+    @api.model
+    def _refresh_search_vector(self, where, params):
+        if not self._search_vector_weights:
+            return
+        columns, joins = self._search_vector_sources()
+        self.flush_model()
+        for parent in self._inherits:
+            self.env[parent].flush_model()
+        vector = ' || '.join(
+            "setweight(to_tsvector('{config}', coalesce({column}, '')), '{weight}')".format(
+                config=FTS_CONFIG, column=columns[fname], weight=weight)
+            for fname, weight in self._search_vector_weights.items())
+        self.env.cr.execute("""
+            UPDATE {table} AS u
+               SET search_vector = {vector}
+              FROM {table} t {joins}
+             WHERE u.id = t.id {where}
+        """.format(
+            table=self._table,
+            vector=vector,
+            joins=' '.join('JOIN %s' % join for join in joins.values()),
+            where=where,
+        ), params)
+
+    @api.model
+    def _get_search_branch_ids(self, branch_ids=None):
+        '''Branches the current user may search: their own branches, narrowed
+        to `branch_ids` if given. Administrators are not restricted; None
+        means no restriction.'''
+        user = self.env.user
+        if user.has_group('base.group_system'):
+            return list(branch_ids) if branch_ids else None
+        allowed = (user.branch_id | user.branch_ids).ids
+        if branch_ids:
+            allowed = [branch_id for branch_id in allowed if branch_id in branch_ids]
+        return allowed
+
+    @api.model
+    def _search_text_query(self, text, branch_ids=None):
+        '''Return (query, params) selecting the ids of the records matching
+        `text`, ranked, within the branches the user may search.'''
+        branch_ids = self._get_search_branch_ids(branch_ids)
+        branch_clause = ''
+        params = [FTS_CONFIG, text]
+        if branch_ids is not None:
+            branch_clause = 'AND t.branch_id IN %s'
+            params.append(tuple(branch_ids) or (None,))
+        query = """
+            SELECT t.id, ts_rank_cd(t.search_vector, q.query) AS rank
+              FROM {table} t, websearch_to_tsquery(%s, %s) AS q(query)
+             WHERE t.search_vector @@ q.query {branch_clause}
+        """.format(table=self._table, branch_clause=branch_clause)
+        return query, params
+
+    def _search_notes_search(self, operator, value):
+        if operator not in ('ilike', 'like', '=') or not isinstance(value, str) or not value.strip():
+            raise UserError(_('Clinical notes can only be searched for a text.'))
+        query, params = self._search_text_query(value)
+        return [('id', 'inselect', ('SELECT id FROM (%s) AS matches' % query, params))]
+
+    @api.model
+    def search_clinical_text(self, text, branch_ids=None, limit=20, offset=0):
+        '''Return the records matching `text` with the best ranked first, as
+        a list of {id, rank, snippet} where the snippet highlights the
+        matching words.'''
+        if not text or not text.strip():
+            return []
+        query, params = self._search_text_query(text, branch_ids)
+        self.flush_model(['branch_id'])
+        self.env.cr.execute("""
+            {query}
+          ORDER BY rank DESC, t.id DESC
+             LIMIT %s OFFSET %s
+        """.format(query=query), params + [limit, offset])
+        ranked = self.env.cr.fetchall()
+        if not ranked:
+            return []
+
+        # snippets for the page only: ts_headline works on the raw text
+        columns, joins = self._search_vector_sources()
+        self.env.cr.execute("""
+            SELECT t.id, ts_headline(%s, concat_ws(' ... ', {columns}), websearch_to_tsquery(%s, %s),
+                                     'MaxFragments=2, MaxWords=20, MinWords=5')
+              FROM {table} t {joins}
+             WHERE t.id IN %s
+        """.format(
+            table=self._table,
+            columns=', '.join(columns.values()),
+            joins=' '.join('JOIN %s' % join for join in joins.values()),
+        ), [FTS_CONFIG, FTS_CONFIG, text, tuple(res_id for res_id, rank in ranked)])
+        snippets = dict(self.env.cr.fetchall())
+        return [{'id': res_id, 'rank': rank, 'snippet': snippets.get(res_id)} for res_id, rank in ranked]
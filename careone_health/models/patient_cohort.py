@@ -0,0 +1,176 @@
+# models/patient_cohort.py
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import sql
+
+# lower bounds of the default age bands, in years
+DEFAULT_AGE_BANDS = [0, 5, 18, 36, 60]
+
+# breakdown name: (SQL expression, field resolving the labels)
+COHORT_DIMENSIONS = {
+    'gender': ('p.gender', 'gender'),
+    'genotype': ('p.genotype', 'genotype'),
+    'blood_group': ('p.blood_group', 'blood_group'),
+    'branch': ('p.branch_id', 'branch_id'),
+    'condition': ('cond.{column2}', 'chronic_condition_ids'),
+    'allergy': ('allergy.{column2}', 'allergy_ids'),
+    'age_band': (None, None),
+}
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    def init(self):
+        super().init()
+        # cohort queries: age bands are dob ranges within a branch
+        sql.create_index(self.env.cr, 'res_partner_patient_cohort_idx', self._table,
+                         ['branch_id', 'dob'], where='is_patient')
+
+    @api.model
+    def _cohort_age_band_labels(self, bands):
+        '''Return [(lower bound, label)] of the age bands starting at each of
+        `bands`; a band runs up to the next one.'''
+        bands = sorted(set(bands))
+        return [(lower, '%s-%s' % (lower, bands[index + 1] - 1) if index + 1 < len(bands) else '%s+' % lower)
+                for index, lower in enumerate(bands)]
+
+    @api.model
+    def _cohort_age_band_sql(self, bands, today):
+        '''Return (SQL CASE, params) mapping dob to its age band label. The
+        oldest band is tested first, so a dob lands in the highest band its
+        age reaches; a missing dob gives NULL.'''
+        cases, params = [], []
+        for lower, label in reversed(self._cohort_age_band_labels(bands)):
+            # born on or before today - lower years: at least `lower` years old
+            cases.append('WHEN p.dob <= %s THEN %s')
+            params += [today - relativedelta(years=lower), label]
+        return 'CASE %s END' % ' '.join(cases), params
+
+    @api.model
+    def _cohort_where(self, filters, today):
+        '''Translate cohort filters into a WHERE clause over res_partner p.'''
+        clauses, params = ['p.is_patient', 'p.active'], []
+        if filters.get('age_min') is not None:
+            clauses.append('p.dob <= %s')
+            params.append(today - relativedelta(years=int(filters['age_min'])))
+        if filters.get('age_max') is not None:
+            clauses.append('p.dob > %s')
+            params.append(today - relativedelta(years=int(filters['age_max']) + 1))
+        for fname in ('gender', 'genotype', 'blood_group'):
+            values = filters.get(fname)
+            if values:
+                clauses.append('p.%s IN %%s' % fname)
+                params.append(tuple(values if isinstance(values, (list, tuple)) else [values]))
+        if filters.get('branch_ids'):
+            clauses.append('p.branch_id IN %s')
+            params.append(tuple(filters['branch_ids']))
+        for fname, key in (('chronic_condition_ids', 'condition_ids'), ('allergy_ids', 'allergy_ids')):
+            ids = filters.get(key)
+            if not ids:
+                continue
+            # patients having all the given conditions / allergies
+            field = self._fields[fname]
+            clauses.append("""p.id IN (
+                SELECT {column1} FROM {relation} WHERE {column2} IN %s
+              GROUP BY {column1} HAVING count(*) = %s)""".format(
+                relation=field.relation, column1=field.column1, column2=field.column2))
+            params += [tuple(ids), len(set(ids))]
+        return ' AND '.join(clauses), params
+
+    @api.model
+    def get_cohort(self, filters=None, breakdowns=None, age_bands=None):
+        '''Count the patients matching `filters` and break the count down by
+        each of `breakdowns`, with a single aggregate query.
+
+        filters: age_min, age_max (years, from dob), gender, genotype,
+        blood_group (values or lists of values), branch_ids, and
+        condition_ids / allergy_ids (patients having all of them).
+        breakdowns: any of gender, genotype, blood_group, branch, condition,
+        allergy, age_band. age_bands: lower bounds of the age bands.
+
+        Return {'count': n, 'breakdowns': {name: [{'value', 'label', 'count'}]}}.'''
+        filters = filters or {}
+        breakdowns = list(dict.fromkeys(breakdowns or []))
+        unknown = set(breakdowns) - set(COHORT_DIMENSIONS)
+        if unknown:
+            raise UserError(_('Unknown cohort breakdown: %s') % ', '.join(sorted(unknown)))
+        today = fields.Date.context_today(self)
+        self.flush_model(['is_patient', 'active', 'dob', 'gender', 'genotype', 'blood_group',
+                          'branch_id', 'chronic_condition_ids', 'allergy_ids'])
+
+        select_params, joins, expressions = [], [], []
+        for name in breakdowns:
+            expression, fname = COHORT_DIMENSIONS[name]
+            if name == 'age_band':
+                expression, band_params = self._cohort_age_band_sql(age_bands or DEFAULT_AGE_BANDS, today)
+                select_params += band_params
+            elif name in ('condition', 'allergy'):
+                field = self._fields[fname]
+                joins.append('LEFT JOIN {relation} {alias} ON {alias}.{column1} = p.id'.format(
+                    relation=field.relation, alias='cond' if name == 'condition' else 'allergy',
+                    column1=field.column1))
+                expression = expression.format(column2=field.column2)
+            expressions.append(expression)
+        where, where_params = self._cohort_where(filters, today)
+        # the m2m joins repeat patients, count them once
+        count = 'count(DISTINCT patient_id)' if joins else 'count(*)'
+
+        # the breakdown values are computed once per patient row in the
+        # subquery; GROUPING() tells which breakdown an output row belongs
+        # to, the total being the empty grouping set
+        dims = ['d%s' % index for index in range(len(expressions))]
+        query = """
+            SELECT {grouping}, {dims_select} {count}
+              FROM (SELECT p.id AS patient_id {columns}
+                      FROM res_partner p {joins}
+                     WHERE {where}) AS cohort
+          GROUP BY GROUPING SETS ({sets})
+        """.format(
+            grouping='GROUPING(%s)' % ', '.join(dims) if dims else '0',
+            dims_select=''.join('%s, ' % dim for dim in dims),
+            count=count,
+            columns=''.join(', %s AS %s' % (expression, dim) for expression, dim in zip(expressions, dims)),
+            joins=' '.join(joins),
+            where=where,
+            sets=', '.join(['()'] + ['(%s)' % dim for dim in dims]),
+        )
+        self.env.cr.execute(query, select_params + where_params)
+
+        result = {'count': 0, 'breakdowns': {name: [] for name in breakdowns}}
+        full_mask = (1 << len(expressions)) - 1
+        for row in self.env.cr.fetchall():
+            mask, values, total = row[0], row[1:-1], row[-1]
+            if mask == full_mask:
+                result['count'] = total
+                continue
+            # the one grouped column has a 0 bit; bits are ordered from the left
+            index = next(i for i in range(len(expressions)) if not mask & (1 << (len(expressions) - 1 - i)))
+            result['breakdowns'][breakdowns[index]].append({'value': values[index], 'count': total})
+        for name, rows in result['breakdowns'].items():
+            self._cohort_label(name, rows, age_bands or DEFAULT_AGE_BANDS)
+        return result
+
+    @api.model
+    def _cohort_label(self, name, rows, age_bands):
+        '''Add the label of each breakdown value and sort the rows.'''
+        dummy, fname = COHORT_DIMENSIONS[name]
+        if name == 'age_band':
+            order = {label: index for index, (dummy, label) in enumerate(self._cohort_age_band_labels(age_bands))}
+            for row in rows:
+                row['label'] = row['value'] or _('Unknown')
+            rows.sort(key=lambda row: order.get(row['value'], len(order)))
+            return
+        field = self._fields[fname]
+        if field.type == 'selection':
+            labels = dict(field._description_selection(self.env))
+        else:
+            comodel = self.env[field.comodel_name].with_context(active_test=False)
+            labels = {rec.id: rec.display_name for rec in comodel.browse(
+                [row['value'] for row in rows if row['value']])}
+        empty = _('None') if field.type == 'many2many' else _('Unknown')
+        for row in rows:
+            row['label'] = labels.get(row['value'], _('Unknown')) if row['value'] else empty
+        rows.sort(key=lambda row: -row['count'])
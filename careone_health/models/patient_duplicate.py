@@ -0,0 +1,262 @@
+# models/patient_duplicate.py
+import logging
+import re
+import threading
+from difflib import SequenceMatcher
+
+from psycopg2.extras import execute_values
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# blocking key field: patients sharing a key are compared pairwise
+BLOCKING_KEYS = ['dedup_name_key', 'dedup_phone_key']
+# candidate pairs at or above this score are queued for review
+DUPLICATE_THRESHOLD = 0.75
+
+SOUNDEX_CODES = dict(
+    [(char, '1') for char in 'bfpv'] + [(char, '2') for char in 'cgjkqsxz'] +
+    [(char, '3') for char in 'dt'] + [('l', '4')] + [(char, '5') for char in 'mn'] + [('r', '6')]
+)
+
+
+def soundex(name):
+    '''American Soundex code of a name, e.g. Robert and Rupert give R163.'''
+    name = re.sub('[^a-z]', '', (name or '').lower())
+    if not name:
+        return ''
+    code, last = name[0].upper(), SOUNDEX_CODES.get(name[0], '')
+    for char in name[1:]:
+        digit = SOUNDEX_CODES.get(char, '')
+        if digit and digit != last:
+            code += digit
+        if char not in 'hw':
+            last = digit
+    return (code + '000')[:4]
+
+
+def normalize_phone(phone):
+    '''The last ten digits of a phone number, so 0803..., +234803... and
+    234803... compare equal; None for numbers too short to be reliable.'''
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def normalize_name(name):
+    return ' '.join(re.sub(r'[^a-z ]', ' ', (name or '').lower()).split())
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    dedup_name_key = fields.Char(string='Name Blocking Key', compute='_compute_dedup_keys', store=True,
+                                 index=True, copy=False, help='Soundex of the last name and year of birth')
+    dedup_phone_key = fields.Char(string='Phone Blocking Key', compute='_compute_dedup_keys', store=True,
+                                  index=True, copy=False, help='Normalized phone number')
+
+    @api.model
+    def _get_dedup_keys(self, is_patient, last_name, dob, phone, mobile):
+        if not is_patient:
+            return False, False
+        name_key = soundex(last_name)
+        if name_key and dob:
+            name_key = '%s-%s' % (name_key, dob.year)
+        else:
+            name_key = False
+        return name_key, normalize_phone(mobile) or normalize_phone(phone) or False
+
+    @api.depends('is_patient', 'last_name', 'dob', 'phone', 'mobile')
+    def _compute_dedup_keys(self):
+        for rec in self:
+            rec.dedup_name_key, rec.dedup_phone_key = self._get_dedup_keys(
+                rec.is_patient, rec.last_name, rec.dob, rec.phone, rec.mobile)
+
+    @api.model
+    def _backfill_dedup_keys(self, batch_size=10000):
+        '''Compute the blocking keys of all patients in chunks of `batch_size`
+        with one UPDATE per chunk, without loading the records in the ORM.'''
+        self.flush_model(['is_patient', 'last_name', 'dob', 'phone', 'mobile'])
+        last_id, total = 0, 0
+        while True:
+            self.env.cr.execute("""
+                SELECT id, is_patient, last_name, dob, phone, mobile
+                  FROM res_partner
+                 WHERE id > %s AND is_patient
+              ORDER BY id
+                 LIMIT %s
+            """, (last_id, batch_size))
+            rows = self.env.cr.fetchall()
+            if not rows:
+                break
+            values = [(row[0],) + tuple(key or None for key in self._get_dedup_keys(*row[1:])) for row in rows]
+            execute_values(self.env.cr._obj, """
+                UPDATE res_partner p
+                   SET dedup_name_key = v.name_key::varchar, dedup_phone_key = v.phone_key::varchar
+                  FROM (VALUES %s) AS v(id, name_key, phone_key)
+                 WHERE p.id = v.id
+            """, values, page_size=batch_size)
+            last_id, total = rows[-1][0], total + len(rows)
+        self.invalidate_model(['dedup_name_key', 'dedup_phone_key'])
+        return total
+
+
+class PatientDuplicateCandidate(models.Model):
+    _name = 'patient.duplicate.candidate'
+    _description = 'Possible Duplicate Patient'
+    _order = 'state, score desc, id'
+
+    patient_id = fields.Many2one('res.partner', string='Patient', required=True, readonly=True,
+                                 ondelete='cascade', index=True, help='The oldest record, kept on merge')
+    duplicate_id = fields.Many2one('res.partner', string='Possible Duplicate', readonly=True,
+                                   ondelete='cascade', index=True)
+    patient_no = fields.Char(related='patient_id.patient_no', string='Patient No')
+    duplicate_no = fields.Char(related='duplicate_id.patient_no', string='Duplicate No')
+    merged_name = fields.Char(string='Merged Record', readonly=True,
+                              help='Name and number of the duplicate, kept once it is merged')
+    score = fields.Float(string='Score', readonly=True, digits=(3, 2))
+    reasons = fields.Char(string='Matched On', readonly=True)
+    blocking_key = fields.Char(string='Block', readonly=True)
+    state = fields.Selection([
+        ('pending', 'To Review'),
+        ('merged', 'Merged'),
+        ('dismissed', 'Not a Duplicate'),
+    ], string='Status', default='pending', required=True, readonly=True, index=True)
+
+    _sql_constraints = [
+        ('pair_uniq', 'unique(patient_id, duplicate_id)', 'This pair of patients is already queued.'),
+        ('pair_check', 'CHECK(patient_id <> duplicate_id)', 'A patient cannot be a duplicate of itself.'),
+    ]
+
+    def action_dismiss(self):
+        self.write({'state': 'dismissed'})
+        return True
+
+    def action_merge(self):
+        '''Merge each duplicate into the oldest patient of its pair.'''
+        Merge = self.env['base.partner.merge.automatic.wizard']
+        for rec in self.filtered(lambda rec: rec.state == 'pending'):
+            patient, duplicate = rec.patient_id, rec.duplicate_id
+            if not duplicate:
+                raise UserError(_('The duplicate of %s no longer exists.') % patient.display_name)
+            # detach the pair first: the merge repoints every reference to
+            # the duplicate, and drops the other pairs it would make identical
+            rec.write({
+                'state': 'merged',
+                'duplicate_id': False,
+                'merged_name': '%s (%s)' % (duplicate.name, duplicate.patient_no or duplicate.id),
+            })
+            rec.flush_recordset()
+            Merge._merge((patient | duplicate).ids, patient, extra_checks=False)
+        return True
+
+    # ==================== detection ====================
+
+    @api.model
+    def _score_pair(self, left, right):
+        '''Return (score, reasons) of two patients in [0, 1]: names weigh 0.6,
+        the date of birth 0.25 and the phone 0.15.'''
+        score, reasons = 0.0, []
+        names = []
+        for fname, weight in (('last_name', 0.3), ('first_name', 0.2), ('middle_name', 0.1)):
+            ratio = SequenceMatcher(None, normalize_name(left[fname]), normalize_name(right[fname])).ratio()
+            names.append(ratio)
+            score += weight * ratio
+        # first and middle names are often swapped at registration
+        swapped = (SequenceMatcher(None, normalize_name(left['first_name']), normalize_name(right['middle_name'])).ratio()
+                   + SequenceMatcher(None, normalize_name(left['middle_name']), normalize_name(right['first_name'])).ratio()) / 2
+        if swapped > (names[1] + names[2]) / 2:
+            score += 0.3 * swapped - 0.2 * names[1] - 0.1 * names[2]
+            reasons.append(_('names (swapped)'))
+        elif min(names) > 0.85:
+            reasons.append(_('names'))
+        if left['dob'] and right['dob']:
+            if left['dob'] == right['dob']:
+                score += 0.25
+                reasons.append(_('date of birth'))
+            elif left['dob'].year == right['dob'].year:
+                score += 0.05
+        left_phones = {normalize_phone(left['phone']), normalize_phone(left['mobile'])} - {None}
+        right_phones = {normalize_phone(right['phone']), normalize_phone(right['mobile'])} - {None}
+        if left_phones & right_phones:
+            score += 0.15
+            reasons.append(_('phone'))
+        return round(score, 2), reasons
+
+    @api.model
+    def _detect_in_blocks(self, key_field, keys, max_block_size):
+        '''Score the candidate pairs of the blocks of `keys` and queue those
+        above the threshold. Return the number of pairs queued.'''
+        self.env.cr.execute("""
+            SELECT {key}, id, first_name, middle_name, last_name, dob, phone, mobile
+              FROM res_partner
+             WHERE {key} IN %s AND is_patient AND active
+          ORDER BY {key}, id
+        """.format(key=key_field), (tuple(keys),))
+        blocks = {}
+        for row in self.env.cr.dictfetchall():
+            blocks.setdefault(row[key_field], []).append(row)
+        pairs = []
+        for key, members in blocks.items():
+            if len(members) > max_block_size:
+                # a key this common (shared family phone, frequent name)
+                # does not discriminate; comparing it is quadratic
+                _logger.info('Duplicate detection: skipped block %s of %s patients', key, len(members))
+                continue
+            for index, left in enumerate(members):
+                for right in members[index + 1:]:
+                    score, reasons = self._score_pair(left, right)
+                    if score >= DUPLICATE_THRESHOLD:
+                        pairs.append((left['id'], right['id'], score, ', '.join(reasons), key))
+        if pairs:
+            # pairs already queued, reviewed or found through another key are kept as they are
+            execute_values(self.env.cr._obj, """
+                INSERT INTO patient_duplicate_candidate
+                       (patient_id, duplicate_id, score, reasons, blocking_key, state,
+                        create_uid, create_date, write_uid, write_date)
+                SELECT v.patient_id, v.duplicate_id, v.score, v.reasons, v.blocking_key, 'pending',
+                       {uid}, now() AT TIME ZONE 'UTC', {uid}, now() AT TIME ZONE 'UTC'
+                  FROM (VALUES %s) AS v(patient_id, duplicate_id, score, reasons, blocking_key)
+                ON CONFLICT (patient_id, duplicate_id) DO NOTHING
+            """.format(uid=int(self.env.uid)), pairs, page_size=1000)
+            self.invalidate_model()
+        return len(pairs)
+
+    @api.model
+    def _cron_detect_duplicates(self, blocks_per_chunk=500, max_chunks=20, max_block_size=50):
+        '''Walk the blocks of each blocking key in key order, `blocks_per_chunk`
+        blocks at a time, committing after each chunk. Every key gets up to
+        `max_chunks` chunks per run. The last key handled is kept as a
+        checkpoint, so a run resumes where the previous one stopped and memory
+        stays bounded by the size of a chunk.'''
+        commit = not getattr(threading.current_thread(), 'testing', False)
+        Params = self.env['ir.config_parameter'].sudo()
+        self.env['res.partner'].flush_model(BLOCKING_KEYS + ['is_patient', 'active'])
+        chunks = queued = 0
+        for key_field in BLOCKING_KEYS:
+            param = 'careone_health.dedup_checkpoint.%s' % key_field
+            for _chunk in range(max_chunks):
+                self.env.cr.execute("""
+                    SELECT {key}
+                      FROM res_partner
+                     WHERE {key} > %s AND is_patient AND active
+                  GROUP BY {key}
+                    HAVING count(*) > 1
+                  ORDER BY {key}
+                     LIMIT %s
+                """.format(key=key_field), (Params.get_param(param, ''), blocks_per_chunk))
+                keys = [row[0] for row in self.env.cr.fetchall()]
+                if keys:
+                    queued += self._detect_in_blocks(key_field, keys, max_block_size)
+                    chunks += 1
+                # a short chunk means the key is exhausted: restart from the
+                # beginning on the next run
+                exhausted = len(keys) < blocks_per_chunk
+                Params.set_param(param, '' if exhausted else keys[-1])
+                if commit:
+                    self.env.cr.commit()
+                if exhausted:
+                    break
+        _logger.info('Duplicate detection: %s chunks, %s candidate pairs', chunks, queued)
+        return True
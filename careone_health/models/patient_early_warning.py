@@ -0,0 +1,126 @@
+# models/patient_early_warning.py
+from odoo import models, fields, api
+
+EWS_RISKS = [
+    ('low', 'Low'),
+    ('low_medium', 'Low-Medium'),
+    ('medium', 'Medium'),
+    ('high', 'High'),
+]
+
+# NEWS2 bands per parameter: (upper bound inclusive, points); the last band
+# has no upper bound. SpO2 uses scale 1.
+NEWS2_BANDS = {
+    'respiratory': [(8, 3), (11, 1), (20, 0), (24, 2), (None, 3)],
+    'oxy_saturate': [(91, 3), (93, 2), (95, 1), (None, 0)],
+    'systolic': [(90, 3), (100, 2), (110, 1), (219, 0), (None, 3)],
+    'heart_rate': [(40, 3), (50, 1), (90, 0), (110, 1), (130, 2), (None, 3)],
+    'temp': [(35.0, 3), (36.0, 1), (38.0, 0), (39.0, 1), (None, 2)],
+}
+
+
+def compute_news2(vitals):
+    '''Return (score, risk) of a NEWS2-style early-warning score for a mapping
+    of vital values. Parameters that were not recorded (None) do not score; a
+    recorded 0 does, and is among the most critical readings. Consciousness and supplemental oxygen are not captured here.
+    Return (None, None) when no parameter was recorded.'''
+    score, max_points, recorded = 0, 0, False
+    for fname, bands in NEWS2_BANDS.items():
+        value = vitals.get(fname)
+        if value is None:
+            continue
+        recorded = True
+        for upper, points in bands:
+            if upper is None or value <= upper:
+                break
+        score += points
+        max_points = max(max_points, points)
+    if not recorded:
+        return None, None
+    if score >= 7:
+        risk = 'high'
+    elif score >= 5:
+        risk = 'medium'
+    elif max_points == 3:
+        risk = 'low_medium'
+    else:
+        risk = 'low'
+    return score, risk
+
+
+class PatientEwsLatest(models.Model):
+    _name = 'patient.ews.latest'
+    _description = 'Latest Early Warning Score'
+    _order = 'score desc, time desc'
+
+    patient_id = fields.Many2one('res.partner', string='Patient', required=True, readonly=True, ondelete='cascade')
+    vitalsign_id = fields.Many2one('patient.vitalsigns', string='Reading', readonly=True, ondelete='set null')
+    evaluation_id = fields.Many2one('patient.medical.evaluation', string='Evaluation', readonly=True, ondelete='set null')
+    branch_id = fields.Many2one('multi.branch', string='Clinic Branch', readonly=True, index=True)
+    time = fields.Datetime(string='Time', readonly=True)
+    score = fields.Integer(string='Early Warning Score', readonly=True, index=True)
+    risk = fields.Selection(EWS_RISKS, string='Clinical Risk', readonly=True)
+
+    _sql_constraints = [
+        ('patient_uniq', 'unique(patient_id)', 'There is only one latest score per patient.'),
+    ]
+
+    @api.model
+    def _update_from_readings(self, vitalsign_ids):
+        '''Upsert the latest score of the patients of the given readings.
+        A reading only replaces the stored score if it is not older.'''
+        if not vitalsign_ids:
+            return
+        self._upsert_latest('v.id IN %(ids)s', {'ids': tuple(vitalsign_ids)})
+
+    @api.model
+    def _recompute_for_patients(self, patient_ids):
+        '''Rebuild the latest score of the patients from their remaining
+        readings, e.g. after readings were deleted or moved.'''
+        if not patient_ids:
+            return
+        self.flush_model()
+        self.env.cr.execute("DELETE FROM patient_ews_latest WHERE patient_id IN %s", (tuple(patient_ids),))
+        self._upsert_latest('v.patient_id IN %(patient_ids)s', {'patient_ids': tuple(patient_ids)})
+
+    @api.model
+    def _upsert_latest(self, where, params):
+        self.env['patient.vitalsigns'].flush_model()
+        self.env.cr.execute("""
+            INSERT INTO patient_ews_latest (patient_id, vitalsign_id, evaluation_id, branch_id, time, score, risk,
+                                            create_uid, create_date, write_uid, write_date)
+            SELECT DISTINCT ON (v.patient_id)
+                   v.patient_id, v.id, v.evaluation_id, e.branch_id, v.time, v.ews_score, v.ews_risk,
+                   %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM patient_vitalsigns v
+              JOIN patient_medical_evaluation e ON e.id = v.evaluation_id
+             WHERE {where} AND v.patient_id IS NOT NULL AND v.ews_score IS NOT NULL
+          ORDER BY v.patient_id, v.time DESC, v.id DESC
+            ON CONFLICT (patient_id) DO UPDATE
+               SET vitalsign_id = EXCLUDED.vitalsign_id,
+                   evaluation_id = EXCLUDED.evaluation_id,
+                   branch_id = EXCLUDED.branch_id,
+                   time = EXCLUDED.time,
+                   score = EXCLUDED.score,
+                   risk = EXCLUDED.risk,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+             WHERE patient_ews_latest.time IS NULL OR patient_ews_latest.time <= EXCLUDED.time
+        """.format(where=where), dict(params, uid=self.env.uid))
+        self.invalidate_model()
+
+    @api.model
+    def get_deteriorating(self, min_score=5, branch_id=None, limit=100):
+        '''Patients under care whose latest score is at least `min_score`,
+        worst first. Scores of a completed evaluation, or of a discharged
+        admission, are no longer current and are left out.'''
+        domain = [
+            ('score', '>=', min_score),
+            '|', ('evaluation_id.admission_id.state', '=', 'inpatient'),
+            '&', ('evaluation_id.state', '!=', 'Completed'),
+            '|', ('evaluation_id.admission_id', '=', False),
+            ('evaluation_id.admission_id.state', '!=', 'outpatient'),
+        ]
+        if branch_id:
+            domain.append(('branch_id', '=', branch_id))
+        return self.search(domain, limit=limit)
@@ -0,0 +1,359 @@
+# models/patient_import_job.py
+import csv
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from psycopg2.errors import SerializationFailure
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# at most this many row errors are kept on the job, the rest are only counted
+MAX_LOGGED_ERRORS = 1000
+# a running job renews its lease at every checkpoint; a job whose lease ran out
+# was interrupted and may be resumed by another worker
+IMPORT_LEASE = timedelta(minutes=30)
+
+PATIENT_IMPORT_FIELDS = [
+    'first_name', 'middle_name', 'last_name', 'gender', 'dob', 'phone', 'mobile',
+    'email', 'street', 'street2', 'city', 'zip', 'blood_group', 'genotype',
+    'date_of_registration', 'relationship',
+]
+NEXT_OF_KIN_FIELDS = ['first_name', 'middle_name', 'last_name', 'phone', 'mobile', 'email', 'relationship']
+
+
+class PatientImportJob(models.Model):
+    _name = 'patient.import.job'
+    _description = 'Patient Bulk Import'
+    _order = 'id desc'
+
+    name = fields.Char(string='Reference', required=True, default=lambda self: _('Patient import %s') % fields.Datetime.now())
+    file_path = fields.Char(string='Source File', required=True, readonly=True)
+    file_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ], string='Format', required=True, default='csv')
+    chunk_size = fields.Integer(string='Chunk Size', default=1000)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True, readonly=True)
+    rows_done = fields.Integer(string='Rows Processed', readonly=True,
+                               help='Checkpoint: rows of the source file already handled. A resumed import skips them.')
+    rows_created = fields.Integer(string='Patients Created', readonly=True)
+    rows_failed = fields.Integer(string='Rows Failed', readonly=True)
+    rows_per_second = fields.Float(string='Rows / Second', readonly=True, digits=(16, 1))
+    started_at = fields.Datetime(string='Started', readonly=True)
+    finished_at = fields.Datetime(string='Finished', readonly=True)
+    lease_until = fields.Datetime(string='Lease Expires', readonly=True, copy=False,
+                                  help='Heartbeat of the worker running the job, renewed after each chunk.')
+    error_log = fields.Text(string='Errors', readonly=True)
+
+    @api.constrains('chunk_size')
+    def _check_chunk_size(self):
+        for rec in self:
+            if rec.chunk_size <= 0:
+                raise ValidationError(_('The chunk size must be positive.'))
+
+    @api.model
+    def _get_import_dir(self):
+        path = os.path.join(config['data_dir'], 'careone_import', self.env.cr.dbname)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @api.model
+    def create_from_stream(self, stream, file_format, **vals):
+        '''Copy an uploaded stream to the import directory, chunk by chunk, and
+        return a pending job for it.'''
+        if file_format not in ('csv', 'jsonl'):
+            raise UserError(_('Unsupported import format: %s') % file_format)
+        path = os.path.join(self._get_import_dir(), '%s.%s' % (uuid.uuid4().hex, file_format))
+        with open(path, 'wb') as dest:
+            while True:
+                block = stream.read(1024 * 1024)
+                if not block:
+                    break
+                dest.write(block)
+        return self.create(dict(vals, file_path=path, file_format=file_format))
+
+    @api.model
+    def _get_resumable_domain(self):
+        '''Pending jobs, and running jobs whose worker stopped renewing the
+        lease (worker killed, server restart): those resume from their checkpoint.'''
+        return ['|', ('state', '=', 'pending'),
+                '&', ('state', '=', 'running'),
+                '|', ('lease_until', '=', False), ('lease_until', '<', fields.Datetime.now())]
+
+    def action_resume(self):
+        running = self.filtered(lambda job: job.state == 'running')
+        active = running - running.filtered_domain(self._get_resumable_domain())
+        if active:
+            raise UserError(_('These imports are still running: %s') % ', '.join(active.mapped('name')))
+        (self.filtered(lambda job: job.state == 'failed') | running).write({'state': 'pending'})
+        self.env.ref('careone_health.ir_cron_patient_import')._trigger()
+        return True
+
+    @api.model
+    def _cron_run_pending(self):
+        for job in self.search(self._get_resumable_domain(), order='id'):
+            job.run()
+        return True
+
+    def _claim(self, commit):
+        '''Take the lease of the job, unless another worker (cron or CLI)
+        holds it. The row lock makes concurrent claims exclusive.
+        Return whether the job was claimed.'''
+        self.ensure_one()
+        self.flush_recordset()
+        now = fields.Datetime.now()
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("""
+                    UPDATE patient_import_job
+                       SET state = 'running', lease_until = %s, started_at = COALESCE(started_at, %s)
+                     WHERE id IN (
+                            SELECT id
+                              FROM patient_import_job
+                             WHERE id = %s AND (state != 'running' OR lease_until IS NULL OR lease_until < %s)
+                               FOR NO KEY UPDATE SKIP LOCKED
+                           )
+                 RETURNING id
+                """, (now + IMPORT_LEASE, now, self.id, now))
+                claimed = bool(self.env.cr.fetchone())
+        except SerializationFailure:
+            # another worker claimed the job after this transaction started
+            claimed = False
+        self.invalidate_recordset()
+        if claimed and commit:
+            self.env.cr.commit()
+        return claimed
+
+    # ==================== lookups ====================
+
+    @api.model
+    def _build_lookups(self):
+        '''Load allergies, chronic conditions, branches and selection values
+        into memory once per run, so rows resolve references without queries.'''
+        lookups = {
+            'allergy': {},
+            'condition': {},
+            'branch': {},
+        }
+        for rec in self.env['pharmacy.allergy'].search_read([], ['name']):
+            lookups['allergy'][rec['name'].strip().lower()] = rec['id']
+        for rec in self.env['pharmacy.chronic.condition'].search_read([], ['name', 'code']):
+            lookups['condition'][rec['name'].strip().lower()] = rec['id']
+            if rec['code']:
+                lookups['condition'][rec['code'].strip().lower()] = rec['id']
+        # branches are matched on id, name or code; a name or code shared by
+        # several branches (codes default to XXXXXXXX) maps to None and is refused
+        branches = self.env['multi.branch'].with_context(active_test=False).search_read([], ['name', 'code'])
+        for rec in branches:
+            for key in (rec['name'], rec['code']):
+                if key:
+                    key = key.strip().lower()
+                    if lookups['branch'].get(key, rec['id']) != rec['id']:
+                        lookups['branch'][key] = None
+                    elif key not in lookups['branch']:
+                        lookups['branch'][key] = rec['id']
+        for rec in branches:
+            lookups['branch'][str(rec['id'])] = rec['id']
+        Partner = self.env['res.partner']
+        for fname in ('gender', 'blood_group', 'genotype', 'relationship'):
+            selection = {}
+            for value, label in Partner._fields[fname]._description_selection(self.env):
+                selection[value.lower()] = value
+                selection[label.lower()] = value
+            lookups[fname] = selection
+        return lookups
+
+    @api.model
+    def _resolve_many(self, lookups, kind, raw):
+        '''Map a list (or a ';'-separated string) of names to ids, creating
+        master records for names that do not exist yet.'''
+        if not raw:
+            return []
+        names = raw if isinstance(raw, list) else str(raw).split(';')
+        model = 'pharmacy.allergy' if kind == 'allergy' else 'pharmacy.chronic.condition'
+        ids = []
+        for name in names:
+            name = str(name).strip()
+            if not name:
+                continue
+            key = name.lower()
+            if key not in lookups[kind]:
+                lookups[kind][key] = self.env[model].create({'name': name}).id
+            ids.append(lookups[kind][key])
+        return ids
+
+    @api.model
+    def _prepare_patient_vals(self, row, lookups):
+        '''Convert one source row into res.partner create values.
+        Raise ValueError for rows that cannot be imported.'''
+        if isinstance(row, str):
+            row = json.loads(row)
+        vals = {'is_patient': True}
+        for fname in PATIENT_IMPORT_FIELDS:
+            value = row.get(fname)
+            if value in (None, ''):
+                continue
+            if fname in lookups:
+                if str(value).strip().lower() not in lookups[fname]:
+                    raise ValueError(_('invalid %s "%s"') % (fname, value))
+                value = lookups[fname][str(value).strip().lower()]
+            vals[fname] = value
+        missing = [fname for fname in ('first_name', 'middle_name', 'last_name') if not vals.get(fname)]
+        if missing:
+            raise ValueError(_('missing %s') % ', '.join(missing))
+        branch = row.get('branch') or row.get('branch_id')
+        if branch:
+            if str(branch).strip().lower() not in lookups['branch']:
+                raise ValueError(_('unknown branch "%s"') % branch)
+            if not lookups['branch'][str(branch).strip().lower()]:
+                raise ValueError(_('ambiguous branch "%s", several branches match; use the branch id') % branch)
+            vals['branch_id'] = lookups['branch'][str(branch).strip().lower()]
+        allergy_ids = self._resolve_many(lookups, 'allergy', row.get('allergies') or row.get('allergy_ids'))
+        if allergy_ids:
+            vals['allergy_ids'] = [(6, 0, allergy_ids)]
+        condition_ids = self._resolve_many(
+            lookups, 'condition', row.get('chronic_conditions') or row.get('chronic_condition_ids'))
+        if condition_ids:
+            vals['chronic_condition_ids'] = [(6, 0, condition_ids)]
+
+        kins = row.get('next_of_kin')
+        if not isinstance(kins, list):
+            # flat CSV columns: next_of_kin_first_name, next_of_kin_phone, ...
+            kin = {fname: row.get('next_of_kin_%s' % fname) for fname in NEXT_OF_KIN_FIELDS}
+            kins = [kin] if any(kin.values()) else []
+        kin_commands = []
+        for kin in kins:
+            kin_vals = {'type': 'other'}
+            for fname in NEXT_OF_KIN_FIELDS:
+                value = kin.get(fname)
+                if value in (None, ''):
+                    continue
+                if fname == 'relationship':
+                    if str(value).strip().lower() not in lookups['relationship']:
+                        raise ValueError(_('invalid next of kin relationship "%s"') % value)
+                    value = lookups['relationship'][str(value).strip().lower()]
+                kin_vals[fname] = value
+            if not all(kin_vals.get(fname) for fname in ('first_name', 'middle_name', 'last_name')):
+                raise ValueError(_('next of kin requires first, middle and last name'))
+            kin_commands.append((0, 0, kin_vals))
+        if kin_commands:
+            vals['next_of_kin_ids'] = kin_commands
+        return vals
+
+    # ==================== pipeline ====================
+
+    def _iter_rows(self, stream):
+        '''Yield the source rows one at a time; the file is never fully loaded.'''
+        self.ensure_one()
+        if self.file_format == 'jsonl':
+            for line in stream:
+                if line.strip():
+                    yield line
+        else:
+            yield from csv.DictReader(stream)
+
+    def _import_chunk(self, chunk, lookups):
+        '''Create the patients of one chunk with a single batched create.
+        If the batch fails, retry row by row to isolate the bad rows.
+        Return (created, errors).'''
+        Partner = self.env['res.partner'].with_context(tracking_disable=True, mail_create_nolog=True)
+        prepared, errors = [], []
+        for row_no, row in chunk:
+            try:
+                prepared.append((row_no, self._prepare_patient_vals(row, lookups)))
+            except (ValueError, KeyError, AttributeError) as e:
+                errors.append(_('row %s: %s') % (row_no, e))
+        if not prepared:
+            return 0, errors
+        try:
+            with self.env.cr.savepoint():
+                Partner.create([vals for row_no, vals in prepared])
+            return len(prepared), errors
+        except Exception:
+            _logger.info('Patient import chunk failed, retrying row by row', exc_info=True)
+        created = 0
+        for row_no, vals in prepared:
+            try:
+                with self.env.cr.savepoint():
+                    Partner.create(vals)
+                created += 1
+            except Exception as e:
+                errors.append(_('row %s: %s') % (row_no, e))
+        return created, errors
+
+    def _checkpoint(self, vals, commit):
+        # renew the lease of a running job, release it otherwise
+        running = vals.get('state', self.state) == 'running'
+        self.write(dict(vals, lease_until=running and fields.Datetime.now() + IMPORT_LEASE))
+        if commit:
+            self.env.cr.commit()
+
+    def run(self):
+        '''Stream the source file into res.partner in chunks of `chunk_size`,
+        committing a checkpoint after each chunk. Rows before the checkpoint
+        are skipped, so a failed or interrupted job resumes where it stopped.
+        Jobs another worker is running are skipped.'''
+        commit = not getattr(threading.current_thread(), 'testing', False)
+        for job in self:
+            if not job._claim(commit):
+                _logger.info('Patient import %s is run by another worker, skipped', job.name)
+                continue
+            try:
+                job._run(commit)
+            except Exception as e:
+                if commit:
+                    self.env.cr.rollback()
+                _logger.exception('Patient import %s failed', job.name)
+                job._checkpoint({
+                    'state': 'failed',
+                    'error_log': '%s\n%s' % (job.error_log or '', e),
+                }, commit)
+        return True
+
+    def _run(self, commit):
+        self.ensure_one()
+        lookups = self._build_lookups()
+        skip, chunk_size = self.rows_done, self.chunk_size
+        started, run_rows = time.monotonic(), 0
+        with open(self.file_path, newline='', encoding='utf-8-sig') as stream:
+            rows = ((row_no, row) for row_no, row in enumerate(self._iter_rows(stream), start=1) if row_no > skip)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                created, errors = self._import_chunk(chunk, lookups)
+                run_rows += len(chunk)
+                self._flush_chunk(len(chunk), created, errors,
+                                  run_rows / max(time.monotonic() - started, 1e-6), commit)
+        self._checkpoint({'state': 'done', 'finished_at': fields.Datetime.now()}, commit)
+
+    def _flush_chunk(self, rows, created, errors, rate, commit):
+        vals = {
+            'rows_done': self.rows_done + rows,
+            'rows_created': self.rows_created + created,
+            'rows_failed': self.rows_failed + rows - created,
+            'rows_per_second': rate,
+        }
+        errors = errors[:max(MAX_LOGGED_ERRORS - (self.error_log or '').count('\n'), 0)]
+        if errors:
+            vals['error_log'] = '%s%s\n' % (self.error_log or '', '\n'.join(errors))
+        self._checkpoint(vals, commit)
+        _logger.info('Patient import %s: %s rows (%s created, %s failed), %.1f rows/s',
+                     self.name, vals['rows_done'], vals['rows_created'], vals['rows_failed'], rate)
+        # drop the records of the chunk from the cache to keep memory flat
+        self.env.invalidate_all()
@@ -1,6 +1,7 @@
 # models/res_patient_pharmacy_history.py
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import sql
 
 # models/pharmacy_allergy.py
 class PatientMedicalAdmission(models.Model):
@@ -31,6 +32,7 @@ class PatientMedicalAdmission(models.Model):
         string='Patient',
         required=False, 
         readonly=True,
+        index=True,
         domain="[('is_patient', '=', True)]",
         
     )
@@ -117,6 +119,18 @@ class PatientMedicalAdmission(models.Model):
         help="Ensure all admission rooms are clean",
         
     )
+    bed_id = fields.Many2one(
+        'patient.medical.bed',
+        string='Bed',
+        domain="[('state', '=', 'free'), ('branch_id', '=', branch_id)]",
+        help="Free bed the patient is admitted to",
+    )
+    branch_id = fields.Many2one(
+        'multi.branch',
+        string='Clinic Branch',
+        index=True,
+        default=lambda self: self.env.user.branch_id.id,
+    )
     state = fields.Selection(
         INPATIENT_STATES, 
         'State', 
@@ -136,16 +150,119 @@ class PatientMedicalAdmission(models.Model):
         domain=[('purpose','=','nurse_assessment')],
     )
 
+    def init(self):
+        # census index: current inpatients, length of stay and pending
+        # discharges are all ranges over these columns
+        sql.create_index(self.env.cr, 'patient_medical_admission_census_idx',
+                         self._table, ['state', 'admission_date', 'discharge_date'])
+        # patient timeline
+        sql.create_index(self.env.cr, 'patient_medical_admission_patient_date_idx',
+                         self._table, ['patient_id', 'admission_date'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records.filtered(lambda rec: rec.state == 'inpatient' and rec.bed_id)._sync_beds()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'state' in vals or 'bed_id' in vals:
+            self._sync_beds()
+        return res
+
+    def _sync_beds(self):
+        '''Have the bed of each inpatient admission occupied by it, and
+        release the beds the admissions no longer hold (discharged, or moved
+        to another bed).'''
+        Bed = self.env['patient.medical.bed'].sudo()
+        for bed in Bed.search([('admission_id', 'in', self.ids)]):
+            if bed.admission_id.state != 'inpatient' or bed.admission_id.bed_id != bed:
+                bed._release()
+        for rec in self:
+            if rec.state == 'inpatient' and rec.bed_id and rec.bed_id.admission_id != rec:
+                rec.bed_id.sudo()._occupy(rec)
+
+    @api.onchange('bed_id')
+    def _onchange_bed_id(self):
+        if self.bed_id:
+            self.room_id = self.bed_id.display_name
+
+    def action_admit(self):
+        '''Admit the patient: the admission becomes inpatient and occupies its
+        bed (see `_sync_beds`).'''
+        for rec in self:
+            if rec.state != 'draft':
+                raise UserError(_('Only draft admissions can be admitted.'))
+            rec.write({
+                'state': 'inpatient',
+                'admission_date': rec.admission_date or fields.Datetime.now(),
+            })
+
     def action_discharge(self):
         '''Discharge a patient.
-        Discharging a patient should set the room to dirty.
+        Discharging a patient should set the room to dirty (see `_sync_beds`).
         '''
         discharge_date = self.discharge_date or fields.datetime.now()
         self.write(
             {'state':'outpatient','discharge_date': discharge_date}
         )
         # self.patient_id.write({'state':'outpatient'})
-        # self.room_id.sudo().write({'status':'dirty'})
+
+    @api.model
+    def get_ward_census(self, branch_ids=None):
+        '''Return per-branch occupancy, length of stay and pending discharges.
+
+        Bed counts come from the (branch_id, state) bed index and admission
+        figures from the (state, admission_date, discharge_date) index, so the
+        cost does not grow with the number of past admissions.
+        '''
+        self.env['patient.medical.bed'].flush_model(['branch_id', 'state', 'active'])
+        self.flush_model(['branch_id', 'state', 'admission_date', 'discharge_date'])
+        branch_clause = 'AND branch_id IN %(branch_ids)s' if branch_ids else ''
+        params = {'branch_ids': tuple(branch_ids or ()), 'now': fields.Datetime.now()}
+        census = {}
+
+        def branch_census(branch_id):
+            return census.setdefault(branch_id, {
+                'branch_id': branch_id,
+                'beds_total': 0, 'beds_free': 0, 'beds_occupied': 0, 'beds_dirty': 0,
+                'inpatients': 0, 'avg_length_of_stay_days': 0.0, 'max_length_of_stay_days': 0.0,
+                'pending_discharges': 0,
+            })
+
+        self.env.cr.execute("""
+            SELECT branch_id, state, count(*)
+              FROM patient_medical_bed
+             WHERE active {branch_clause}
+          GROUP BY branch_id, state
+        """.format(branch_clause=branch_clause), params)
+        for branch_id, state, count in self.env.cr.fetchall():
+            data = branch_census(branch_id)
+            data['beds_%s' % state] = count
+            data['beds_total'] += count
+
+        self.env.cr.execute("""
+            SELECT branch_id,
+                   count(*),
+                   avg(extract(epoch FROM %(now)s - admission_date)) / 86400,
+                   max(extract(epoch FROM %(now)s - admission_date)) / 86400,
+                   count(*) FILTER (WHERE discharge_date IS NOT NULL)
+              FROM patient_medical_admission
+             WHERE state = 'inpatient' {branch_clause}
+          GROUP BY branch_id
+        """.format(branch_clause=branch_clause), params)
+        for branch_id, count, avg_stay, max_stay, pending in self.env.cr.fetchall():
+            data = branch_census(branch_id)
+            data.update({
+                'inpatients': count,
+                'avg_length_of_stay_days': round(avg_stay or 0.0, 2),
+                'max_length_of_stay_days': round(max_stay or 0.0, 2),
+                'pending_discharges': pending,
+            })
+        for data in census.values():
+            data['occupancy_rate'] = round(100.0 * data['beds_occupied'] / data['beds_total'], 2) if data['beds_total'] else 0.0
+        return list(census.values())
 
     def action_evaluation(self):
         views = self.env.ref("careone_health.view_patient_medical_evaluation_form").id
@@ -0,0 +1,79 @@
+# models/patient_medical_bed.py
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import sql
+
+
+class PatientMedicalRoom(models.Model):
+    _name = 'patient.medical.room'
+    _description = 'Ward Room'
+    _order = 'branch_id, name'
+
+    name = fields.Char(string='Room', required=True)
+    ward = fields.Char(string='Ward')
+    branch_id = fields.Many2one('multi.branch', string='Clinic Branch', required=True, index=True,
+                                default=lambda self: self.env.user.branch_id.id)
+    bed_ids = fields.One2many('patient.medical.bed', 'room_id', string='Beds')
+    bed_count = fields.Integer(string='Beds', compute='_compute_bed_count')
+    active = fields.Boolean(default=True)
+
+    def _compute_bed_count(self):
+        counts = dict(self.env['patient.medical.bed']._read_group(
+            [('room_id', 'in', self.ids)], ['room_id'], ['__count']))
+        for rec in self:
+            rec.bed_count = counts.get(rec, 0)
+
+
+class PatientMedicalBed(models.Model):
+    _name = 'patient.medical.bed'
+    _description = 'Ward Bed'
+    _order = 'branch_id, room_id, name'
+
+    BED_STATES = [
+        ('free', 'Free'),
+        ('occupied', 'Occupied'),
+        ('dirty', 'Dirty'),
+    ]
+
+    name = fields.Char(string='Bed', required=True)
+    room_id = fields.Many2one('patient.medical.room', string='Room', required=True, ondelete='cascade')
+    branch_id = fields.Many2one(related='room_id.branch_id', store=True)
+    state = fields.Selection(BED_STATES, string='Status', default='free', required=True, readonly=True)
+    admission_id = fields.Many2one('patient.medical.admission', string='Current Admission', readonly=True)
+    patient_id = fields.Many2one(related='admission_id.patient_id', string='Patient')
+    occupied_since = fields.Datetime(string='Occupied Since', readonly=True)
+    active = fields.Boolean(default=True)
+
+    _sql_constraints = [
+        ('admission_uniq', 'unique(admission_id)', 'An admission can only occupy one bed.'),
+    ]
+
+    def init(self):
+        # occupancy index: per-branch bed counts by state are answered from it
+        sql.create_index(self.env.cr, 'patient_medical_bed_branch_state_idx',
+                         self._table, ['branch_id', 'state'])
+
+    @api.depends('room_id.name', 'name')
+    def _compute_display_name(self):
+        for rec in self:
+            rec.display_name = '%s / %s' % (rec.room_id.name, rec.name) if rec.room_id else rec.name
+
+    def _occupy(self, admission):
+        self.ensure_one()
+        if self.state != 'free':
+            raise UserError(_('Bed %s is not free.') % self.display_name)
+        self.write({
+            'state': 'occupied',
+            'admission_id': admission.id,
+            'occupied_since': admission.admission_date or fields.Datetime.now(),
+        })
+
+    def _release(self):
+        '''Free the bed of its admission; it must be cleaned before reuse.'''
+        self.write({'state': 'dirty', 'admission_id': False, 'occupied_since': False})
+
+    def action_mark_clean(self):
+        if self.filtered(lambda bed: bed.state == 'occupied'):
+            raise UserError(_('An occupied bed cannot be marked as clean.'))
+        self.write({'state': 'free'})
+        return True
@@ -1,12 +1,28 @@
 # models/res_patient_pharmacy_history.py
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import sql
 
 
 # models/evaluation.py
 class PatientMedicalEvaluation(models.Model):
     _name = 'patient.medical.evaluation'
     _description = 'Patient History'
+    _inherit = ['clinical.text.search.mixin']
+    # cold clinical sections, see patient_medical_evaluation_section.py
+    _inherits = {
+        'patient.medical.evaluation.exam': 'exam_id',
+        'patient.medical.evaluation.nursing': 'nursing_id',
+        'patient.medical.evaluation.notes': 'notes_id',
+    }
+    _search_vector_weights = {
+        'chief_complaint': 'A',
+        'disease': 'A',
+        'info_diagnosis_discharge': 'B',
+        'hpi': 'C',
+        'notes_complaint': 'C',
+        'treatment_plan': 'C',
+    }
     
     FOLLOW_UP = [
         ('No follow up needed', 'No follow up needed'),
@@ -37,16 +53,6 @@ class PatientMedicalEvaluation(models.Model):
         ('Completed', 'Completed'),
     ]
 
-    RESPIRATION_TYPE = [
-        ('unlabored', 'Unlabored'),
-        ('labored', 'Labored')
-    ]
-
-    ALLERGIES_SELECTION = [
-        ('yes', 'Yes'),
-        ('no', 'No')
-    ]
-
 
     URGENCY_LEVEL = [
                     ('Normal', 'Normal'),
@@ -88,8 +94,6 @@ class PatientMedicalEvaluation(models.Model):
     evaluation_start_date = fields.Datetime(string='Evaluation Date', default=fields.Datetime.now, required=False, index=True)
     evaluation_end_date = fields.Datetime(string='Evalution End Date')
     chief_complaint = fields.Char(string='Chief Complaint', help='Chief Complaint')
-    notes_complaint = fields.Text(string='Complaint details')
-    hpi = fields.Text(string='HPI', help='History of present Illness')
     state = fields.Selection([('Draft','Draft'), ('Published', 'In progress'), ('Completed', 'Completed')], default='Draft')
     evaluation_no = fields.Char(string="Evaluation No.", readonly=True, copy=False)
     evaluation_duration = fields.Char(
@@ -98,9 +102,12 @@ class PatientMedicalEvaluation(models.Model):
         store=True,
         readonly=True
     )
-    recommendation = fields.Text(string="Recommendation")
-    disease  = fields.Text(string="Disease ")
-    treatment_plan=fields.Text(string="Treatment_ Plan ")
+    exam_id = fields.Many2one('patient.medical.evaluation.exam', string='Physical Examination',
+                              required=True, ondelete='cascade')
+    nursing_id = fields.Many2one('patient.medical.evaluation.nursing', string='Nurse Assessment',
+                                 required=True, ondelete='cascade')
+    notes_id = fields.Many2one('patient.medical.evaluation.notes', string='Clinical Notes',
+                               required=True, ondelete='cascade')
     blood_group = fields.Selection(
         related='patient_id.blood_group',
         string="Blood Group",
@@ -113,6 +120,12 @@ class PatientMedicalEvaluation(models.Model):
         readonly=True,
         store=False
     )
+
+    def init(self):
+        super().init()
+        # patient timeline
+        sql.create_index(self.env.cr, 'patient_medical_evaluation_patient_date_idx',
+                         self._table, ['patient_id', 'evaluation_start_date'])
     # company = fields.Many2one(
     #     'res.company', 
     #     related='patient_id.company', 
@@ -144,12 +157,23 @@ class PatientMedicalEvaluation(models.Model):
     #     vals["evaluation_no"] = self.get_default_name()
     #     return super().create(vals)
     
-    @api.model
-    def create(self, vals):
-     if vals.get('evaluation_no', 'New') == 'New':
-        vals['evaluation_no'] = self.env['ir.sequence'].next_by_code(
-            'patient.medical.evaluation') or 'New'
-     return super(PatientMedicalEvaluation, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        to_number = [vals for vals in vals_list if vals.get('evaluation_no', 'New') == 'New']
+        numbers = self.env['ir.sequence'].next_by_code_batch(
+            'patient.medical.evaluation', len(to_number))
+        for vals, number in zip(to_number, numbers):
+            vals['evaluation_no'] = number or 'New'
+        return super(PatientMedicalEvaluation, self).create(vals_list)
+
+    def unlink(self):
+        # ondelete='cascade' on the _inherits links only deletes the
+        # evaluation when a section goes, not the other way round
+        sections = [self[fname] for fname in self._inherits.values()]
+        res = super().unlink()
+        for section in sections:
+            section.exists().unlink()
+        return res
 
     def set_to_progress(self):
         return self.write({'state': 'Published'})
@@ -186,12 +210,7 @@ class PatientMedicalEvaluation(models.Model):
         Discharging a patient should set the room to dirty.
         '''
         views = self.env.ref("careone_health.careone_admission_form_view").id
-        admission = self.env['patient.medical.admission'].search(
-            [
-                ('patient_id', '=', self.patient_id.id),
-                ('state', '=', 'inpatient')
-            ], order='id desc', limit=1
-        )
+        admission_id, dummy = self._get_latest_admissions(state='inpatient').get(self.patient_id.id, (False, False))
         return {
             "name": "Patient's Admission",
             "type": "ir.actions.act_window",
@@ -200,19 +219,34 @@ class PatientMedicalEvaluation(models.Model):
             "view_form": "form",
             "views": [(views, 'form')],
             "target": "current",
-            "res_id": admission.id if admission else False,
+            "res_id": admission_id or False,
         }
 
 
+    def _get_latest_admissions(self, state=None):
+        '''Return {patient_id: (admission_id, admission_state)} with the latest
+        admission of every patient of the recordset, optionally restricted to
+        a state, using a single query for the whole recordset.'''
+        patient_ids = tuple(set(self.patient_id.ids))
+        if not patient_ids:
+            return {}
+        self.env['patient.medical.admission'].flush_model(['patient_id', 'state'])
+        query = """
+            SELECT DISTINCT ON (patient_id) patient_id, id, state
+              FROM patient_medical_admission
+             WHERE patient_id IN %s {state_clause}
+          ORDER BY patient_id, id DESC
+        """.format(state_clause='AND state = %s' if state else '')
+        self.env.cr.execute(query, (patient_ids, state) if state else (patient_ids,))
+        return {patient_id: (admission_id, admission_state)
+                for patient_id, admission_id, admission_state in self.env.cr.fetchall()}
+
     @api.depends('patient_id')
     def _compute_admission_state(self):
+        admissions = self._get_latest_admissions()
         for rec in self:
-            admission = self.env['patient.medical.admission'].search(
-                [
-                    ('patient_id', '=', rec.patient_id.id)
-                ], order='id desc', limit=1
-            )
-            rec.admission_state = admission.state if admission else 'draft'
+            dummy, state = admissions.get(rec.patient_id.id, (False, False))
+            rec.admission_state = state or 'draft'
     
     ### EVALUATIONS
     purpose = fields.Selection(
@@ -237,203 +271,8 @@ class PatientMedicalEvaluation(models.Model):
     
 
     ###### end admission workflow ######
-    hdl = fields.Integer(string='Last HDL', help="Last HDL Cholesterol reading. It can be approximative")
-    ldl = fields.Integer(string='Last LDL', help="Last LDL Cholesterol reading. It can be approximative")
-    tag = fields.Integer(string='Last TAGs', help="Triacylglycerols (triglicerides) level. It can be approximative")
-    systolic = fields.Integer(string='Systolic Pressure')
-    diastolic = fields.Integer(string='Diastolic Pressure')
-    bpm = fields.Integer(string='Heart Rate', help="Heart rate expressed in beats per minute")
-    respiratory_rate = fields.Integer(string='Respiratory Rate', help="Respiratory rate expressed in breaths per minute")
-    osat = fields.Integer(string='Oxygen Saturation', help="Oxygen Saturation (arterial).")
-    malnutrition = fields.Boolean(string='Malnutrition', help="Check this box if the patient show signs of malnutrition. If not associated to a disease, please encode the correspondent disease on the patient disease history. For example, Moderate protein-energy malnutrition, E44.0 in ICD-10 encoding")
-    dehydration = fields.Boolean(string='Dehydration', help="Check this box if the patient show signs of dehydration. If not associated to a disease, please encode the correspondent disease on the patient disease history. For example, Volume Depletion, E86 in ICD-10 encoding")
-    temperature = fields.Float(string='Temperature (celsius)')
-    weight = fields.Float(string='Weight (kg)')
-    height = fields.Float(string='Height (cm)')
-    bmi = fields.Float(string='Body Mass Index (BMI)')
-    head_circumference = fields.Float(string='Head Circumference', help="Head circumference")
-    abdominal_circ = fields.Float(string='Abdominal Circumference')
-    edema = fields.Boolean(string='Edema', help="Please also encode the correspondent disease on the patient disease history. For example,  R60.1 in ICD-10 encoding")
-    petechiae = fields.Boolean(string='Petechiae')
-    hematoma = fields.Boolean(string='Hematomas')
-    cyanosis = fields.Boolean(string='Cyanosis', help="If not associated to a disease, please encode it on the patient disease history. For example,  R23.0 in ICD-10 encoding")
-    acropachy = fields.Boolean(string='Acropachy', help="Check if the patient shows acropachy / clubbing")
-    nystagmus = fields.Boolean(string='Nystagmus', help="If not associated to a disease, please encode it on the patient disease history. For example,  H55 in ICD-10 encoding")
-    miosis = fields.Boolean(string='Miosis', help="If not associated to a disease, please encode it on the patient disease history. For example,  H57.0 in ICD-10 encoding" )
-    mydriasis = fields.Boolean(string='Mydriasis', help="If not associated to a disease, please encode it on the patient disease history. For example,  H57.0 in ICD-10 encoding")
-    # cough = fields.Boolean(string='Cough', help="If not associated to a disease, please encode it on the patient disease history.")
-    palpebral_ptosis = fields.Boolean(string='Palpebral Ptosis', help="If not associated to a disease, please encode it on the patient disease history")
-    arritmia = fields.Boolean(string='Arritmias', help="If not associated to a disease, please encode it on the patient disease history")
-    heart_murmurs = fields.Boolean(string='Heart Murmurs')
-    heart_extra_sounds = fields.Boolean(string='Heart Extra Sounds', help="If not associated to a disease, please encode it on the patient disease history")
-    jugular_engorgement = fields.Boolean(string='Tremor', help="If not associated to a disease, please encode it on the patient disease history")
-    ascites = fields.Boolean(string='Ascites', help="If not associated to a disease, please encode it on the patient disease history")
-    lung_adventitious_sounds = fields.Boolean(string='Lung Adventitious sounds', help="Crackles, wheezes, ronchus..")
-    bronchophony = fields.Boolean(string='Bronchophony')
-    increased_fremitus = fields.Boolean(string='Increased Fremitus')
-    decreased_fremitus = fields.Boolean(string='Decreased Fremitus')
-    jaundice = fields.Boolean(string='Jaundice', help="If not associated to a disease, please encode it on the patient disease history")
-    lynphadenitis = fields.Boolean(string='Linphadenitis', help="If not associated to a disease, please encode it on the patient disease history")
-    breast_lump = fields.Boolean(string='Breast Lumps')
-    breast_asymmetry = fields.Boolean(string='Breast Asymmetry')
-    nipple_inversion = fields.Boolean(string='Nipple Inversion')
-    nipple_discharge = fields.Boolean(string='Nipple Discharge')
-    peau_dorange = fields.Boolean(string='Peau d orange',help="Check if the patient has prominent pores in the skin of the breast" )
-    gynecomastia = fields.Boolean(string='Gynecomastia')
-    masses = fields.Boolean(string='Masses', help="Check when there are findings of masses / tumors / lumps")
-    hypotonia = fields.Boolean(string='Hypotonia', help="Please also encode the correspondent disease on the patient disease history.")
-    hypertonia = fields.Boolean(string='Hypertonia', help="Please also encode the correspondent disease on the patient disease history.")
-    pressure_ulcers = fields.Boolean(string='Pressure Ulcers', help="Check when Decubitus / Pressure ulcers are present")
-    goiter = fields.Boolean(string='Goiter')
-    alopecia = fields.Boolean(string='Alopecia', help="Check when alopecia - including androgenic - is present")
-    xerosis = fields.Boolean(string='Xerosis')
-    erithema = fields.Boolean(string='Erithema', help="Please also encode the correspondent disease on the patient disease history.")
-    loc = fields.Integer(string='Level of Consciousness', help="Level of Consciousness - on Glasgow Coma Scale :  1=coma - 15=normal")
-    loc_eyes = fields.Integer(string='Level of Consciousness - Eyes', help="Eyes Response - Glasgow Coma Scale - 1 to 4", default=lambda *a: 4)
-    loc_verbal = fields.Integer(string='Level of Consciousness - Verbal', help="Verbal Response - Glasgow Coma Scale - 1 to 5", default=lambda *a: 5)
-    loc_motor = fields.Integer(string='Level of Consciousness - Motor', help="Motor Response - Glasgow Coma Scale - 1 to 6", default=lambda *a: 6)
-    violent = fields.Boolean(string='Violent Behaviour', help="Check this box if the patient is agressive or violent at the moment")
-    # mood = fields.Selection(MOOD, string='Mood', index=True)
-    # indication = fields.Many2one('oeh.medical.pathology', string='Indication', help="Choose a disease for this medicament from the disease list. It can be an existing disease of the patient or a prophylactic.")
-    indication = fields.Char(string='Indication', help="Choose a disease for this medicament from the disease list. It can be an existing disease of the patient or a prophylactic.")
-    orientation = fields.Boolean(string='Orientation', help="Check this box if the patient is disoriented in time and/or space")
-    memory = fields.Boolean(string='Memory', help="Check this box if the patient has problems in short or long term memory")
-    knowledge_current_events = fields.Boolean(string='Knowledge of Current Events', help="Check this box if the patient can not respond to public notorious events")
-    judgment = fields.Boolean(string='Jugdment', help="Check this box if the patient can not interpret basic scenario solutions")
-    abstraction = fields.Boolean(string='Abstraction', help="Check this box if the patient presents abnormalities in abstract reasoning")
-    vocabulary = fields.Boolean(string='Vocabulary', help="Check this box if the patient lacks basic intelectual capacity, when she/he can not describe elementary objects")
-    calculation_ability = fields.Boolean(string='Calculation Ability',help="Check this box if the patient can not do simple arithmetic problems")
-    object_recognition = fields.Boolean(string='Object Recognition', help="Check this box if the patient suffers from any sort of gnosia disorders, such as agnosia, prosopagnosia ...")
-    praxis = fields.Boolean(string='Praxis', help="Check this box if the patient is unable to make voluntary movements")
-    info_diagnosis = fields.Text(string='Presumptive Diagnosis')
-    directions = fields.Text(string='Plan')
-    # Family history
-    family_history_condition = fields.Text(string="Family History Condition")
 
     patient_status = fields.Selection(PATIENT_STATUS, string="Patient Status")
-    # dietary fields
-    dietary_history = fields.Text(string="Dietary History")
-    social_history = fields.Text(string="Social History")
-    notes = fields.Text(string="Notes")
-    # Nutrition
-    diet = fields.Selection([('regular', 'Regular'), ('soft', 'Soft'), ('pureed', 'Pureed')], 'Nurse Assessment: Diet')
-    recent_weight_change = fields.Boolean(string="Nurse Assessment: Recent weight Change")
-    conditions_affecting_ecs = fields.Boolean(
-        string="Nurse Assessment: Condition affecting eating, chewing and swallowing")
-    mucous_membranes = fields.Selection([('moist', 'Moist'), ('dry', 'Dry')], 'Nurse Assessment: Mucous Membranes')
-
-    # skin
-    skin = fields.Selection([('normal', 'Normal'), ('pale', 'Pale'), ('red', 'Red'),
-                             ('rash', 'Rash'), ('bruise', 'Bruise'), ('breakdown', 'Skinbreakdown')],
-                            'Nurse Assessment: Skin')
-    skin_intact = fields.Boolean(string="Nurse Assessment: Skin intact")
-    special_care = fields.Boolean(string="Nurse Assessment: Special care required")
-    wound_assessment = fields.Text(string='Nurse Assessment: Wound Assessment', required=False)
-
-    # neuro
-    level_of_consciousness = fields.Selection([('alert', 'Alert'), ('altered', 'Altered')],
-                                              'Nurse Assessment: Level of consciousness')
-    seizure_tremor_fainting = fields.Boolean(string="seizure/ tremor/fainting")
-    difficulty_in_orientation = fields.Boolean(string="Nurse Assessment: Difficulty in orientation")
-    sensation = fields.Selection([('intact', 'Intact'), ('diminished', 'Diminished'), ('absent', 'Absent')],
-                                 'Intact/Diminished / Absent')
-    memory_deficit = fields.Boolean(string="Nurse Assessment: Memory Deficit")
-    impaired_decision_making = fields.Boolean(string="Nurse Assessment: Impaired decision making")
-    sleep_aids = fields.Boolean(string="Nurse Assessment: Sleep aids")
-
-    # pain / discomfort
-    pain = fields.Boolean(string="Nurse Assessment: Discomfort/Pain")
-    pain_score = fields.Selection([
-        ('0', '0'),
-        ('1', '1'),
-        ('2', '2'),
-        ('3', '3'),
-        ('4', '4'),
-        ('5', '5'),
-        ('6', '6'),
-        ('7', '7'),
-        ('8', '8'),
-        ('9', '9'),
-        ('10', '10')
-    ], 'Nurse Assessment: Pain Score')
-    location = fields.Char(string='Nurse Assessment: Pain/Discomfort Location')
-    frequency = fields.Char(string='Nurse Assessment: Pain/Discomfort Frequency')
-    duration = fields.Char(string='Nurse Assessment: Pain/Discomfort Duration')
-    treatment = fields.Char(string='Nurse Assessment: Treatment (if any)')
-
-    # respiration
-    respirations = fields.Selection(RESPIRATION_TYPE, 'Nurse Assessment: Respirations')
-    breath_sounds = fields.Selection([('clear', 'Clear'), ('wheezes', 'Wheezes'), ('crackles', 'Crackles')],
-                                     'Nurse Assessment: Breath sounds')
-    shorthess_of_breath = fields.Boolean(string="Nurse Assessment: Shortness of breath")
-    shorthess_of_breath_trigger = fields.Text('Trigger: shorthess of breath')
-    cough = fields.Boolean(string="Cough")
-    cough_type = fields.Selection([('productive', 'Productive'), ('non_productive', 'Non Productive')],
-                                  'Nurse Assessment: Productive / Non Productive')
-    respiratory_treatment = fields.Selection([('none', 'None'), ('oxygen', 'Oxygen'),
-                                              ('nebulizer', 'Nebulizer'), ('cpap', 'CPAP'), ('bipap', 'BIPAP')],
-                                             'Respiratory Treatments')
-
-    # cardiovascular / circulation
-    history = fields.Selection([('normal', 'Normal'), ('arrythmia', 'Arrythmia'),
-                                ('hypertension', 'Hypotension'), ('dizziness', 'Dizziness')],
-                               'Nurse Assessment: History')
-    pulse = fields.Selection([('regular', 'Regular'), ('irregular', 'Irregular')], 'Nurse Assessment: Pulse')
-    explain_edema = fields.Text('Nurse Assessment: Explain edema if any')
-    chest_pain = fields.Boolean(string="Nurse Assessment: Chest pain")
-    explain_chest_pain = fields.Text('Nurse Assessment: Explain chest pain if any')
-
-    # gastro intestinal
-    gastrointestinal_bleeding = fields.Boolean(string="Nurse Assessment: Bleeding")
-    gastrointestinal_diarrhea = fields.Boolean(string="Nurse Assessment: Gastro: Diarrhea")
-    gastrointestinal_constipation = fields.Boolean(string="Nurse Assessment: Gastro: Constipation")
-    gastrointestinal_vomiting = fields.Boolean(string="Nurse Assessment: Gastro: Vomiting")
-    gastrointestinal_nausea = fields.Boolean(string="Nurse Assessment: Gastro: Nausea")
-    gastrointestinal_gastrostomy = fields.Boolean(string="Nurse Assessment: Gastrostomy")
-    gastrointestinal_enteral_tube = fields.Boolean(string="Nurse Assessment: Enteral tube")
-    gastrointestinal_abdominal_pain = fields.Boolean(string="Nurse Assessment: Gastro: Abdominal Pain")
-
-    change_in_appetite = fields.Selection([('yes', 'Yes'), ('no', 'No')], 'Nurse Assessment: Change in appetite')
-    explain_change_in_appetite = fields.Text('Explain change in appetite')
-    bowel_sounds = fields.Boolean(string="Gastro: Bowel sounds")
-    bowel_movement = fields.Boolean(string="Bowel movement")
-
-    # genitourinary
-    bladder_control = fields.Selection([('full_control', 'Full Control'),
-                                        ('incontinence', 'Incontinence')], 'Nurse Assessment: Bladder Control')
-    bladder_frequency = fields.Char(string='Nurse Assessment: Frequency')
-    blood_in_urine = fields.Boolean(string="Nurse Assessment: Blood in urine")
-    difficulty_urinating = fields.Boolean(string="Nurse Assessment: Difficulty urinating")
-    nocturnia = fields.Boolean(string="Nurse Assessment: Nocturnia")
-    indwelling_catheter = fields.Boolean(string="Nurse Assessment: Indwelling catheter")
-
-    # musculoskeletal
-    mobility = fields.Selection([('normal', 'Normal'), ('impaired', 'Impaired')], 'Nurse Assessment: Mobility')
-    assistive_devices = fields.Selection(
-        [('walking_stick', 'Walking Stick'), ('wheelchair', 'Wheel Chair'), ('stretcher', 'Stretcher')],
-        string="Assistive Devices")
-    # assistive_devices = fields.Boolean(string="Assistive devices")
-    range_of_motion = fields.Selection([('full', 'Full'), ('limited', 'Limited')], 'Range of motion')
-    activities_of_daily = fields.Selection([('self', 'Self'), ('assist', 'Assit'),
-                                            ('total', 'Total')], 'Activities of daily living')
-    # sensory 
-    vision = fields.Selection([('normal', 'Normal'), ('impaired', 'Impaired')], 'Nurse Assessment: Vision')
-    corrective_device = fields.Char('Corrective device')
-    hearing = fields.Selection([('normal', 'Normal'), ('impaired', 'Impaired')], 'Nurse Assessment: Hearing')
-    hearing_aid = fields.Boolean(string="Nurse Assessment: Hearing Aid")
-
-    # nursing assessment notes
-    nursing_assessment_notes = fields.Text(string="Nurse Assesment: Notes")
-    ####################################################################
-    # current medications
-    allergies = fields.Boolean('Allergies')
-    allergies_selection = fields.Selection(ALLERGIES_SELECTION, 'Allergies to medicines')
-    allergy_cause = fields.Text(string="Cause of Allergy")
-    allergic_reaction_seen = fields.Text(string="Allergic reaction seen")
-    current_medication = fields.Selection(ALLERGIES_SELECTION, 'Any current medications?', default='no')
-    # currentmedications = fields.One2many('oeha.currentmedication', 'evaluation_id', string="Current Medications")
-    other_medications = fields.Text(string="Other medications")
-    other_allergies = fields.Selection(ALLERGIES_SELECTION, 'Other Allergies ')
 
     #######################################################################
     # Treatment sheet
@@ -446,35 +285,18 @@ class PatientMedicalEvaluation(models.Model):
     discharge_patient_name = fields.Char(string="Patient Name", related='patient_id.name')
     discharge_patient_id = fields.Char(string="Discharge Patient NO", related='patient_id.patient_no')
     patient_admission_date = fields.Datetime(string="Patient Evaluation Date", related='evaluation_start_date')
-    patient_discharge_date = fields.Date('Discharge Date')
     care_provider = fields.Many2one('res.users', 'Care provider', default=lambda self: self.env.user)
     discharge_attending_physician = fields.Char(string="Attending Physician", related='care_provider.name')
-    discharge_admission_diagnosis = fields.Char(string="Admission Diagnosis")
-    # discharge_final_diagnoses = fields.Many2one('oeh.medical.pathology', string='Diagnoses')
-    discharge_condition = fields.Text(string="Condition on discharge")
-    discharge_final_diagnoses = fields.Text(string="Final Diagnoses")
-
-    present_illness_history = fields.Text(string="History of present illness")
-    # discharge_medications = fields.One2many('oeha.dischargemedication', 'evaluation_id', string="Discharge Medications")
-    # discharge_procedures = fields.One2many('oeha.dischargeprocedure', 'evaluation_id',
-    #                                        string="Discharge Treatments / Procedures Performed")
-    discharge_instructions = fields.Text(string="Additional Instructions")
-    discharge_completed_by = fields.Many2one('res.users', 'Completed By', default=lambda self: self.env.user)
+
 
     # Doctor Edit Function
     can_edit = fields.Boolean(string='Edit')
 
-    # Evaluation addedndum
-    evaluation_addendum = fields.Text(string="Evaluation addendum")
 
-    # Vital Signs and Antropometry
-    vital_signs_anthropometry_notes = fields.Text(string="Vital signs: Notes",
-                                                  help="Vital signs and anthropometry notes")
     vitalsigns = fields.One2many('patient.vitalsigns', 'evaluation_id', string="Vital Signs")
 
     # Extended Visit Summary Tab fields
     follow_up = fields.Selection(FOLLOW_UP, string="Follow-Up")
-    info_diagnosis_discharge = fields.Text(string="Information on Diagnosis", store=True,)
      
     # # added signs and symptoms fields
     # # general
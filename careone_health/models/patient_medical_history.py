@@ -1,6 +1,7 @@
 # models/res_patient_pharmacy_history.py
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import sql
 
 # models/pharmacy_allergy.py
 class PatientMedicalHistory(models.Model):
@@ -16,4 +17,9 @@ class PatientMedicalHistory(models.Model):
     description = fields.Text(string='Description')
     evaluation_ids = fields.Many2many("patient.medical.evaluation", string="Medical Evaluation")
     patient_id = fields.Many2one("res.partner", string="Patient ID")
- 
\ No newline at end of file
+ 
+
+    def init(self):
+        # patient timeline
+        sql.create_index(self.env.cr, 'patient_medical_history_patient_date_idx',
+                         self._table, ['patient_id', 'create_date'])
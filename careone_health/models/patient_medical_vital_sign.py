@@ -1,6 +1,138 @@
 # models/res_patient_pharmacy_history.py
-from odoo import models, fields, api, _
+import logging
+import re
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+from odoo import models, fields, api, SUPERUSER_ID, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.modules.registry import Registry
+from odoo.tools import sql
+
+from .patient_early_warning import EWS_RISKS, compute_news2
+
+_logger = logging.getLogger(__name__)
+
+VITAL_FIELDS = ['temp', 'systolic', 'diastolic', 'heart_rate', 'respiratory', 'oxy_saturate']
+BUCKET_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# plausible ranges; readings outside are rejected as device or transmission errors
+VITAL_RANGES = {
+    'temp': (25.0, 45.0),
+    'systolic': (30, 300),
+    'diastolic': (10, 200),
+    'heart_rate': (10, 300),
+    'respiratory': (0, 80),
+    'oxy_saturate': (0, 100),
+}
+
+
+class VitalSignBuffer:
+    '''Bounded, per-process buffer of validated readings, used by the opt-in
+    buffered mode of the ingestion endpoint. Readings not flushed yet are
+    lost if the worker process stops (recycled or killed).
+
+    Readings are written with multi-row inserts of `page_size` rows when the
+    buffer holds `flush_size` rows or its oldest row is `max_delay` seconds
+    old. When the database cannot keep up and the buffer reaches `max_size`
+    rows, `add` refuses new readings so the caller can apply back-pressure.
+
+    Each page is inserted in a savepoint. A page that fails is retried row by
+    row, and the rows that fail again (e.g. their evaluation was deleted since
+    they were validated) are logged and dropped, so one bad reading cannot
+    block the buffer. When the database itself is unavailable the readings
+    are kept and the flush is retried after `max_delay`.
+    '''
+    flush_size = 500
+    page_size = 500
+    max_delay = 5.0
+    max_size = 10000
+
+    def __init__(self, dbname):
+        self.dbname = dbname
+        self.rows = []
+        self.oldest = None
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def add(self, rows):
+        with self.lock:
+            if len(self.rows) + len(rows) > self.max_size:
+                return False
+            if not self.rows:
+                self.oldest = time.monotonic()
+            self.rows.extend(rows)
+            due = len(self.rows) >= self.flush_size or time.monotonic() - self.oldest >= self.max_delay
+            if not due:
+                self._schedule()
+        if due:
+            self.flush()
+        return True
+
+    def _schedule(self):
+        # called with the lock held
+        if self.rows and not self.timer:
+            self.timer = threading.Timer(self.max_delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _insert_page(self, cr, page):
+        '''Insert one page in a savepoint, retrying its rows one by one if it
+        fails. Return the rows that could not be inserted.'''
+        VitalSigns = api.Environment(cr, SUPERUSER_ID, {})['patient.vitalsigns']
+        try:
+            with cr.savepoint():
+                VitalSigns._insert_readings(page)
+            return []
+        except Exception:
+            _logger.warning('Could not insert %s vital sign readings, retrying them one by one',
+                            len(page), exc_info=True)
+        failed = []
+        for row in page:
+            try:
+                with cr.savepoint():
+                    VitalSigns._insert_readings([row])
+            except Exception as e:
+                _logger.error('Dropped vital sign reading %s: %s', row, e)
+                failed.append(row)
+        return failed
+
+    def flush(self):
+        with self.lock:
+            rows, self.rows = self.rows, []
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+        if not rows:
+            return 0
+        dropped = []
+        try:
+            with Registry(self.dbname).cursor() as cr:
+                for index in range(0, len(rows), self.page_size):
+                    dropped += self._insert_page(cr, rows[index:index + self.page_size])
+        except Exception:
+            # nothing was committed: keep the readings, except the dropped ones
+            _logger.exception('Could not flush %s vital sign readings, keeping them buffered', len(rows))
+            dropped_ids = {id(row) for row in dropped}
+            with self.lock:
+                self.rows[:0] = [row for row in rows if id(row) not in dropped_ids]
+                self.oldest = time.monotonic()
+                self._schedule()
+            return 0
+        return len(rows) - len(dropped)
+
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def get_vital_sign_buffer(dbname):
+    with _buffers_lock:
+        if dbname not in _buffers:
+            _buffers[dbname] = VitalSignBuffer(dbname)
+        return _buffers[dbname]
+
 
 class VitalSigns(models.Model):
     _name = 'patient.vitalsigns'
@@ -14,3 +146,238 @@ class VitalSigns(models.Model):
     respiratory = fields.Integer(string="Respiratory")
     oxy_saturate = fields.Integer(string="Oxygen Saturation")
     evaluation_id = fields.Many2one('patient.medical.evaluation', string="Evaluation", ondelete='cascade')
+    patient_id = fields.Many2one(related='evaluation_id.patient_id', store=True, string="Patient")
+    # scored from the stored values by `_update_ews`, see there
+    ews_score = fields.Integer(string="Early Warning Score", readonly=True)
+    ews_risk = fields.Selection(EWS_RISKS, string="Clinical Risk", readonly=True)
+
+    def init(self):
+        # time-series access paths: per patient and per evaluation, by time
+        sql.create_index(self.env.cr, 'patient_vitalsigns_patient_time_idx',
+                         self._table, ['patient_id', 'time'])
+        sql.create_index(self.env.cr, 'patient_vitalsigns_evaluation_time_idx',
+                         self._table, ['evaluation_id', 'time'])
+
+    def _update_ews(self):
+        '''Score the readings from their stored values, where a vital that was
+        not recorded is NULL (see `create` and `write`). The ORM reads NULL as
+        0, a valid and critical reading, so the score cannot be computed from
+        the record cache.'''
+        if not self:
+            return
+        self.flush_recordset(VITAL_FIELDS)
+        self.env.cr.execute("SELECT id, {columns} FROM patient_vitalsigns WHERE id IN %s".format(
+            columns=', '.join(VITAL_FIELDS)), (tuple(self.ids),))
+        values = [(row['id'],) + compute_news2(row) for row in self.env.cr.dictfetchall()]
+        execute_values(self.env.cr._obj, """
+            UPDATE patient_vitalsigns v
+               SET ews_score = s.score::integer, ews_risk = s.risk::varchar
+              FROM (VALUES %s) AS s(id, score, risk)
+             WHERE v.id = s.id
+        """, values, page_size=1000)
+        self.invalidate_recordset(['ews_score', 'ews_risk'])
+
+    # The ORM stores 0 for a vital left blank in a form, so an empty or 0 vital
+    # written through it is stored as NULL: not recorded. Only the ingestion
+    # endpoint, whose JSON tells null from 0, stores a recorded 0.
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        vals_list = [
+            {fname: value for fname, value in vals.items() if fname not in VITAL_FIELDS or value}
+            for vals in vals_list
+        ]
+        records = super().create(vals_list)
+        records._update_ews()
+        self.env['patient.ews.latest']._update_from_readings(records.ids)
+        return records
+
+    def write(self, vals):
+        moved = set(vals) & {'time', 'evaluation_id'}
+        patients = self.patient_id if moved else self.env['res.partner']
+        res = super().write(vals)
+        cleared = [fname for fname in VITAL_FIELDS if fname in vals and not vals[fname]]
+        if cleared:
+            self.flush_recordset(cleared)
+            self.env.cr.execute("UPDATE patient_vitalsigns SET {columns} WHERE id IN %s".format(
+                columns=', '.join('%s = NULL' % fname for fname in cleared)), (tuple(self.ids),))
+            self.invalidate_recordset(cleared)
+        if set(vals) & set(VITAL_FIELDS):
+            self._update_ews()
+        if moved:
+            # the reading may no longer be the latest of its former patient
+            self.env['patient.ews.latest']._recompute_for_patients((patients | self.patient_id).ids)
+        elif set(vals) & set(VITAL_FIELDS):
+            self.env['patient.ews.latest']._update_from_readings(self.ids)
+        return res
+
+    def unlink(self):
+        patient_ids = self.patient_id.ids
+        res = super().unlink()
+        self.env['patient.ews.latest']._recompute_for_patients(patient_ids)
+        return res
+
+    @api.model
+    def _parse_bucket(self, bucket):
+        '''Convert a bucket size such as 300, '30s', '5m', '1h' or '1d' to seconds.'''
+        match = re.fullmatch(r'\s*(\d+)\s*([smhd]?)\s*', str(bucket))
+        if not match or int(match.group(1)) <= 0:
+            raise ValidationError(_('Invalid bucket size: %s') % bucket)
+        return int(match.group(1)) * BUCKET_UNITS[match.group(2) or 's']
+
+    @api.model
+    def get_series(self, patient_id, date_from, date_to, bucket=None):
+        '''Return the vital signs of a patient between two datetimes.
+
+        Without `bucket` the raw readings are returned. With a bucket size
+        (see `_parse_bucket`) readings are downsampled in SQL to one point per
+        bucket holding the min, max and average of every vital sign. Both
+        forms are a single range scan of the (patient_id, time) index.
+        '''
+        date_from = fields.Datetime.to_datetime(date_from)
+        date_to = fields.Datetime.to_datetime(date_to)
+        if not date_from or not date_to or date_from > date_to:
+            raise ValidationError(_('A valid time range is required.'))
+        self.flush_model(['patient_id', 'time'] + VITAL_FIELDS)
+        params = {'patient_id': patient_id, 'date_from': date_from, 'date_to': date_to}
+        if not bucket:
+            self.env.cr.execute("""
+                SELECT time, {columns}
+                  FROM patient_vitalsigns
+                 WHERE patient_id = %(patient_id)s AND time >= %(date_from)s AND time <= %(date_to)s
+              ORDER BY time
+            """.format(columns=', '.join(VITAL_FIELDS)), params)
+            return [dict(row, time=row['time'].isoformat()) for row in self.env.cr.dictfetchall()]
+
+        params['bucket'] = self._parse_bucket(bucket)
+        aggregates = ', '.join(
+            'min({f}) AS {f}_min, max({f}) AS {f}_max, round(avg({f})::numeric, 2)::float AS {f}_avg'.format(f=fname)
+            for fname in VITAL_FIELDS
+        )
+        self.env.cr.execute("""
+            SELECT to_timestamp(floor(extract(epoch FROM time) / %(bucket)s) * %(bucket)s)
+                       AT TIME ZONE 'UTC' AS bucket,
+                   count(*) AS readings,
+                   {aggregates}
+              FROM patient_vitalsigns
+             WHERE patient_id = %(patient_id)s AND time >= %(date_from)s AND time <= %(date_to)s
+          GROUP BY 1
+          ORDER BY 1
+        """.format(aggregates=aggregates), params)
+        return [dict(row, bucket=row['bucket'].isoformat()) for row in self.env.cr.dictfetchall()]
+
+    # ==================== ingestion ====================
+
+    @api.model
+    def _get_open_evaluation_ids(self, patient_ids):
+        '''Return {patient_id: evaluation_id} of the evaluation readings of
+        each patient are attached to: the nurse assessment of the current
+        inpatient admission, otherwise the latest evaluation not completed.'''
+        if not patient_ids:
+            return {}
+        self.env['patient.medical.evaluation'].flush_model(['patient_id', 'admission_id', 'state', 'purpose'])
+        self.env['patient.medical.admission'].flush_model(['state'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (e.patient_id) e.patient_id, e.id
+              FROM patient_medical_evaluation e
+         LEFT JOIN patient_medical_admission a ON a.id = e.admission_id
+             WHERE e.patient_id IN %s
+               AND (a.state = 'inpatient' OR e.state IS DISTINCT FROM 'Completed')
+          ORDER BY e.patient_id,
+                   a.state = 'inpatient' DESC NULLS LAST,
+                   e.purpose = 'nurse_assessment' DESC NULLS LAST,
+                   e.id DESC
+        """, (tuple(patient_ids),))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _prepare_readings(self, readings):
+        '''Validate raw readings (dicts with patient_id, optional evaluation_id
+        and time, and vital values) for a batched insert. Every patient must
+        have an open evaluation or admission. Each reading is validated on its
+        own: return (rows, errors) where errors are (index, message) pairs of
+        the rejected readings.'''
+        rows, errors = [], []
+        references = {}
+        for index, reading in enumerate(readings):
+            try:
+                if not isinstance(reading, dict):
+                    raise ValueError(_('a reading must be an object'))
+                references[index] = (self._parse_reading_id(reading, 'patient_id'),
+                                     self._parse_reading_id(reading, 'evaluation_id', required=False))
+            except ValueError as e:
+                errors.append((index, str(e)))
+        open_evaluations = self._get_open_evaluation_ids(
+            list({patient_id for patient_id, dummy in references.values()}))
+        requested = {evaluation_id for dummy, evaluation_id in references.values() if evaluation_id}
+        evaluation_patients = {}
+        if requested:
+            self.env.cr.execute("SELECT id, patient_id FROM patient_medical_evaluation WHERE id IN %s",
+                                (tuple(requested),))
+            evaluation_patients = dict(self.env.cr.fetchall())
+        now = fields.Datetime.now()
+        for index, reading in enumerate(readings):
+            if index not in references:
+                continue
+            try:
+                patient_id, evaluation_id = references[index]
+                if evaluation_id:
+                    if evaluation_patients.get(evaluation_id) != patient_id:
+                        raise ValueError(_('evaluation %s does not belong to patient %s') % (evaluation_id, patient_id))
+                else:
+                    evaluation_id = open_evaluations.get(patient_id)
+                    if not evaluation_id:
+                        raise ValueError(_('patient %s has no open evaluation or admission') % patient_id)
+                row = {
+                    'patient_id': patient_id,
+                    'evaluation_id': evaluation_id,
+                    'time': fields.Datetime.to_datetime(reading.get('time')) or now,
+                }
+                for fname in VITAL_FIELDS:
+                    value = reading.get(fname)
+                    if value is None:
+                        row[fname] = None
+                        continue
+                    value = float(value) if fname == 'temp' else int(value)
+                    low, high = VITAL_RANGES[fname]
+                    if not low <= value <= high:
+                        raise ValueError(_('%s out of range: %s') % (fname, value))
+                    row[fname] = value
+                rows.append(row)
+            except (TypeError, ValueError) as e:
+                errors.append((index, str(e)))
+        return rows, sorted(errors)
+
+    @api.model
+    def _parse_reading_id(self, reading, key, required=True):
+        value = reading.get(key)
+        if value in (None, '', False):
+            if required:
+                raise ValueError(_('%s is required') % key)
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(_('%s must be an integer: %s') % (key, value))
+
+    @api.model
+    def _insert_readings(self, rows):
+        '''Write prepared readings with a single multi-row INSERT.'''
+        if not rows:
+            return []
+        columns = ['patient_id', 'evaluation_id', 'time', 'ews_score', 'ews_risk'] + VITAL_FIELDS
+        for row in rows:
+            # the score is computed once per reading, as it is inserted
+            row['ews_score'], row['ews_risk'] = compute_news2(row)
+        now = fields.Datetime.now()
+        ids = execute_values(self.env.cr._obj, """
+            INSERT INTO patient_vitalsigns ({columns}, create_uid, create_date, write_uid, write_date)
+            VALUES %s RETURNING id
+        """.format(columns=', '.join(columns)), [
+            tuple(row[col] for col in columns) + (self.env.uid, now, self.env.uid, now)
+            for row in rows
+        ], page_size=1000, fetch=True)
+        self.invalidate_model()
+        ids = [row[0] for row in ids]
+        self.env['patient.ews.latest']._update_from_readings(ids)
+        return ids
@@ -1,8 +1,17 @@
 # models/pharmacy_prescription_line.py
+import logging
+import threading
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import sql
 from datetime import timedelta
 
+_logger = logging.getLogger(__name__)
+
+# prescriptions whose lines may still be repriced
+OPEN_PRESCRIPTION_STATES = ('draft', 'verified')
+
 class PharmacyPrescriptionLine(models.Model):
     _name = 'pharmacy.prescription.line'
     _description = 'Pharmacy Prescription Line'
@@ -43,7 +52,11 @@ class PharmacyPrescriptionLine(models.Model):
     dispensed_date = fields.Datetime(string='Dispensed Date')
     refills_allowed = fields.Integer(string='Refills Allowed', default=0)
     refills_remaining = fields.Integer(string='Refills Remaining', default=0)
-    price_unit = fields.Float(string='Unit Price', related='product_id.list_price', readonly=True)
+    refill_reminder_date = fields.Datetime(string='Refill Reminder Sent', readonly=True, copy=False)
+    # Snapshot of the branch price at prescription time. It only depends on the
+    # line's own product/uom so that a list_price change does not cascade into
+    # historical lines and totals; see `reprice_open_prescriptions`.
+    price_unit = fields.Float(string='Unit Price', compute='_compute_price_unit', store=True, readonly=False, precompute=True)
     price_subtotal = fields.Float(string='Subtotal', compute='_compute_price_subtotal', store=True)
     notes = fields.Text(string='Notes')
     
@@ -52,22 +65,135 @@ class PharmacyPrescriptionLine(models.Model):
         ('outbound', 'Outbound'),
     ], string='Prescription Type')
     
-    @api.depends('start_date', 'frequency_duration', 'frequency')
+    def init(self):
+        # Partial index backing the refill-due queue: only lines that can still
+        # be dispensed or refilled are indexed, ordered by their due date. The
+        # predicate is written the way the ORM renders ('is_dispensed', '=', False),
+        # otherwise the planner cannot prove that the queue query implies it.
+        sql.drop_index(self.env.cr, 'pharmacy_prescription_line_refill_due_idx', self._table)
+        sql.create_index(
+            self.env.cr,
+            'pharmacy_prescription_line_refill_queue_idx',
+            self._table,
+            ['expected_next_visit', 'history_id'],
+            where='expected_next_visit IS NOT NULL'
+                  ' AND (is_dispensed IS NULL OR is_dispensed = false OR refills_remaining > 0)',
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if 'refills_remaining' not in vals and vals.get('refills_allowed'):
+                vals['refills_remaining'] = vals['refills_allowed']
+        return super().create(vals_list)
+
+    def write(self, vals):
+        # a dispense or refill starts a new supply: its next refill is due a
+        # reminder again
+        if 'refill_reminder_date' not in vals and ('dispensed_date' in vals or 'refills_remaining' in vals):
+            vals = dict(vals, refill_reminder_date=False)
+        return super().write(vals)
+
+    def _dispense(self):
+        '''Dispense the lines: the first dispense of a line, or else one of
+        its remaining refills. The next visit is then due one duration after
+        this dispense.'''
+        now = fields.Datetime.now()
+        for line in self:
+            vals = {
+                'dispensed_quantity': line.quantity,
+                'dispensed_by': self.env.uid,
+                'dispensed_date': now,
+            }
+            if not line.is_dispensed:
+                vals['is_dispensed'] = True
+            elif line.refills_remaining > 0:
+                vals['refills_remaining'] = line.refills_remaining - 1
+            else:
+                raise UserError(_('No refill remains for %s.') % line.product_id.display_name)
+            line.write(vals)
+        return True
+
+    def action_dispense_refill(self):
+        return self.filtered('is_dispensed')._dispense()
+
+    @api.model
+    def _get_refill_due_domain(self, branch_id=None, within_days=7):
+        '''Domain of lines whose next visit falls before now + `within_days`
+        and that are not yet dispensed or still have refills remaining.
+        The first clauses match the partial refill-due index.'''
+        due_limit = fields.Datetime.now() + timedelta(days=within_days)
+        domain = [
+            ('expected_next_visit', '!=', False),
+            ('expected_next_visit', '<=', due_limit),
+            '|', ('is_dispensed', '=', False), ('refills_remaining', '>', 0),
+            ('history_id.state', '!=', 'cancelled'),
+        ]
+        if branch_id:
+            domain.append(('history_id.branch_id', '=', branch_id))
+        return domain
+
+    @api.model
+    def get_refills_due(self, branch_id=None, within_days=7, limit=None, offset=0):
+        '''Return the refill-due worklist ordered by due date.'''
+        return self.search(
+            self._get_refill_due_domain(branch_id=branch_id, within_days=within_days),
+            order='expected_next_visit, id', limit=limit, offset=offset,
+        )
+
+    @api.model
+    def _cron_send_refill_reminders(self, within_days=3, batch_size=500, max_batches=20):
+        '''Schedule a reminder activity on the prescription of every refill-due
+        line that has not been reminded since its last dispense or refill
+        (see `write`). Lines are handled in chunks of
+        `batch_size`, committing after each chunk, and at most `max_batches`
+        chunks are processed per run; the next run picks up the rest.'''
+        # lines without a prescription have nowhere to hold the activity
+        domain = self._get_refill_due_domain(within_days=within_days) + [
+            ('refill_reminder_date', '=', False),
+            ('history_id', '!=', False),
+        ]
+        todo_type = self.env.ref('mail.mail_activity_data_todo', raise_if_not_found=False)
+        for dummy in range(max_batches):
+            lines = self.search(domain, order='expected_next_visit, id', limit=batch_size)
+            if not lines:
+                break
+            lines_by_history = {}
+            for line in lines:
+                lines_by_history.setdefault(line.history_id, self.browse())
+                lines_by_history[line.history_id] |= line
+            for history, history_lines in lines_by_history.items():
+                drugs = ', '.join(history_lines.mapped('product_id.display_name'))
+                history.activity_schedule(
+                    activity_type_id=todo_type.id if todo_type else False,
+                    date_deadline=min(history_lines.mapped('expected_next_visit')).date(),
+                    summary=_('Refill due: %s') % drugs,
+                    user_id=history.pharmacist_id.id or self.env.uid,
+                )
+            lines.write({'refill_reminder_date': fields.Datetime.now()})
+            _logger.info('Scheduled refill reminders for %s prescription lines', len(lines))
+            if not getattr(threading.current_thread(), 'testing', False):
+                self.env.cr.commit()
+        return True
+
+    @api.depends('start_date', 'dispensed_date', 'frequency_duration', 'frequency')
     def _compute_expected_next_visit(self):
+        # the supply runs from the last dispense, or from the start until then
         for rec in self:
-            if rec.start_date and rec.frequency_duration:
+            start = rec.dispensed_date or rec.start_date
+            if start and rec.frequency_duration:
                 if rec.frequency == 'minute':
-                    rec.expected_next_visit = rec.start_date + timedelta(minutes=rec.frequency_duration)
+                    rec.expected_next_visit = start + timedelta(minutes=rec.frequency_duration)
                 elif rec.frequency == 'hourly':
-                    rec.expected_next_visit = rec.start_date + timedelta(hours=rec.frequency_duration)
+                    rec.expected_next_visit = start + timedelta(hours=rec.frequency_duration)
                 elif rec.frequency == 'daily':
-                    rec.expected_next_visit = rec.start_date + timedelta(days=rec.frequency_duration)
+                    rec.expected_next_visit = start + timedelta(days=rec.frequency_duration)
                 elif rec.frequency == 'weekly':
-                    rec.expected_next_visit = rec.start_date + timedelta(weeks=rec.frequency_duration)
+                    rec.expected_next_visit = start + timedelta(weeks=rec.frequency_duration)
                 elif rec.frequency == 'monthly':
-                    rec.expected_next_visit = rec.start_date + timedelta(days=rec.frequency_duration * 30)
+                    rec.expected_next_visit = start + timedelta(days=rec.frequency_duration * 30)
                 elif rec.frequency == 'yearly':
-                    rec.expected_next_visit = rec.start_date + timedelta(days=rec.frequency_duration * 365)
+                    rec.expected_next_visit = start + timedelta(days=rec.frequency_duration * 365)
             else:
                 rec.expected_next_visit = False
     
@@ -90,6 +216,52 @@ class PharmacyPrescriptionLine(models.Model):
             else:
                 rec.end_date = False
     
+    @api.depends('product_id', 'uom_id')
+    def _compute_price_unit(self):
+        for rec in self:
+            rec.price_unit = rec._get_branch_price()
+
+    def _get_branch_price(self):
+        '''Return the unit price of the line's drug from the branch pricelist,
+        falling back to the product sale price when the branch has none.'''
+        self.ensure_one()
+        if not self.product_id:
+            return 0.0
+        pricelist = self.history_id.branch_id.pricelist_id
+        if pricelist:
+            return pricelist._get_product_price(
+                self.product_id,
+                self.quantity or 1.0,
+                uom=self.uom_id or self.product_id.uom_id,
+                date=self.history_id.date or fields.Datetime.now(),
+            )
+        return self.product_id.lst_price
+
+    @api.model
+    def reprice_open_prescriptions(self, product_ids=None, history_ids=None, batch_size=1000):
+        '''Refresh the price snapshot of lines on prescriptions that are still
+        open (draft or verified). Dispensed, invoiced and closed prescriptions
+        keep the price they were captured with.
+
+        Lines are processed in batches of `batch_size` so large repricing runs
+        do not hold every line in memory or lock the whole table at once.
+        '''
+        domain = [('history_id.state', 'in', OPEN_PRESCRIPTION_STATES)]
+        if product_ids:
+            domain.append(('product_id', 'in', product_ids))
+        if history_ids:
+            domain.append(('history_id', 'in', history_ids))
+        line_ids = self.search(domain, order='id').ids
+        for start in range(0, len(line_ids), batch_size):
+            lines = self.browse(line_ids[start:start + batch_size])
+            for line in lines:
+                price = line._get_branch_price()
+                if line.price_unit != price:
+                    line.price_unit = price
+            lines.flush_recordset()
+            lines.invalidate_recordset()
+        return len(line_ids)
+
     @api.depends('quantity', 'price_unit')
     def _compute_price_subtotal(self):
         for rec in self:
@@ -1,7 +1,25 @@
 # models/res_partner.py
-from odoo import models, fields, api
+from datetime import datetime
+
+from odoo import models, fields, api, _
 from dateutil.relativedelta import relativedelta
-from odoo.exceptions import ValidationError
+from odoo.exceptions import ValidationError, UserError
+
+# timeline event type: (model, timestamp column, fields returned with the event).
+# Each (patient_id, timestamp) pair is indexed on its table.
+TIMELINE_SOURCES = {
+    'evaluation': ('patient.medical.evaluation', 'evaluation_start_date',
+                   ['evaluation_no', 'state', 'severity', 'chief_complaint', 'branch_id']),
+    'vitals': ('patient.vitalsigns', 'time',
+               ['temp', 'systolic', 'diastolic', 'heart_rate', 'respiratory', 'oxy_saturate',
+                'ews_score', 'ews_risk', 'evaluation_id']),
+    'admission': ('patient.medical.admission', 'admission_date',
+                  ['name', 'state', 'admission_type', 'discharge_date', 'bed_id', 'branch_id']),
+    'prescription': ('res.patient.pharmacy.history', 'date',
+                     ['name', 'state', 'diagnosis', 'total_amount', 'branch_id']),
+    'history': ('patient.medical.history', 'create_date',
+                ['name', 'severity', 'description']),
+}
 
 class HrEmployee(models.Model):
     _inherit = 'hr.employee'
@@ -90,7 +108,7 @@ class ResPartner(models.Model):
          compute='_compute_total_evaluations_count'
     )
     patient_prescription_count=fields.Integer(
-         compute='_compute_total_prescription_count'
+         compute='_compute_prescription_count'
     )
     
     @api.onchange('related_employee_number')
@@ -103,15 +121,14 @@ class ResPartner(models.Model):
             if not employee:
                 raise ValidationError(f"System could not find any employee related to {user.related_employee_number}")
 
-    def get_default_name(self, vals):
-        return self.env["ir.sequence"].next_by_code("patient.code") or "/"
-
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         # if vals.get("patient_no", "/") == "/":
-        vals["patient_no"] = self.get_default_name(vals)
+        patient_nos = self.env["ir.sequence"].next_by_code_batch("patient.code", len(vals_list))
+        for vals, patient_no in zip(vals_list, patient_nos):
+            vals["patient_no"] = patient_no or "/"
  
-        return super().create(vals)
+        return super().create(vals_list)
 
     @api.depends('last_name', 'first_name', 'middle_name')
     def _compute_full_name(self):
@@ -142,28 +159,113 @@ class ResPartner(models.Model):
             else:
                 rec.age = False
 
+    def _aggregate_by_patient(self, model, aggregate='__count'):
+        """Return {patient: value} for `aggregate` over `model` records of the
+        patients in self, using a single grouped query for the whole batch."""
+        patient_ids = self._origin.ids
+        if not patient_ids:
+            return {}
+        return dict(self.env[model]._read_group(
+            [('patient_id', 'in', patient_ids)], ['patient_id'], [aggregate]))
+
     @api.depends('pharmacy_history_ids')
     def _compute_prescription_count(self):
+        counts = self._aggregate_by_patient('res.patient.pharmacy.history')
         for rec in self:
-            rec.prescription_count = len(rec.pharmacy_history_ids)
+            rec.prescription_count = rec.patient_prescription_count = counts.get(rec._origin, 0)
     
-    @api.depends('pharmacy_history_ids.date')
-    def _compute_last_visit_date(self):
-        for rec in self:
-            if rec.pharmacy_history_ids:
-                rec.last_visit_date = max(rec.pharmacy_history_ids.mapped('date'))
-            else:
-                rec.last_visit_date = False
-
     @api.depends('patient_evaluation_ids')
     def _compute_total_evaluations_count(self):
+        counts = self._aggregate_by_patient('patient.medical.evaluation')
         for patient in self:
-            patient.patient_evaluation_count = len(patient.patient_evaluation_ids)
+            patient.patient_evaluation_count = counts.get(patient._origin, 0)
 
-    @api.depends('patient_prescription_ids')
-    def _compute_total_prescription_count(self):
-        for patient in self:
-            patient.patient_prescription_count = len(patient.patient_prescription_ids)
+    # ==================== timeline ====================
+
+    @api.model
+    def _parse_timeline_cursor(self, cursor):
+        """Split a 'timestamp|type|id' cursor as returned by get_timeline."""
+        try:
+            timestamp, event_type, res_id = cursor.split('|')
+            if event_type not in TIMELINE_SOURCES:
+                raise ValueError(event_type)
+            return datetime.fromisoformat(timestamp), event_type, int(res_id)
+        except ValueError:
+            raise UserError(_('Invalid timeline cursor: %s') % cursor)
+
+    def get_timeline(self, limit=50, cursor=None, types=None):
+        """Return one page of the clinical timeline of the patient: evaluations,
+        vital signs, admissions, prescriptions and history entries, newest first.
+
+        Pages are keyset-paginated on (timestamp, type, id): pass the returned
+        `next_cursor` to get the following page. Each source is read from its
+        (patient_id, timestamp) index and contributes at most `limit` rows, so
+        the cost of a page does not grow with the length of the record.
+        Events without a timestamp are not part of the timeline."""
+        self.ensure_one()
+        types = [event_type for event_type in (types or TIMELINE_SOURCES) if event_type in TIMELINE_SOURCES]
+        params = {'patient_id': self.id, 'limit': limit + 1}
+        if cursor:
+            params['ts'], params['type'], params['id'] = self._parse_timeline_cursor(cursor)
+        queries = []
+        for event_type in types:
+            model, column, dummy = TIMELINE_SOURCES[event_type]
+            Model = self.env[model]
+            Model.flush_model(['patient_id', column])
+            cursor_clause = ''
+            if cursor:
+                # the first condition bounds the index scan, the row comparison
+                # breaks ties on the same timestamp
+                cursor_clause = ("AND {ts} <= %(ts)s AND ({ts}, '{type}'::varchar, id) < (%(ts)s, %(type)s, %(id)s)"
+                                 .format(ts=column, type=event_type))
+            queries.append("""
+                (SELECT {ts} AS ts, '{type}'::varchar AS type, id
+                   FROM {table}
+                  WHERE patient_id = %(patient_id)s AND {ts} IS NOT NULL {cursor_clause}
+               ORDER BY {ts} DESC, id DESC
+                  LIMIT %(limit)s)
+            """.format(ts=column, type=event_type, table=Model._table, cursor_clause=cursor_clause))
+        if not queries:
+            return {'events': [], 'next_cursor': None}
+        self.env.cr.execute("""
+            SELECT ts, type, id FROM ({union}) AS timeline
+          ORDER BY ts DESC, type DESC, id DESC
+             LIMIT %(limit)s
+        """.format(union=' UNION ALL '.join(queries)), params)
+        rows = self.env.cr.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        # one read per event type for the whole page
+        ids_by_type = {}
+        for dummy, event_type, res_id in rows:
+            ids_by_type.setdefault(event_type, []).append(res_id)
+        details = {}
+        for event_type, ids in ids_by_type.items():
+            model, dummy, field_names = TIMELINE_SOURCES[event_type]
+            for values in self.env[model].browse(ids).read(field_names):
+                details[event_type, values['id']] = {
+                    fname: self._timeline_value(values[fname]) for fname in field_names}
+
+        events = [{
+            'type': event_type,
+            'id': res_id,
+            'timestamp': timestamp.isoformat(),
+            'data': details.get((event_type, res_id), {}),
+        } for timestamp, event_type, res_id in rows]
+        next_cursor = None
+        if has_more:
+            timestamp, event_type, res_id = rows[-1]
+            next_cursor = '%s|%s|%s' % (timestamp.isoformat(), event_type, res_id)
+        return {'events': events, 'next_cursor': next_cursor}
+
+    @api.model
+    def _timeline_value(self, value):
+        if isinstance(value, tuple):
+            return {'id': value[0], 'name': value[1]}
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
 
     def action_view_evaluation(self):
         views = self.env.ref("careone_health.view_patient_medical_evaluation_form").id
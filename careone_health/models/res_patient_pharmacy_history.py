@@ -1,12 +1,17 @@
 # models/res_patient_pharmacy_history.py
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import sql
 
 class ResPatientPharmacyHistory(models.Model):
     _name = 'res.patient.pharmacy.history'
     _description = 'Patient Pharmacy History'
     _order = 'date desc, id desc'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinical.text.search.mixin']
+    _search_vector_weights = {
+        'diagnosis': 'A',
+        'notes': 'B',
+    }
     
     def _default_stage(self):
         stage = self.env.context.get('default_stage_id') or self.env['pharmacy.config.stage'].search([
@@ -55,12 +60,20 @@ class ResPatientPharmacyHistory(models.Model):
         ('2', 'Very Urgent'),
     ], string='Priority', default='0')
     company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
+
+    def init(self):
+        super().init()
+        # patient timeline
+        sql.create_index(self.env.cr, 'res_patient_pharmacy_history_patient_date_idx',
+                         self._table, ['patient_id', 'date'])
     
-    @api.model
-    def create(self, vals):
-        if vals.get('name', _('New')) == _('New'):
-            vals['name'] = self.env['ir.sequence'].next_by_code('res.patient.pharmacy.history') or _('New')
-        return super(ResPatientPharmacyHistory, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        to_name = [vals for vals in vals_list if vals.get('name', _('New')) == _('New')]
+        names = self.env['ir.sequence'].next_by_code_batch('res.patient.pharmacy.history', len(to_name))
+        for vals, name in zip(to_name, names):
+            vals['name'] = name or _('New')
+        return super(ResPatientPharmacyHistory, self).create(vals_list)
     
     @api.depends('prescription_line_ids.price_subtotal')
     def _compute_total_amount(self):
@@ -86,11 +99,7 @@ class ResPatientPharmacyHistory(models.Model):
             if current_stage.is_dispensing_stage:
                 rec.dispensed_by = self.env.user
                 rec.dispensed_date = fields.Datetime.now()
-                for line in rec.prescription_line_ids:
-                    line.is_dispensed = True
-                    line.dispensed_quantity = line.quantity
-                    line.dispensed_by = self.env.user
-                    line.dispensed_date = fields.Datetime.now()
+                rec.prescription_line_ids.filtered(lambda line: not line.is_dispensed)._dispense()
                 rec.state = 'dispensed'
             
             if current_stage.is_issued_stage:
@@ -164,5 +173,11 @@ class ResPatientPharmacyHistory(models.Model):
             'target': 'current',
         }
     
+    def action_reprice(self):
+        '''Recapture line prices from the branch pricelist. Only open
+        prescriptions are repriced.'''
+        self.env['pharmacy.prescription.line'].reprice_open_prescriptions(history_ids=self.ids)
+        return True
+
     def action_cancel(self):
         self.write({'state': 'cancelled'})
@@ -0,0 +1 @@
+from . import test_prescription_refill
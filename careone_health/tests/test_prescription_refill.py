@@ -0,0 +1,66 @@
+# tests/test_prescription_refill.py
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+
+class TestPrescriptionRefill(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        branch = self.env['multi.branch'].create({'name': 'Refill Branch'})
+        patient = self.env['res.partner'].create({
+            'first_name': 'Ada',
+            'middle_name': 'Ngozi',
+            'last_name': 'Okafor',
+            'is_patient': True,
+        })
+        evaluation = self.env['patient.medical.evaluation'].create({'patient_id': patient.id})
+        history = self.env['res.patient.pharmacy.history'].create({
+            'patient_id': patient.id,
+            'branch_id': branch.id,
+            'patient_evaluation_id': evaluation.id,
+        })
+        product = self.env['product.product'].create({'name': 'Metformin 500mg', 'is_drugs': True})
+        self.line = self.env['pharmacy.prescription.line'].create({
+            'history_id': history.id,
+            'product_id': product.id,
+            'uom_id': self.env.ref('uom.product_uom_unit').id,
+            'frequency_duration': 7,
+            'frequency': 'daily',
+            'start_date': fields.Datetime.now() - timedelta(days=10),
+            'refills_allowed': 1,
+        })
+        self.Line = self.env['pharmacy.prescription.line']
+
+    def _is_due(self):
+        return self.line in self.Line.get_refills_due(within_days=3)
+
+    def test_dispense_refill_cycle(self):
+        '''A dispensed line is due again one duration after its dispense,
+        until its refills run out'''
+        self.assertEqual(self.line.refills_remaining, 1)
+        self.assertTrue(self._is_due())
+        self.Line._cron_send_refill_reminders()
+        self.assertTrue(self.line.refill_reminder_date)
+
+        self.line._dispense()
+        self.assertTrue(self.line.is_dispensed)
+        self.assertFalse(self.line.refill_reminder_date)
+        self.assertFalse(self._is_due(), 'A line just dispensed is due again')
+        self.Line._cron_send_refill_reminders()
+        self.assertFalse(self.line.refill_reminder_date, 'A line not due is reminded')
+
+        self.line.dispensed_date = fields.Datetime.now() - timedelta(days=6)
+        self.assertTrue(self._is_due(), 'A line with a refill left is not due again')
+        self.line.action_dispense_refill()
+        self.assertEqual(self.line.refills_remaining, 0)
+        self.line.dispensed_date = fields.Datetime.now() - timedelta(days=6)
+        self.assertFalse(self._is_due(), 'A line without refills is still due')
+
+    def test_reminder_skips_lines_without_prescription(self):
+        '''Lines without a prescription are not stamped as reminded'''
+        self.line.history_id = False
+        self.Line._cron_send_refill_reminders()
+        self.assertFalse(self.line.refill_reminder_date)
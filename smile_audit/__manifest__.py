@@ -1,6 +1,6 @@
 {
     "name": "Audit Trail",
-    "version": "0.1",
+    "version": "0.6",
     "sequence": 100,
     "category": "Tools",
     "author": "Smile",
@@ -19,6 +19,7 @@ all the objects of the system
         'security/ir.model.access.csv',
         'views/audit_rule_view.xml',
         'views/audit_log_view.xml',
+        'data/ir_cron.xml',
     ],
     'installable': True,
     'auto_install': False,
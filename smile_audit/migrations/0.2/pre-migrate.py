@@ -0,0 +1,63 @@
+import json
+import logging
+import re
+
+from psycopg2.extras import execute_values
+
+from odoo.addons.smile_audit.tools import dump_data
+from odoo.tools.safe_eval import datetime, safe_eval
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+
+def parse_repr(data):
+    """Parse the repr() of the data logged by the previous versions"""
+    try:
+        return safe_eval(data or "{}", {"datetime": datetime})
+    except Exception:
+        data = data.replace("defaultdict(<class 'list'>, {})", "{}")
+        data = re.sub(r"Markup\('([^']*)'\)", r"'\1'", data)
+        try:
+            return safe_eval(data, {"datetime": datetime})
+        except Exception:
+            _logger.warning("Unreadable audit log data: %s", data[:200])
+            return {"old": {}, "new": {}}
+
+
+def migrate(cr, version):
+    """Convert audit_log.data from repr() text to JSONB, in batches"""
+    if not version:
+        return
+    cr.execute(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = 'audit_log' AND column_name = 'data'"
+    )
+    if cr.fetchone()[0] == "jsonb":
+        return
+    cr.execute("ALTER TABLE audit_log ADD COLUMN IF NOT EXISTS data_json jsonb")
+    last_id, count = 0, 0
+    while True:
+        cr.execute(
+            "SELECT id, data FROM audit_log WHERE id > %s "
+            "ORDER BY id LIMIT %s",
+            (last_id, BATCH_SIZE),
+        )
+        rows = cr.fetchall()
+        if not rows:
+            break
+        execute_values(
+            cr._obj,
+            "UPDATE audit_log l SET data_json = v.data::jsonb "
+            "FROM (VALUES %s) AS v(id, data) WHERE l.id = v.id",
+            [
+                (log_id, json.dumps(dump_data(parse_repr(data))))
+                for log_id, data in rows
+            ],
+            page_size=BATCH_SIZE,
+        )
+        last_id, count = rows[-1][0], count + len(rows)
+        _logger.info("Converted the data of %s audit logs", count)
+    cr.execute("ALTER TABLE audit_log DROP COLUMN data")
+    cr.execute("ALTER TABLE audit_log RENAME COLUMN data_json TO data")
@@ -0,0 +1,53 @@
+import logging
+from collections import defaultdict
+
+from psycopg2.extras import execute_values
+
+from odoo import SUPERUSER_ID, api
+
+from odoo.addons.smile_audit.tools import load_data
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+
+def migrate(cr, version):
+    """Fill the resource name of the existing audit logs, in batches"""
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    AuditLog = env["audit.log"]
+    last_id, count = 0, 0
+    while True:
+        cr.execute(
+            "SELECT id, model, res_id, data FROM audit_log "
+            "WHERE id > %s AND resource_name IS NULL ORDER BY id LIMIT %s",
+            (last_id, BATCH_SIZE),
+        )
+        rows = cr.fetchall()
+        if not rows:
+            break
+        data_by_model = defaultdict(dict)
+        for log_id, model, res_id, data in rows:
+            data_by_model[model][res_id] = load_data(data or {})
+        names = {
+            model: AuditLog._get_resource_names(model, data_by_res_id)
+            for model, data_by_res_id in data_by_model.items()
+        }
+        values = [
+            (log_id, names[model].get(res_id))
+            for log_id, model, res_id, data in rows
+            if names[model].get(res_id)
+        ]
+        if values:
+            execute_values(
+                cr._obj,
+                "UPDATE audit_log l SET resource_name = v.name "
+                "FROM (VALUES %s) AS v(id, name) WHERE l.id = v.id",
+                values,
+                page_size=BATCH_SIZE,
+            )
+        env.invalidate_all()
+        last_id, count = rows[-1][0], count + len(rows)
+        _logger.info("Filled the resource name of %s audit logs", count)
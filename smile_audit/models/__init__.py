@@ -1,3 +1,4 @@
 from . import audit_log
+from . import audit_log_snapshot
 from . import audit_rule
 from . import base
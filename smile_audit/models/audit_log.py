@@ -1,15 +1,39 @@
-from dateutil import tz
+from collections import defaultdict
+import gzip
+import json
+import os
 import re
-from odoo.osv import expression
+import threading
+
+from dateutil import tz
+from dateutil.relativedelta import relativedelta
+from psycopg2.extras import execute_values
 
-from odoo import fields, models, _
+from odoo import api, fields, models, _
 from odoo.exceptions import UserError
-from odoo.tools.safe_eval import safe_eval, datetime
+from odoo.tools import config, sql
+from odoo.tools.lru import LRU
+
+from ..tools import load_data
 
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# rendered changes kept per registry, by log and write date
+HTML_CACHE_SIZE = 4096
+
+# audit_log is partitioned by month of create_date; partitions are created
+# this many months ahead, and those older than the retention are archived
+PARTITION_MONTHS_AHEAD = 2
+PARTITION_NAME = "audit_log_p%Y_%m"
+PARTITION_NAME_RE = re.compile(r"^audit_log_p(\d{4})_(\d{2})$")
+
+# the names of the fields changed by a log, as a jsonb object
+CHANGED_FIELDS_SQL = (
+    "(COALESCE(data -> 'old', '{}') || COALESCE(data -> 'new', '{}'))"
+)
+
 
 class AuditLog(models.Model):
     _name = "audit.log"
@@ -19,7 +43,12 @@ class AuditLog(models.Model):
     name = fields.Char(
         "Resource Name", size=256, compute="_get_name", search="_search_name"
     )
-    create_date = fields.Datetime("Date", readonly=True)
+    resource_name = fields.Char(
+        "Logged Resource Name", readonly=True, index="trigram"
+    )
+    # NOT NULL as part of the primary key of the partitioned table: the
+    # ORM would try to drop the constraint of a field not required
+    create_date = fields.Datetime("Date", required=True, readonly=True)
     user_id = fields.Many2one(
         "res.users", "User", required=True, readonly=True
     )
@@ -35,67 +64,126 @@ class AuditLog(models.Model):
     )
     res_id = fields.Integer("Resource Id", readonly=True)
     method = fields.Char("Method", size=64, readonly=True)
-    data = fields.Text("Data", readonly=True)
+    data = fields.Json("Data", readonly=True)
     data_html = fields.Html("HTML Data", readonly=True, compute="_render_html")
+    changed_field = fields.Char(
+        "Changed Field",
+        compute="_compute_changed_field",
+        search="_search_changed_field",
+    )
 
-    def _get_name(self):  # noqa: CCR001
+    def _auto_init(self):
+        # the partitioned table is set up before the ORM adds the columns
+        kind = self._get_table_kind()
+        if kind is None:
+            self._create_partitioned_table()
+        elif kind == "r":
+            self._convert_to_partitioned_table()
+        res = super()._auto_init()
+        # the transaction which wrote the log, to tell whether a snapshot
+        # saw it: see audit.log.snapshot; the logs written before have none
+        if not sql.column_exists(self.env.cr, self._table, "xact_id"):
+            self.env.cr.execute(
+                "ALTER TABLE audit_log ADD COLUMN xact_id bigint"
+            )
+            # set apart, not to rewrite the existing logs
+            self.env.cr.execute(
+                "ALTER TABLE audit_log "
+                "ALTER COLUMN xact_id SET DEFAULT txid_current()"
+            )
+        return res
+
+    def init(self):
+        super().init()
+        # history of a record; created on each partition by PostgreSQL
+        sql.create_index(
+            self.env.cr,
+            "audit_log_model_res_id_create_date_idx",
+            self._table,
+            ["model", "res_id", "create_date"],
+        )
+        # logs where a given field changed: see _search_changed_field
+        sql.create_index(
+            self.env.cr,
+            "audit_log_changed_fields_idx",
+            self._table,
+            [CHANGED_FIELDS_SQL],
+            method="gin",
+        )
+
+    def _get_data(self):
+        self.ensure_one()
+        data = load_data(self.data or {})
+        data.setdefault("old", {})
+        data.setdefault("new", {})
+        return data
+
+    def _get_display_names(self, ids_by_model):
+        """Return {model: {id: display name}} of the existing records among
+        the ids of each model, resolved in batch per model"""
+        names = {}
+        for model, ids in ids_by_model.items():
+            if model in self.env and ids:
+                records = self.env[model].browse(ids).exists()
+                names[model] = {rec.id: rec.display_name for rec in records}
+        return names
+
+    @api.model
+    def _get_resource_names(self, model, data_by_res_id):
+        """Return {res_id: name} of the logged records: their display name,
+        or the name found in the logged data of the deleted ones"""
+        names, rec_name = {}, None
+        if model in self.env:
+            RecordModel = self.env[model].sudo()
+            rec_name = RecordModel._rec_name
+            names = {
+                rec.id: rec.display_name
+                for rec in RecordModel.browse(list(data_by_res_id)).exists()
+            }
+        for res_id, data in data_by_res_id.items():
+            if names.get(res_id):
+                continue
+            for fname in (rec_name, "name"):
+                value = data.get("new", {}).get(fname) or data.get(
+                    "old", {}
+                ).get(fname)
+                if value and isinstance(value, str):
+                    names[res_id] = value
+                    break
+        return names
+
+    def _get_name(self):
+        ids_by_model = defaultdict(set)
         for rec in self:
             if rec.model_id and rec.res_id:
-                record = (
-                    rec.env[rec.model_id.model].browse(rec.res_id).exists()
-                )
-                if record:
-                    rec.name = record.display_name
-                else:
-                    try:
-                        data = safe_eval(
-                            rec.data or "{}", {"datetime": datetime}
-                        )
-                        rec_name = rec.env[rec.model_id.model]._rec_name
-                        if rec_name in data.get("new", {}):
-                            rec.name = data["new"][rec_name]
-                        elif rec_name in data.get("old", {}):
-                            rec.name = data["old"][rec_name]
-                        else:
-                            rec.name = "id=%s" % rec.res_id
-                    except Exception:
-                        try:
-                            data_str = rec.data.replace(
-                                "defaultdict(<class 'list'>, {})", "{}"
-                            )
-                            data_str = re.sub(
-                                r"Markup\('([^']*)'\)", r"'\1'", data_str
-                            )
-
-                            data = safe_eval(data_str, {"datetime": datetime})
-                            rec_name = rec.env[rec.model_id.model]._rec_name
-                            if rec_name in data.get("new", {}):
-                                rec.name = data["new"][rec_name]
-                            elif rec_name in data.get("old", {}):
-                                rec.name = data["old"][rec_name]
-                            else:
-                                if "name" in data.get("new", {}):
-                                    rec.name = data["new"]["name"]
-                                elif "name" in data.get("old", {}):
-                                    rec.name = data["old"]["name"]
-                                else:
-                                    rec.name = "id=%s" % rec.res_id
-                        except Exception:
-                            data_str = rec.data
-                            if data_str and "'name': '" in data_str:
-                                match = re.search(
-                                    r"'name': '([^']*)'", data_str
-                                )
-                                if match:
-                                    rec.name = match.group(1)
-                                else:
-                                    rec.name = "id=%s" % rec.res_id
-                            else:
-                                rec.name = "id=%s" % rec.res_id
-            else:
+                ids_by_model[rec.model_id.model].add(rec.res_id)
+        names = self._get_display_names(ids_by_model)
+        for rec in self:
+            if not (rec.model_id and rec.res_id):
                 rec.name = ""
+                continue
+            rec.name = (
+                names.get(rec.model_id.model, {}).get(rec.res_id)
+                or rec.resource_name
+                or "id=%s" % rec.res_id
+            )
 
-    def _search_name(self, operator, value):  # noqa: CCR001
+    def _compute_changed_field(self):
+        self.changed_field = False
+
+    def _search_changed_field(self, operator, value):
+        if operator not in ("=", "in"):
+            raise UserError(
+                _("Unsupported search operator for changed field")
+            )
+        fnames = [value] if isinstance(value, str) else list(value)
+        # jsonb ?| uses the GIN index on the changed field names
+        query = "SELECT id FROM audit_log WHERE %s ?| %%s" % (
+            CHANGED_FIELDS_SQL
+        )
+        return [("id", "inselect", (query, [fnames]))]
+
+    def _search_name(self, operator, value):
         if operator not in (
             "=",
             "!=",
@@ -105,36 +193,27 @@ class AuditLog(models.Model):
             "not ilike",
         ):
             raise UserError(_("Unsupported search operator for name field"))
+        return [("resource_name", operator, value)]
+
+    @staticmethod
+    def _get_referenced_ids(field, value):
+        """Return the (model, id) of the records a logged value refers to"""
+        if not value:
+            return []
+        if field.type == "many2one" and isinstance(value, int):
+            return [(field.comodel_name, value)]
+        if field.type == "reference":
+            res_model, res_id = value.split(",")
+            return [(res_model, int(res_id))]
+        if field.type in ("one2many", "many2many"):
+            return [
+                (field.comodel_name, rec_id)
+                for rec_id in value
+                if isinstance(rec_id, int)
+            ]
+        return []
 
-        audited_models = self.env["audit.rule"].search([]).mapped("model_id")
-        domain = []
-        for model in audited_models:
-            model_name = model.model
-            if model_name in self.env:
-                try:
-                    model_obj = self.env[model_name]
-                    records = model_obj.search(
-                        [(model_obj._rec_name, operator, value)]
-                    )
-                    if records:
-                        domain = expression.OR(
-                            [
-                                domain,
-                                [
-                                    "&",
-                                    ("model_id", "=", model.id),
-                                    ("res_id", "in", records.ids),
-                                ],
-                            ]
-                        )
-                except Exception as e:
-                    _logger.debug(
-                        f"Error searching in model {model_name}: {e}"
-                    )
-                    continue
-        return domain or [("id", "=", False)]
-
-    def _format_value(self, field, value):  # noqa: CCR001
+    def _format_value(self, field, value, names):  # noqa: CCR001
         self.ensure_one()
         if not value and field.type not in ("boolean", "integer", "float"):
             return ""
@@ -145,29 +224,17 @@ class AuditLog(models.Model):
             return dict(selection).get(value, value)
         if field.type == "many2one" and value:
             if isinstance(value, int):
-                return (
-                    self.env[field.comodel_name]
-                    .browse(value)
-                    .exists()
-                    .display_name
-                    or value
-                )
+                return names.get(field.comodel_name, {}).get(value) or value
             else:
                 return value
         if field.type == "reference" and value:
             res_model, res_id = value.split(",")
-            return (
-                self.env[res_model].browse(int(res_id)).exists().display_name
-                or value
-            )
+            return names.get(res_model, {}).get(int(res_id)) or value
         if field.type in ("one2many", "many2many") and value:
+            comodel_names = names.get(field.comodel_name, {})
             return ", ".join(
                 [
-                    self.env[field.comodel_name]
-                    .browse(rec_id)
-                    .exists()
-                    .display_name
-                    or str(rec_id)
+                    comodel_names.get(rec_id) or str(rec_id)
                     for rec_id in value
                     if isinstance(rec_id, int)
                 ]
@@ -184,55 +251,92 @@ class AuditLog(models.Model):
             )
         return value
 
-    def _get_content(self):  # noqa: CCR001
+    def _get_changed_fields(self, data):
+        """Return the fields of the logged data the user may read"""
         self.ensure_one()
-        content = []
-
-        try:
-            data = safe_eval(self.data or "{}", {"datetime": datetime})
-        except Exception:
-            data_str = self.data or "{}"
-            data_str = data_str.replace(
-                "defaultdict(<class 'list'>, {})", "{}"
-            )
-            data_str = re.sub(r"Markup\('([^']*)'\)", r"'\1'", data_str)
-
-            try:
-                data = safe_eval(data_str, {"datetime": datetime})
-            except Exception:
-                data = {"old": {}, "new": {}}
-
-        if "old" not in data:
-            data["old"] = {}
-        if "new" not in data:
-            data["new"] = {}
-
         RecordModel = self.env[self.model_id.model]
+        changed_fields = []
         for fname in set(data["new"].keys()) | set(data["old"].keys()):
             field = RecordModel._fields.get(fname)
             if field and (
                 not field.groups or self.user_has_groups(groups=field.groups)
             ):
-                old_value = self._format_value(
-                    field, data["old"].get(fname, "")
-                )
-                new_value = self._format_value(
-                    field, data["new"].get(fname, "")
-                )
-                if old_value != new_value:
-                    label = field.get_description(self.env)["string"]
-                    content.append((label, old_value, new_value))
+                changed_fields.append(field)
+        return changed_fields
+
+    def _get_content(self, data=None, names=None):
+        self.ensure_one()
+        content = []
+        if data is None:
+            data = self._get_data()
+        changed_fields = self._get_changed_fields(data)
+        if names is None:
+            names = self._get_display_names(
+                self._get_referenced_ids_by_model(data, changed_fields)
+            )
+        for field in changed_fields:
+            old_value = self._format_value(
+                field, data["old"].get(field.name, ""), names
+            )
+            new_value = self._format_value(
+                field, data["new"].get(field.name, ""), names
+            )
+            if old_value != new_value:
+                label = field.get_description(self.env)["string"]
+                content.append((label, old_value, new_value))
         return content
 
+    def _get_referenced_ids_by_model(self, data, changed_fields, result=None):
+        result = defaultdict(set) if result is None else result
+        for field in changed_fields:
+            for age in ("old", "new"):
+                for model, res_id in self._get_referenced_ids(
+                    field, data[age].get(field.name)
+                ):
+                    result[model].add(res_id)
+        return result
+
+    def _get_html_cache(self):
+        if not hasattr(self.pool, "_audit_log_html_cache"):
+            self.pool._audit_log_html_cache = LRU(HTML_CACHE_SIZE)
+        return self.pool._audit_log_html_cache
+
     def _render_html(self):  # noqa: CCR001
+        # the rendering depends on the groups, language and timezone, and on
+        # the companies, as referenced records are named under the access
+        # rights of the viewer
+        cache = self._get_html_cache()
+        cache_key = (
+            tuple(self.env.user.groups_id.ids),
+            tuple(self.env.companies.ids),
+            self.env.lang,
+            self.env.user.tz,
+        )
+        to_render = []
         for rec in self:
-            thead = ""
-            for head in (_("Field"), _("Old value"), _("New value")):
-                thead += "<th>%s</th>" % head
-            thead = "<thead><tr>%s</tr></thead>" % thead
+            # coalesced update logs get new changes, with a new write date
+            html = cache.get((rec.id, rec.write_date) + cache_key)
+            if html is None:
+                to_render.append(rec)
+            else:
+                rec.data_html = html
 
+        # the records referenced by all the logs are read at once
+        datas, ids_by_model = {}, defaultdict(set)
+        for rec in to_render:
+            data = datas[rec] = rec._get_data()
+            rec._get_referenced_ids_by_model(
+                data, rec._get_changed_fields(data), ids_by_model
+            )
+        names = self._get_display_names(ids_by_model)
+
+        thead = ""
+        for head in (_("Field"), _("Old value"), _("New value")):
+            thead += "<th>%s</th>" % head
+        thead = "<thead><tr>%s</tr></thead>" % thead
+        for rec in to_render:
             tbody = ""
-            for line in rec._get_content():
+            for line in rec._get_content(datas[rec], names):
                 row = ""
                 for item in line:
                     if item is None:
@@ -245,6 +349,309 @@ class AuditLog(models.Model):
                 '<table class="o_list_view table table-condensed '
                 'table-striped">%s%s</table>' % (thead, tbody)
             )
+            if isinstance(rec.id, int):
+                cache[(rec.id, rec.write_date) + cache_key] = rec.data_html
+
+    def _create_logs(self, values):
+        """Insert logs given as (user_id, model_id, model, res_id,
+        resource_name, method, data) tuples, with a multi-row INSERT
+        bypassing the ORM."""
+        values = [entry[:-1] + (json.dumps(entry[-1]),) for entry in values]
+        execute_values(
+            self.env.cr._obj,
+            """
+                INSERT INTO audit_log (
+                    user_id, model_id, model, res_id, resource_name, method,
+                    data, create_uid, create_date, write_uid, write_date
+                )
+                SELECT v.user_id, v.model_id, v.model, v.res_id,
+                       v.resource_name, v.method, v.data::jsonb, v.user_id,
+                       now() AT TIME ZONE 'UTC', v.user_id,
+                       now() AT TIME ZONE 'UTC'
+                FROM (VALUES %s) AS v(
+                    user_id, model_id, model, res_id, resource_name, method,
+                    data
+                )
+            """,
+            values,
+            page_size=1000,
+        )
+
+    def _update_logs(self, values):
+        """Replace the data of logs given as (id, create_date, data); they
+        belong to the current transaction from then on"""
+        execute_values(
+            self.env.cr._obj,
+            """
+                UPDATE audit_log l
+                SET data = v.data::jsonb,
+                    write_date = now() AT TIME ZONE 'UTC',
+                    xact_id = txid_current()
+                FROM (VALUES %s) AS v(id, create_date, data)
+                WHERE l.id = v.id AND l.create_date = v.create_date
+            """,
+            [
+                (log_id, create_date, json.dumps(data))
+                for log_id, create_date, data in values
+            ],
+            page_size=1000,
+        )
+        logs = self.browse([log_id for log_id, dummy, dummy in values])
+        logs.invalidate_recordset(["data", "write_date"])
+
+    def _delete_logs(self, values):
+        """Delete the logs given as (id, create_date), bypassing unlink"""
+        execute_values(
+            self.env.cr._obj,
+            """
+                DELETE FROM audit_log l
+                USING (VALUES %s) AS v(id, create_date)
+                WHERE l.id = v.id AND l.create_date = v.create_date
+            """,
+            values,
+            page_size=1000,
+        )
+        self.invalidate_model()
+
+    def flush_model(self, fnames=None):
+        # logs still buffered by audit rules must be found by searches
+        self.env["audit.rule"]._flush_logs()
+        super().flush_model(fnames)
 
     def unlink(self):
         raise UserError(_("You cannot remove audit logs!"))
+
+    @api.model
+    def _get_table_kind(self):
+        self.env.cr.execute(
+            "SELECT relkind FROM pg_class WHERE relname = %s "
+            "AND relnamespace = current_schema()::regnamespace",
+            (self._table,),
+        )
+        row = self.env.cr.fetchone()
+        return row and row[0]
+
+    @api.model
+    def _create_partitioned_table(self, like=None):
+        """Create audit_log partitioned by month of create_date, with the
+        columns of the table `like` if given; the ORM adds the others."""
+        cr = self.env.cr
+        cr.execute("CREATE SEQUENCE IF NOT EXISTS audit_log_id_seq")
+        if like:
+            columns = "LIKE %s INCLUDING DEFAULTS" % like
+        else:
+            columns = (
+                "id integer NOT NULL DEFAULT nextval('audit_log_id_seq'), "
+                "create_date timestamp NOT NULL"
+            )
+        cr.execute(
+            "CREATE TABLE audit_log (%s, PRIMARY KEY (id, create_date)) "
+            "PARTITION BY RANGE (create_date)" % columns
+        )
+        cr.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY audit_log.id")
+        # catches the dates no monthly partition covers
+        cr.execute(
+            "CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT"
+        )
+        self._create_partitions(fields.Datetime.now())
+
+    @api.model
+    def _convert_to_partitioned_table(self):
+        cr = self.env.cr
+        _logger.info("Partitioning table audit_log by month")
+        cr.execute("ALTER TABLE audit_log RENAME TO audit_log_unpartitioned")
+        cr.execute("ALTER SEQUENCE audit_log_id_seq OWNED BY NONE")
+        cr.execute(
+            "UPDATE audit_log_unpartitioned "
+            "SET create_date = COALESCE(write_date, now() AT TIME ZONE 'UTC') "
+            "WHERE create_date IS NULL"
+        )
+        self._create_partitioned_table(like="audit_log_unpartitioned")
+        cr.execute("SELECT min(create_date) FROM audit_log_unpartitioned")
+        date_from = cr.fetchone()[0]
+        if date_from:
+            self._create_partitions(date_from)
+        cr.execute(
+            "INSERT INTO audit_log SELECT * FROM audit_log_unpartitioned"
+        )
+        _logger.info("Moved %s audit logs to monthly partitions", cr.rowcount)
+        # its indexes go with it, the ORM creates them on the new table
+        cr.execute("DROP TABLE audit_log_unpartitioned")
+
+    @api.model
+    def _create_partitions(
+        self, date_from, months_ahead=PARTITION_MONTHS_AHEAD
+    ):
+        """Create the missing monthly partitions from the month of
+        `date_from` up to `months_ahead` months after the current one."""
+        month = fields.Datetime.to_datetime(date_from).replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        date_to = fields.Datetime.now() + relativedelta(months=months_ahead)
+        existing = {name for name, dummy in self._get_partitions()}
+        while month <= date_to:
+            next_month = month + relativedelta(months=1)
+            name = month.strftime(PARTITION_NAME)
+            if name not in existing:
+                self._create_partition(name, month, next_month)
+            month = next_month
+
+    @api.model
+    def _create_partition(self, name, date_from, date_to):
+        """Create the partition of [date_from, date_to). The logs of that
+        range which landed in the default partition, while no partition
+        covered it, are moved to the new one: PostgreSQL refuses to create
+        a partition whose rows are in the default partition."""
+        cr = self.env.cr
+        cr.execute("SELECT to_regclass('audit_log_default') IS NOT NULL")
+        stray = False
+        if cr.fetchone()[0]:
+            cr.execute(
+                "SELECT 1 FROM audit_log_default "
+                "WHERE create_date >= %s AND create_date < %s LIMIT 1",
+                (date_from, date_to),
+            )
+            stray = bool(cr.fetchone())
+        if not stray:
+            cr.execute(
+                "CREATE TABLE %s PARTITION OF audit_log "
+                "FOR VALUES FROM (%%s) TO (%%s)" % name,
+                (date_from, date_to),
+            )
+            return
+        cr.execute("ALTER TABLE audit_log DETACH PARTITION audit_log_default")
+        cr.execute(
+            "CREATE TABLE %s PARTITION OF audit_log "
+            "FOR VALUES FROM (%%s) TO (%%s)" % name,
+            (date_from, date_to),
+        )
+        cr.execute(
+            """
+                WITH moved AS (
+                    DELETE FROM audit_log_default
+                    WHERE create_date >= %s AND create_date < %s
+                    RETURNING *
+                )
+                INSERT INTO audit_log SELECT * FROM moved
+            """,
+            (date_from, date_to),
+        )
+        _logger.info(
+            "Moved %s audit logs from the default partition to %s",
+            cr.rowcount,
+            name,
+        )
+        cr.execute(
+            "ALTER TABLE audit_log ATTACH PARTITION audit_log_default DEFAULT"
+        )
+
+    @api.model
+    def _get_partitions(self):
+        """Return [(partition name, first day of its month)], oldest first"""
+        self.env.cr.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'audit_log'::regclass"
+        )
+        partitions = []
+        for (name,) in self.env.cr.fetchall():
+            match = PARTITION_NAME_RE.match(name)
+            if match:
+                month = fields.Datetime.to_datetime(
+                    "%s-%s-01" % match.groups()
+                )
+                partitions.append((name, month))
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    @api.model
+    def _get_archive_directory(self):
+        return self.env["ir.config_parameter"].sudo().get_param(
+            "smile_audit.log_archive_path"
+        ) or os.path.join(
+            config["data_dir"], "audit_log_archive", self.env.cr.dbname
+        )
+
+    @api.model
+    def _archive_partition(self, name):
+        """Export a partition to a gzipped CSV file, then drop it"""
+        directory = self._get_archive_directory()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "%s.csv.gz" % name)
+        with gzip.open(path + ".part", "wb") as archive:
+            self.env.cr._obj.copy_expert(
+                "COPY %s TO STDOUT WITH (FORMAT csv, HEADER)" % name, archive
+            )
+        os.replace(path + ".part", path)
+        self.env.cr.execute("ALTER TABLE audit_log DETACH PARTITION %s" % name)
+        self.env.cr.execute("DROP TABLE %s" % name)
+        _logger.info("Archived audit log partition %s to %s", name, path)
+        return path
+
+    @api.model
+    def _archive_default_partition(self, date_to):
+        """Export the logs of the default partition older than `date_to` to
+        a gzipped CSV file, then delete them"""
+        cr = self.env.cr
+        cr.execute(
+            "SELECT 1 FROM audit_log_default WHERE create_date < %s LIMIT 1",
+            (date_to,),
+        )
+        if not cr.fetchone():
+            return None
+        directory = self._get_archive_directory()
+        os.makedirs(directory, exist_ok=True)
+        name = fields.Datetime.now().strftime("audit_log_default_%Y%m%d%H%M%S")
+        path = os.path.join(directory, "%s.csv.gz" % name)
+        query = cr.mogrify(
+            "SELECT * FROM audit_log_default WHERE create_date < %s",
+            (date_to,),
+        ).decode()
+        with gzip.open(path + ".part", "wb") as archive:
+            cr._obj.copy_expert(
+                "COPY (%s) TO STDOUT WITH (FORMAT csv, HEADER)" % query,
+                archive,
+            )
+        os.replace(path + ".part", path)
+        cr.execute(
+            "DELETE FROM audit_log_default WHERE create_date < %s", (date_to,)
+        )
+        _logger.info(
+            "Archived %s audit logs of the default partition to %s",
+            cr.rowcount,
+            path,
+        )
+        return path
+
+    @api.model
+    def _cron_manage_partitions(self):
+        """Create the coming monthly partitions and archive the ones older
+        than smile_audit.log_retention_months (0 keeps them all), with the
+        logs of the default partition as old as them."""
+        self._create_partitions(fields.Datetime.now())
+        retention = int(
+            self.env["ir.config_parameter"].sudo().get_param(
+                "smile_audit.log_retention_months", 0
+            )
+        )
+        if retention <= 0:
+            return True
+        # partitions whose whole month is past the retention
+        limit = fields.Datetime.now().replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        ) - relativedelta(months=retention + 1)
+        commit = not getattr(threading.current_thread(), "testing", False)
+        Snapshot = self.env["audit.log.snapshot"]
+        for name, month in self._get_partitions():
+            if month > limit:
+                break
+            self._archive_partition(name)
+            Snapshot._delete_snapshots_before(month + relativedelta(months=1))
+            if commit:
+                self.env.cr.commit()
+        date_to = limit + relativedelta(months=1)
+        if self._archive_default_partition(date_to):
+            Snapshot._delete_snapshots_before(date_to)
+            if commit:
+                self.env.cr.commit()
+        self.invalidate_model()
+        return True
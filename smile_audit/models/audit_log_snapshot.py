@@ -0,0 +1,252 @@
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from psycopg2.extras import execute_values
+
+from odoo import api, fields, models
+from odoo.tools import sql
+
+from ..tools import dump_data, load_data
+
+# a record gets a new snapshot once it has this many logs since the last one
+SNAPSHOT_INTERVAL = 100
+# logs are dated when their transaction starts but seen once it commits, so
+# each run looks back this far before the previous one
+SNAPSHOT_LOOKBACK = timedelta(hours=1)
+
+
+class AuditLogSnapshot(models.Model):
+    _name = "audit.log.snapshot"
+    _description = "Audit Log Snapshot"
+    _order = "snapshot_date desc, id desc"
+
+    model = fields.Char("Model", required=True, readonly=True)
+    res_id = fields.Integer("Resource Id", required=True, readonly=True)
+    snapshot_date = fields.Datetime(
+        "Date",
+        required=True,
+        readonly=True,
+        help="Date of the last log included in the snapshot",
+    )
+    read_snapshot = fields.Char(
+        "Read Snapshot",
+        readonly=True,
+        help="PostgreSQL snapshot the record was read in: the logs of the "
+        "transactions it did not see are replayed after it",
+    )
+    data = fields.Json("Data", readonly=True)
+
+    def init(self):
+        super().init()
+        sql.create_index(
+            self.env.cr,
+            "audit_log_snapshot_model_res_id_date_idx",
+            self._table,
+            ["model", "res_id", "snapshot_date"],
+        )
+
+    @api.model
+    def _get_snapshot_fields(self, RecordModel):
+        return [
+            fname
+            for fname, field in RecordModel._fields.items()
+            if field.store
+            and field.type not in ("binary", "one2many")
+            and fname not in self.env["audit.rule"]._ignored_fields
+        ]
+
+    @api.model
+    def _take_snapshots(self, model, res_ids):
+        """Store the current state of the records, as of their last log"""
+        RecordModel = self.env[model].sudo().with_context(active_test=False)
+        records = RecordModel.browse(res_ids).exists()
+        if not records:
+            return 0
+        self.env["audit.log"].flush_model()
+        self.env.cr.execute(
+            "SELECT res_id, max(create_date) FROM audit_log "
+            "WHERE model = %s AND res_id IN %s GROUP BY res_id",
+            (model, tuple(records.ids)),
+        )
+        last_dates = dict(self.env.cr.fetchall())
+        # the records are read in the snapshot of the transaction: a log
+        # dated before the last one may commit after it
+        self.env.cr.execute("SELECT txid_current_snapshot()::text")
+        read_snapshot = self.env.cr.fetchone()[0]
+        records.invalidate_recordset()
+        values = []
+        for vals in records.read(
+            self._get_snapshot_fields(RecordModel), load="_classic_write"
+        ):
+            res_id = vals.pop("id")
+            if res_id in last_dates:
+                values.append(
+                    (
+                        model,
+                        res_id,
+                        last_dates[res_id],
+                        read_snapshot,
+                        json.dumps(dump_data(vals)),
+                    )
+                )
+        if not values:
+            return 0
+        execute_values(
+            self.env.cr._obj,
+            """
+                INSERT INTO audit_log_snapshot (
+                    model, res_id, snapshot_date, read_snapshot, data,
+                    create_uid, create_date, write_uid, write_date
+                )
+                SELECT v.model, v.res_id, v.snapshot_date, v.read_snapshot,
+                       v.data::jsonb, {uid}, now() AT TIME ZONE 'UTC',
+                       {uid}, now() AT TIME ZONE 'UTC'
+                FROM (VALUES %s) AS v(
+                    model, res_id, snapshot_date, read_snapshot, data
+                )
+            """.format(uid=int(self.env.uid)),
+            values,
+            page_size=1000,
+        )
+        return len(values)
+
+    @api.model
+    def _cron_take_snapshots(self, interval=SNAPSHOT_INTERVAL, limit=1000):
+        """Snapshot the records logged since the last run which have at
+        least `interval` logs since their last snapshot."""
+        Params = self.env["ir.config_parameter"].sudo()
+        since = Params.get_param("smile_audit.snapshot_last_run", "-infinity")
+        # the runs overlap by SNAPSHOT_LOOKBACK; a record seen by two runs is
+        # only snapshotted again once it has `interval` new logs
+        watermark = fields.Datetime.to_string(
+            fields.Datetime.now() - SNAPSHOT_LOOKBACK
+        )
+        self.env["audit.log"].flush_model()
+        # only the recent partitions are scanned for the touched records
+        self.env.cr.execute(
+            """
+                WITH touched AS (
+                    SELECT DISTINCT model, res_id FROM audit_log
+                    WHERE create_date > %s AND method = 'write'
+                )
+                SELECT t.model, t.res_id FROM touched t
+                LEFT JOIN LATERAL (
+                    SELECT max(snapshot_date) AS last_date
+                    FROM audit_log_snapshot s
+                    WHERE s.model = t.model AND s.res_id = t.res_id
+                ) s ON TRUE
+                WHERE (
+                    SELECT count(*) FROM audit_log l
+                    WHERE l.model = t.model AND l.res_id = t.res_id
+                    AND l.create_date > COALESCE(s.last_date, '-infinity')
+                ) >= %s
+            """,
+            (since, interval),
+        )
+        res_ids_by_model = defaultdict(list)
+        for model, res_id in self.env.cr.fetchall():
+            if model in self.env:
+                res_ids_by_model[model].append(res_id)
+        commit = not getattr(threading.current_thread(), "testing", False)
+        for model, res_ids in res_ids_by_model.items():
+            for index in range(0, len(res_ids), limit):
+                self._take_snapshots(model, res_ids[index:index + limit])
+                if commit:
+                    self.env.cr.commit()
+        Params.set_param("smile_audit.snapshot_last_run", watermark)
+        return True
+
+    @api.model
+    def _delete_snapshots_before(self, date):
+        """Drop the snapshots older than `date`, once the logs which follow
+        them up to that date are archived: they can no longer be replayed."""
+        self.flush_model()
+        self.env.cr.execute(
+            "DELETE FROM audit_log_snapshot WHERE snapshot_date < %s", (date,)
+        )
+        self.invalidate_model()
+        return self.env.cr.rowcount
+
+    @api.model
+    def _get_history_values(self, model, res_ids, history_date, strict):
+        """Return {res_id: values} of the records at `history_date`, logs
+        at that very date included unless `strict`.
+
+        Records with a snapshot before that date are rebuilt from it, by
+        applying the new values of the logs committed after it was read,
+        oldest first.
+        The others are rebuilt from their current state, by applying the
+        old values of the logs since that date, newest first."""
+        if not res_ids:
+            return {}
+        cr = self.env.cr
+        self.env["audit.log"].flush_model()
+        self.flush_model()
+        before = "<" if strict else "<="
+        cr.execute(
+            """
+                SELECT DISTINCT ON (res_id)
+                    res_id, snapshot_date, read_snapshot, data
+                FROM audit_log_snapshot
+                WHERE model = %%s AND res_id IN %%s AND snapshot_date %s %%s
+                ORDER BY res_id, snapshot_date DESC
+            """
+            % before,
+            (model, tuple(res_ids), history_date),
+        )
+        values, snapshots = {}, {}
+        for res_id, snapshot_date, read_snapshot, data in cr.fetchall():
+            values[res_id] = load_data(data or {})
+            snapshots[res_id] = (snapshot_date, read_snapshot)
+
+        if snapshots:
+            # the logs the snapshot did not see, whatever their date; the
+            # snapshots and logs older than read_snapshot compare dates
+            cr.execute(
+                """
+                    SELECT l.res_id, l.data FROM audit_log l
+                    JOIN unnest(%%s::int[], %%s::timestamp[], %%s::text[])
+                        AS s(res_id, snapshot_date, read_snapshot)
+                        ON s.res_id = l.res_id
+                    WHERE l.model = %%s
+                    AND CASE
+                        WHEN l.xact_id IS NULL OR s.read_snapshot IS NULL
+                        THEN l.create_date > s.snapshot_date
+                        ELSE NOT txid_visible_in_snapshot(
+                            l.xact_id, s.read_snapshot::txid_snapshot
+                        )
+                    END
+                    AND l.create_date %s %%s
+                    ORDER BY l.res_id, l.create_date, l.id
+                """
+                % before,
+                (
+                    list(snapshots),
+                    [date for date, dummy in snapshots.values()],
+                    [read for dummy, read in snapshots.values()],
+                    model,
+                    history_date,
+                ),
+            )
+            for res_id, data in cr.fetchall():
+                values[res_id].update(load_data(data or {}).get("new", {}))
+
+        others = [res_id for res_id in res_ids if res_id not in values]
+        if others:
+            cr.execute(
+                """
+                    SELECT res_id, data FROM audit_log
+                    WHERE model = %%s AND res_id IN %%s
+                    AND create_date %s %%s
+                    ORDER BY res_id, create_date DESC, id DESC
+                """
+                % (strict and ">=" or ">"),
+                (model, tuple(others), history_date),
+            )
+            for res_id, data in cr.fetchall():
+                values.setdefault(res_id, {}).update(
+                    load_data(data or {}).get("old", {})
+                )
+        return values
@@ -1,12 +1,16 @@
 import logging
-import os
+import random
 
-from odoo import api, fields, models, tools, _
+from odoo import api, fields, models, _
+from odoo.tools import sql
 
-from ..tools import audit_decorator
+from ..tools import audit_decorator, dump_data
 
 _logger = logging.getLogger(__package__)
 
+# rule index of the transaction which changed the rules, until it commits
+RULE_INDEX_KEY = "smile_audit.rule_index"
+
 
 class AuditRule(models.Model):
     _name = "audit.rule"
@@ -29,6 +33,37 @@ class AuditRule(models.Model):
     action_id = fields.Many2one(
         "ir.actions.act_window", "Add in the 'More' menu", readonly=True
     )
+    included_field_ids = fields.Many2many(
+        "ir.model.fields",
+        "audit_rule_included_field_rel",
+        "rule_id",
+        "field_id",
+        "Logged Fields",
+        domain="[('model_id', '=', model_id)]",
+        help="Only these fields are logged; all of them if empty.",
+    )
+    excluded_field_ids = fields.Many2many(
+        "ir.model.fields",
+        "audit_rule_excluded_field_rel",
+        "rule_id",
+        "field_id",
+        "Ignored Fields",
+        domain="[('model_id', '=', model_id)]",
+        help="These fields are never logged.",
+    )
+    coalesce_window = fields.Integer(
+        "Coalescing Window (s)",
+        default=0,
+        help="Updates of a same record by a same user are merged into "
+        "their update log of the last so many seconds, if any. "
+        "0 logs every update.",
+    )
+    sample_rate = fields.Float(
+        "Sampling Rate",
+        default=1.0,
+        help="Share of the updates which are logged, from 0 to 1. "
+        "Creations and deletions are always logged.",
+    )
 
     _sql_constraints = [
         (
@@ -37,6 +72,11 @@ class AuditRule(models.Model):
             "There is already a rule defined on this model and this group.\n"
             "You cannot define another: please edit the existing one.",
         ),
+        (
+            "sample_rate_check",
+            "CHECK(sample_rate > 0 AND sample_rate <= 1)",
+            "The sampling rate must be greater than 0 and at most 1.",
+        ),
     ]
 
     def _add_action(self):
@@ -75,40 +115,101 @@ class AuditRule(models.Model):
     _methods = ["create", "write", "unlink"]
 
     @api.model
-    @tools.ormcache()
-    def _check_audit_rule(self, group_ids):
-        schema = os.environ.get("PG_SCHEMA", "public")
+    def _build_rule_index(self):
+        """Return {model: {group id or None: {method: rule id}}} of the
+        active rules, the first rule winning for a same model and group"""
+        self.flush_model()
         self.env.cr.execute(
             """
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.tables
-                            WHERE table_schema = %s
-                            AND table_name = 'audit_rule'
-                        );
-                    """,
-            (schema,),
+                SELECT r.id, m.model, r.group_id,
+                       r.log_create, r.log_write, r.log_unlink
+                FROM audit_rule r
+                JOIN ir_model m ON m.id = r.model_id
+                WHERE r.active
+                ORDER BY r.id
+            """
         )
-        table_exists = self.env.cr.fetchone()[0]
-        if table_exists:
-            rules = self.sudo().search(
-                [
-                    "|",
-                    ("group_id", "=", False),
-                    ("group_id", "in", group_ids),
-                ]
+        index = {}
+        for rule_id, model, group_id, *logged in self.env.cr.fetchall():
+            index.setdefault(model, {}).setdefault(
+                group_id,
+                {
+                    method: rule_id
+                    for method, log in zip(self._methods, logged)
+                    if log
+                },
             )
-            return {
-                rule.model_id.model: {
-                    method.replace("_", ""): rule.id
-                    for method in self._methods
-                    if getattr(rule, "log_%s" % method.replace("_", ""))
-                }
-                for rule in rules
-            }
+        return index
+
+    @api.model
+    def _set_rule_index(self, index):
+        # the audited models let Base skip the lookup on all the others
+        self.pool._audit_rule_index = index
+        self.pool._audited_models = frozenset(index)
+
+    @api.model
+    def _get_rule_index(self):
+        index = self.env.cr.postcommit.data.get(RULE_INDEX_KEY)
+        if index is not None:
+            return index
+        index = getattr(self.pool, "_audit_rule_index", None)
+        if index is None:
+            # looked up before _register_hook, while the registry loads
+            if not sql.table_exists(self.env.cr, self._table):
+                return {}
+            index = self._build_rule_index()
+            self._set_rule_index(index)
+        return index
+
+    @api.model
+    def _update_rule_index(self):
+        """Rebuild the rule index after a change of the rules. The new index
+        applies to the current transaction, and replaces the one of the
+        registry once the transaction commits; a rollback discards it.
+        Other workers reload their registry to pick it up."""
+        index = self._build_rule_index()
+        postcommit = self.env.cr.postcommit
+        if RULE_INDEX_KEY not in postcommit.data:
+            if index == getattr(self.pool, "_audit_rule_index", None):
+                return
+            postcommit.add(self._publish_rule_index)
+        postcommit.data[RULE_INDEX_KEY] = index
+        self.pool.registry_invalidated = True
+
+    @api.model
+    def _publish_rule_index(self):
+        self._set_rule_index(self.env.cr.postcommit.data[RULE_INDEX_KEY])
+
+    @api.model
+    def _get_rules(self, model, group_ids):
+        """Return {method: rule id} of the rules of `model` applying to a
+        user of `group_ids`. The rules of the user groups replace the rule
+        for all users; when several groups have one, a method is logged if
+        any of them logs it."""
+        rules = self._get_rule_index().get(model)
+        if not rules:
+            return {}
+        group_ids = sorted(set(group_ids).intersection(rules))
+        if not group_ids:
+            return dict(rules.get(None, {}))
+        result = {}
+        for group_id in group_ids:
+            for method, rule_id in rules[group_id].items():
+                result.setdefault(method, rule_id)
+        return result
+
+    @api.model
+    def _check_audit_rule(self, group_ids):
+        return {
+            model: self._get_rules(model, group_ids)
+            for model in self._get_rule_index()
+        }
 
     @api.model
     def _register_hook(self, ids=None):  # noqa: CCR001
         self = self.sudo()
+        if not ids:
+            self._set_rule_index(self._build_rule_index())
         updated = False
         if ids:
             rules = self.browse(ids)
@@ -130,8 +231,6 @@ class AuditRule(models.Model):
                 else:
                     RecordModel._patch_method(method, audit_decorator(method))
             updated = bool(ids)
-        if updated:
-            self.env.registry.clear_cache()
         return updated
 
     @api.model_create_multi
@@ -142,6 +241,7 @@ class AuditRule(models.Model):
             rule.update_rule()
             if self._register_hook(rule.id):
                 self.pool.signal_changes()
+        self._update_rule_index()
         return rules
 
     def write(self, vals):
@@ -149,11 +249,14 @@ class AuditRule(models.Model):
         self.update_rule()
         if self._register_hook(self._ids):
             self.pool.signal_changes()
+        self._update_rule_index()
         return res
 
     def unlink(self):
         self.update_rule(force_deactivation=True)
-        return super(AuditRule, self).unlink()
+        res = super(AuditRule, self).unlink()
+        self._update_rule_index()
+        return res
 
     _ignored_fields = ["__last_update", "message_ids", "message_last_post"]
 
@@ -184,19 +287,182 @@ class AuditRule(models.Model):
                 del data[res_id]
         return data
 
+    # audit log entries are buffered per transaction, and inserted at commit
+    # or once the buffer holds this many entries
+    _log_flush_threshold = 1000
+    _log_buffer_key = "smile_audit.log_buffer"
+    # {(model, res_id, user id): index of its buffered update log}; the
+    # entries of the update logs whose changes cancelled out become None
+    _log_buffer_updates_key = "smile_audit.log_buffer_updates"
+
+    def _get_log_buffer(self):
+        precommit = self.env.cr.precommit
+        if self._log_buffer_key not in precommit.data:
+            # both are dropped on rollback or once the hooks have run
+            precommit.data[self._log_buffer_key] = []
+            precommit.data[self._log_buffer_updates_key] = {}
+            precommit.add(self._flush_logs_at_commit)
+        return precommit.data[self._log_buffer_key]
+
+    @api.model
+    def _flush_logs_at_commit(self):
+        # drop the buffer first: the changes audited by the precommit hooks
+        # running after this one start a new buffer, which adds this hook
+        # again
+        self._flush_logs()
+        precommit = self.env.cr.precommit
+        precommit.data.pop(self._log_buffer_key, None)
+        precommit.data.pop(self._log_buffer_updates_key, None)
+
+    @api.model
+    def _flush_logs(self):
+        buffer = self.env.cr.precommit.data.get(self._log_buffer_key)
+        if buffer:
+            entries = [entry for entry in buffer if entry]
+            if entries:
+                self.env["audit.log"].sudo()._create_logs(entries)
+            del buffer[:]
+            self.env.cr.precommit.data[self._log_buffer_updates_key].clear()
+
+    def _filter_fields(self, fnames):
+        """Return the names among `fnames` of the fields the rule logs"""
+        self.ensure_one()
+        rule = self.sudo()
+        if rule.included_field_ids:
+            included = set(rule.included_field_ids.mapped("name"))
+            fnames = [fname for fname in fnames if fname in included]
+        if rule.excluded_field_ids:
+            excluded = set(rule.excluded_field_ids.mapped("name"))
+            fnames = [fname for fname in fnames if fname not in excluded]
+        return fnames
+
+    def _is_sampled(self):
+        """Tell whether an update falls in the sample of logged ones"""
+        self.ensure_one()
+        return random.random() < self.sudo().sample_rate
+
+    @staticmethod
+    def _merge_data(older, newer):
+        """Merge the logged changes `newer` into `older`: the oldest value
+        and the newest one of each field, unless they are the same again"""
+        old = dict(newer["old"], **older["old"])
+        new = dict(older["new"], **newer["new"])
+        for fname in list(old):
+            if fname in new and old[fname] == new[fname]:
+                del old[fname], new[fname]
+        return {"old": old, "new": new}
+
+    def _coalesce_logs(self, data):
+        """Merge the changes of `data` into the update logs of the same
+        records and user within the coalescing window, and return the
+        changes of the other records. A log whose changes cancel out is
+        dropped. Logs a snapshot was taken after are left as they are: the
+        history replays the logs which follow a snapshot only."""
+        self.ensure_one()
+        model = self.sudo().model_id.model
+        precommit = self.env.cr.precommit
+        buffer = self._get_log_buffer()
+        buffered = precommit.data[self._log_buffer_updates_key]
+        for res_id in list(data):
+            key = (model, res_id, self._uid)
+            if key in buffered:
+                entry = buffer[buffered[key]]
+                merged = self._merge_data(entry[-1], data.pop(res_id))
+                if merged["old"] or merged["new"]:
+                    buffer[buffered[key]] = entry[:-1] + (merged,)
+                else:
+                    buffer[buffered.pop(key)] = None
+        if not data:
+            return data
+        # the update logs still buffered were merged above, the others are
+        # in the table
+        self.env.cr.execute(
+            """
+                SELECT DISTINCT ON (res_id) id
+                FROM audit_log l
+                WHERE model = %s AND res_id IN %s AND user_id = %s
+                AND method = 'write'
+                AND create_date >= (now() AT TIME ZONE 'UTC')
+                    - make_interval(secs => %s)
+                AND NOT EXISTS (
+                    SELECT 1 FROM audit_log_snapshot s
+                    WHERE s.model = l.model AND s.res_id = l.res_id
+                    AND s.snapshot_date >= l.create_date
+                )
+                ORDER BY res_id, create_date DESC, id DESC
+            """,
+            (model, tuple(data), self._uid, self.sudo().coalesce_window),
+        )
+        log_ids = tuple(row[0] for row in self.env.cr.fetchall())
+        if not log_ids:
+            return data
+        # concurrent updates of the same logs wait for each other
+        self.env.cr.execute(
+            "SELECT res_id, id, create_date, data FROM audit_log "
+            "WHERE id IN %s FOR UPDATE",
+            (log_ids,),
+        )
+        values, emptied = [], []
+        for res_id, log_id, create_date, logged in self.env.cr.fetchall():
+            merged = self._merge_data(logged, data.pop(res_id))
+            if merged["old"] or merged["new"]:
+                values.append((log_id, create_date, merged))
+            else:
+                emptied.append((log_id, create_date))
+        AuditLog = self.env["audit.log"].sudo()
+        if values:
+            AuditLog._update_logs(values)
+        if emptied:
+            AuditLog._delete_logs(emptied)
+        return data
+
     def log(self, method, old_values=None, new_values=None):
         self.ensure_one()
         if old_values or new_values:
             data = self._format_data_to_log(old_values, new_values)
-            AuditLog = self.env["audit.log"].sudo()
-            for res_id in data:
-                AuditLog.create(
-                    {
-                        "user_id": self._uid,
-                        "model_id": self.sudo().model_id.id,
-                        "res_id": res_id,
-                        "method": method,
-                        "data": repr(data[res_id]),
-                    }
+            fnames = set()
+            for changes in data.values():
+                fnames.update(changes["old"], changes["new"])
+            logged = set(self._filter_fields(list(fnames)))
+            for res_id in list(data):
+                changes = data[res_id]
+                for age in ("old", "new"):
+                    changes[age] = dump_data(
+                        {
+                            fname: value
+                            for fname, value in changes[age].items()
+                            if fname in logged
+                        }
+                    )
+                if not (changes["old"] or changes["new"]):
+                    del data[res_id]
+            if data and method == "write" and self.sudo().coalesce_window:
+                data = self._coalesce_logs(data)
+            if data:
+                model = self.sudo().model_id
+                names = self.env["audit.log"]._get_resource_names(
+                    model.model, data
                 )
+                buffer = self._get_log_buffer()
+                buffered = self.env.cr.precommit.data[
+                    self._log_buffer_updates_key
+                ]
+                for res_id in data:
+                    if method == "write":
+                        buffered[(model.model, res_id, self._uid)] = len(
+                            buffer
+                        )
+                    buffer.append(
+                        (
+                            self._uid,
+                            model.id,
+                            model.model,
+                            res_id,
+                            names.get(res_id),
+                            method,
+                            data[res_id],
+                        )
+                    )
+                if len(buffer) >= self._log_flush_threshold:
+                    self._flush_logs()
         return True
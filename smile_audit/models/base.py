@@ -1,5 +1,6 @@
 from odoo import api, fields, models
-from odoo.tools.safe_eval import datetime, safe_eval
+
+from .audit_rule import RULE_INDEX_KEY
 
 
 class Base(models.AbstractModel):
@@ -7,37 +8,34 @@ class Base(models.AbstractModel):
 
     def _fetch_query(self, query, field_names):  # noqa: CCR001
         result = super()._fetch_query(query, field_names)
-        if self.env.context.get("history_revision"):
-            group_ids = self.env.user.groups_id.ids
+        if self.env.context.get("history_revision") and self._is_audited():
             audit_rules = (
                 self.env["audit.rule"]
                 .sudo()
-                ._check_audit_rule(group_ids)
-                .get(self._name, {})
+                ._get_rules(self._name, self.env.user.groups_id.ids)
             )
             if audit_rules:
                 history_date = fields.Datetime.from_string(
                     self.env.context.get("history_revision")
                 )
-                date_operator = audit_rules.get("create") and ">" or ">="
-                domain = [
-                    ("model", "=", self._name),
-                    ("res_id", "in", self.ids),
-                    ("create_date", date_operator, history_date),
-                ]
-                logs = (
-                    self.env["audit.log"]
+                history_values = (
+                    self.env["audit.log.snapshot"]
                     .sudo()
-                    .search(domain, order="create_date desc")
+                    ._get_history_values(
+                        self._name,
+                        self.ids,
+                        history_date,
+                        strict=not audit_rules.get("create"),
+                    )
                 )
                 for record in self:
-                    vals = {}
-                    for log in logs:
-                        if log.res_id == record.id:
-                            data = safe_eval(
-                                log.data or "{}", {"datetime": datetime}
-                            )
-                            vals.update(data.get("old", {}))
+                    vals = {
+                        fname: value
+                        for fname, value in history_values.get(
+                            record.id, {}
+                        ).items()
+                        if fname in self._fields
+                    }
                     if "message_ids" in self._fields:
                         vals["message_ids"] = record.message_ids.filtered(
                             lambda msg: msg.date <= history_date
@@ -57,16 +55,27 @@ class Base(models.AbstractModel):
                 res[field]["readonly"] = True
         return res
 
+    @api.model
+    def _is_audited(self):
+        """Cheap pre-check done before any rule lookup: False if no active
+        audit rule targets this model, whatever the user groups."""
+        index = self.env.cr.postcommit.data.get(RULE_INDEX_KEY)
+        if index is not None:
+            # the rules were changed by the current transaction
+            return self._name in index
+        audited_models = getattr(self.env.registry, "_audited_models", None)
+        # not computed yet while the registry loads: assume audited
+        return audited_models is None or self._name in audited_models
+
     @api.model
     def _get_audit_rule(self, method):
+        if not self._is_audited():
+            return None
         AuditRule = self.env["audit.rule"]
-        group_ids = self.env.user.groups_id.ids
-        rule_id = AuditRule._check_audit_rule(group_ids)
-        return (
-            AuditRule.browse(rule_id.get(self._name, {}).get(method))
-            if rule_id
-            else None
-        )
+        rule_id = AuditRule._get_rules(
+            self._name, self.env.user.groups_id.ids
+        ).get(method)
+        return AuditRule.browse(rule_id) if rule_id else None
 
     @api.model_create_multi
     def create(self, vals_list):
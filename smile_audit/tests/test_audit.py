@@ -1,5 +1,14 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import fields
 from odoo.tests.common import TransactionCase
 
+from ..models.audit_log import PARTITION_NAME
+
 
 class TestAudit(TransactionCase):
 
@@ -60,3 +69,366 @@ class TestAudit(TransactionCase):
         self.assertEqual(
             log.name, "La Terre du milieu", "No audit log after country unlink"
         )
+
+    def test_audited_models(self):
+        """The audited models are known without looking up the rules; the
+        registry only learns the rules of a transaction once it commits"""
+        self.assertTrue(self.env["res.country"]._is_audited())
+        self.assertNotIn(
+            "res.country", self.env.registry._audited_models or ()
+        )
+
+    def test_log_only_written_fields(self):
+        """Only the written fields are read for the log of an update"""
+        self.country.write({"name": "Mordor"})
+        log = self.env["audit.log"].search(
+            [
+                ("model_id", "=", self.env.ref("base.model_res_country").id),
+                ("method", "=", "write"),
+                ("res_id", "=", self.country.id),
+            ]
+        )
+        self.assertIn("name", log.data["new"])
+        self.assertNotIn("code", log.data["new"])
+
+    def test_logs_flushed_in_batch(self):
+        """Logs of a bulk update are buffered, then all inserted"""
+        countries = self.country | self.env["res.country"].create(
+            [{"name": "Gondor", "code": "GDR"}, {"name": "Rohan", "code": "RHN"}]
+        )
+        countries.write({"phone_code": 42})
+        buffer = self.env.cr.precommit.data.get("smile_audit.log_buffer")
+        self.assertTrue(buffer, "Logs are not buffered until commit")
+        logs = self.env["audit.log"].search(
+            [
+                ("model_id", "=", self.env.ref("base.model_res_country").id),
+                ("method", "=", "write"),
+                ("res_id", "in", countries.ids),
+            ]
+        )
+        self.assertEqual(len(logs), 3, "Buffered logs are not inserted")
+        self.assertFalse(buffer, "Inserted logs are still buffered")
+
+    def test_logs_of_precommit_hooks_inserted(self):
+        """Changes audited by a precommit hook running after the logs were
+        flushed are logged too"""
+        self.country.write({"name": "Mordor"})
+        precommit = self.env.cr.precommit
+        precommit.add(lambda: self.country.write({"name": "Rivendell"}))
+        precommit.run()
+        logs = self.env["audit.log"].search(
+            [
+                ("model_id", "=", self.env.ref("base.model_res_country").id),
+                ("method", "=", "write"),
+                ("res_id", "=", self.country.id),
+            ]
+        )
+        self.assertTrue(
+            any("Rivendell" in str(log.data["new"]) for log in logs),
+            "The logs of a precommit hook are lost",
+        )
+
+    def test_search_changed_field(self):
+        """Logs can be searched by changed field"""
+        self.country.write({"name": "Mordor"})
+        logs = self.env["audit.log"].search(
+            [("changed_field", "=", "name"), ("res_id", "=", self.country.id)]
+        )
+        self.assertEqual(set(logs.mapped("method")), {"create", "write"})
+        logs = self.env["audit.log"].search(
+            [
+                ("changed_field", "=", "phone_code"),
+                ("res_id", "=", self.country.id),
+                ("method", "=", "write"),
+            ]
+        )
+        self.assertFalse(logs)
+
+    def test_log_rendered_in_batch(self):
+        """The changes of several logs are rendered with their names"""
+        self.country.write({"name": "Mordor"})
+        logs = self.env["audit.log"].search(
+            [
+                ("model_id", "=", self.env.ref("base.model_res_country").id),
+                ("res_id", "=", self.country.id),
+            ]
+        )
+        self.assertEqual(len(logs), 2)
+        logs.invalidate_recordset(["data_html", "name"])
+        self.assertEqual(set(logs.mapped("name")), {"Mordor"})
+        write_log = logs.filtered(lambda log: log.method == "write")
+        self.assertIn("La Terre du milieu", write_log.data_html)
+        self.assertIn("Mordor", write_log.data_html)
+
+    def test_search_log_by_name(self):
+        """Logs can be searched by the name of their resource"""
+        logs = self.env["audit.log"].search(
+            [("name", "ilike", "terre du mil")]
+        )
+        self.assertIn(self.country.id, logs.mapped("res_id"))
+        self.assertEqual(logs[0].resource_name, "La Terre du milieu")
+
+    def test_history_revision_from_snapshot(self):
+        """A past state is rebuilt from the nearest snapshot before it, or
+        from the current state without one"""
+        self.country.write({"name": "Mordor"})
+        AuditLog = self.env["audit.log"]
+        AuditLog.flush_model()
+        dates = (("create", "2020-01-01"), ("write", "2022-01-01"))
+        for method, date in dates:
+            self.env.cr.execute(
+                "UPDATE audit_log SET create_date = %s "
+                "WHERE model = 'res.country' AND res_id = %s AND method = %s",
+                (date, self.country.id, method),
+            )
+        self.env["audit.log.snapshot"]._cron_take_snapshots(interval=1)
+        snapshot = self.env["audit.log.snapshot"].search(
+            [("model", "=", "res.country"), ("res_id", "=", self.country.id)]
+        )
+        self.assertEqual(len(snapshot), 1, "No snapshot taken")
+        self.country.write({"name": "Gondor"})
+
+        for date, name in (
+            ("2023-01-01 00:00:00", "Mordor"),
+            ("2021-01-01 00:00:00", "La Terre du milieu"),
+        ):
+            self.env.invalidate_all()
+            country = self.country.with_context(history_revision=date)
+            self.assertEqual(country.name, name)
+
+    def test_history_revision_after_late_commit(self):
+        """A change committed after a snapshot is replayed, even when its
+        transaction, and so its log, is dated before the snapshot"""
+        self.country.write({"name": "Mordor"})
+        AuditLog = self.env["audit.log"]
+        AuditLog.flush_model()
+        Snapshot = self.env["audit.log.snapshot"]
+        Snapshot._cron_take_snapshots(interval=1)
+        snapshot = Snapshot.search(
+            [("model", "=", "res.country"), ("res_id", "=", self.country.id)]
+        )
+        self.assertEqual(len(snapshot), 1, "No snapshot taken")
+        self.assertTrue(snapshot.read_snapshot)
+        # the snapshot saw the transactions before 1000 only
+        self.env.cr.execute(
+            "UPDATE audit_log SET xact_id = 1 "
+            "WHERE model = 'res.country' AND res_id = %s",
+            (self.country.id,),
+        )
+        self.env.cr.execute(
+            "UPDATE audit_log_snapshot SET read_snapshot = '1000:1000:' "
+            "WHERE id = %s",
+            (snapshot.id,),
+        )
+        self.country.write({"name": "Gondor"})
+        AuditLog.flush_model()
+        self.env.cr.execute(
+            """
+                UPDATE audit_log
+                SET xact_id = 1000, create_date = %s - interval '1 minute'
+                WHERE id = (
+                    SELECT max(id) FROM audit_log
+                    WHERE model = 'res.country' AND res_id = %s
+                )
+            """,
+            (snapshot.snapshot_date, self.country.id),
+        )
+        self.env.invalidate_all()
+        country = self.country.with_context(
+            history_revision=fields.Datetime.to_string(fields.Datetime.now())
+        )
+        self.assertEqual(country.name, "Gondor")
+
+    def test_group_specific_rule(self):
+        """The rule of a user group replaces the rule for all users"""
+        group = self.env.ref("base.group_system")
+        self.env["audit.rule"].create(
+            {
+                "name": "Audit rule on countries for admins",
+                "model_id": self.env.ref("base.model_res_country").id,
+                "group_id": group.id,
+                "log_write": False,
+            }
+        )
+        AuditRule = self.env["audit.rule"]
+        self.assertIn("write", AuditRule._get_rules("res.country", []))
+        rules = AuditRule._get_rules("res.country", group.ids)
+        self.assertNotIn("write", rules)
+        self.assertIn("unlink", rules)
+
+    def test_rule_field_filter_and_coalescing(self):
+        """Ignored fields are not logged, and updates within the coalescing
+        window are merged into one log"""
+        rule = self.env["audit.rule"].search(
+            [("model_id", "=", self.env.ref("base.model_res_country").id)]
+        )
+        rule.write(
+            {
+                "excluded_field_ids": [
+                    (6, 0, self.env.ref("base.field_res_country__code").ids)
+                ],
+                "coalesce_window": 60,
+            }
+        )
+        self.country.write({"name": "Mordor", "code": "MDR"})
+        self.country.write({"name": "Gondor"})
+        log = self.env["audit.log"].search(
+            [
+                ("model_id", "=", self.env.ref("base.model_res_country").id),
+                ("method", "=", "write"),
+                ("res_id", "=", self.country.id),
+            ]
+        )
+        self.assertEqual(len(log), 1, "Updates are not coalesced")
+        self.assertEqual(log.data["old"], {"name": "La Terre du milieu"})
+        self.assertEqual(log.data["new"], {"name": "Gondor"})
+
+    def _get_write_logs(self):
+        return self.env["audit.log"].search(
+            [
+                ("model_id", "=", self.env.ref("base.model_res_country").id),
+                ("method", "=", "write"),
+                ("res_id", "=", self.country.id),
+            ]
+        )
+
+    def test_rule_coalescing_in_table(self):
+        """Updates are merged into an inserted log of the window, unless a
+        snapshot follows it, and a log whose changes cancel out is dropped"""
+        rule = self.env["audit.rule"].search(
+            [("model_id", "=", self.env.ref("base.model_res_country").id)]
+        )
+        rule.coalesce_window = 60
+        AuditLog = self.env["audit.log"]
+        self.country.write({"name": "Mordor"})
+        AuditLog.flush_model()
+        self.country.write({"name": "Gondor"})
+        log = self._get_write_logs()
+        self.assertEqual(len(log), 1, "Updates are not coalesced")
+        self.assertEqual(log.data["old"], {"name": "La Terre du milieu"})
+        self.assertEqual(log.data["new"], {"name": "Gondor"})
+
+        self.country.write({"name": "La Terre du milieu"})
+        self.assertFalse(self._get_write_logs(), "Empty log is kept")
+
+        self.country.write({"name": "Mordor"})
+        AuditLog.flush_model()
+        self.env["audit.log.snapshot"]._take_snapshots(
+            "res.country", self.country.ids
+        )
+        self.country.write({"name": "Gondor"})
+        self.assertEqual(
+            len(self._get_write_logs()), 2, "Snapshotted log is updated"
+        )
+
+    def test_rule_included_fields(self):
+        """Only the included fields of a rule are logged"""
+        rule = self.env["audit.rule"].search(
+            [("model_id", "=", self.env.ref("base.model_res_country").id)]
+        )
+        rule.included_field_ids = self.env.ref(
+            "base.field_res_country__name"
+        )
+        self.country.write({"name": "Mordor", "phone_code": 42})
+        log = self._get_write_logs()
+        self.assertEqual(log.data["new"], {"name": "Mordor"})
+        self.country.write({"phone_code": 43})
+        self.assertEqual(self._get_write_logs(), log)
+
+    def test_rule_sample_rate(self):
+        """Only the sampled share of the updates is logged"""
+        rule = self.env["audit.rule"].search(
+            [("model_id", "=", self.env.ref("base.model_res_country").id)]
+        )
+        rule.sample_rate = 0.1
+        with patch(
+            "odoo.addons.smile_audit.models.audit_rule.random.random",
+            return_value=0.5,
+        ):
+            self.country.write({"name": "Mordor"})
+        self.assertFalse(self._get_write_logs(), "Unsampled update logged")
+        with patch(
+            "odoo.addons.smile_audit.models.audit_rule.random.random",
+            return_value=0.05,
+        ):
+            self.country.write({"name": "Gondor"})
+        self.assertEqual(len(self._get_write_logs()), 1)
+
+    def test_partitions_created_and_archived(self):
+        """Logs stuck in the default partition move to their month once it
+        is created, and months past the retention are archived"""
+        AuditLog = self.env["audit.log"]
+        self.country.write({"name": "Mordor"})
+        AuditLog.flush_model()
+        now = fields.Datetime.now()
+        past, future = now - relativedelta(months=6), now + relativedelta(
+            months=12
+        )
+        AuditLog._create_partitions(past)
+
+        def move_log(method, date):
+            self.env.cr.execute(
+                "UPDATE audit_log SET create_date = %s "
+                "WHERE model = 'res.country' AND res_id = %s AND method = %s "
+                "RETURNING tableoid::regclass::text",
+                (date, self.country.id, method),
+            )
+            return self.env.cr.fetchone()[0]
+
+        self.assertEqual(
+            move_log("create", past), past.strftime(PARTITION_NAME)
+        )
+        self.assertEqual(move_log("write", future), "audit_log_default")
+        AuditLog._create_partitions(now, months_ahead=12)
+        self.env.cr.execute(
+            "SELECT tableoid::regclass::text FROM audit_log "
+            "WHERE model = 'res.country' AND res_id = %s AND method = 'write'",
+            (self.country.id,),
+        )
+        self.assertEqual(
+            self.env.cr.fetchone()[0], future.strftime(PARTITION_NAME)
+        )
+
+        # no monthly partition covers that far back
+        stray = self.env["res.country"].create({"name": "Numenor"})
+        AuditLog.flush_model()
+        self.env.cr.execute(
+            "UPDATE audit_log SET create_date = %s "
+            "WHERE model = 'res.country' AND res_id = %s "
+            "RETURNING tableoid::regclass::text",
+            (now - relativedelta(years=10), stray.id),
+        )
+        self.assertEqual(self.env.cr.fetchone()[0], "audit_log_default")
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        Params = self.env["ir.config_parameter"].sudo()
+        Params.set_param("smile_audit.log_archive_path", directory.name)
+        Params.set_param("smile_audit.log_retention_months", 1)
+        AuditLog._cron_manage_partitions()
+        partitions = [name for name, dummy in AuditLog._get_partitions()]
+        self.assertNotIn(past.strftime(PARTITION_NAME), partitions)
+        self.assertIn(now.strftime(PARTITION_NAME), partitions)
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(
+                    directory.name, past.strftime(PARTITION_NAME) + ".csv.gz"
+                )
+            )
+        )
+        logs = AuditLog.search(
+            [("model", "=", "res.country"), ("res_id", "=", self.country.id)]
+        )
+        self.assertEqual(logs.mapped("method"), ["write"])
+        self.assertFalse(
+            AuditLog.search(
+                [("model", "=", "res.country"), ("res_id", "=", stray.id)]
+            ),
+            "Old logs of the default partition are not archived",
+        )
+        self.assertTrue(
+            any(
+                name.startswith("audit_log_default_")
+                for name in os.listdir(directory.name)
+            )
+        )
@@ -0,0 +1,49 @@
+from unittest.mock import PropertyMock, patch
+
+from odoo.tests.common import TransactionCase
+
+
+class TestAuditPerformance(TransactionCase):
+
+    def setUp(self):
+        super(TestAuditPerformance, self).setUp()
+        self.partner = self.env["res.partner"].create({"name": "Bilbo"})
+        if self.env["res.partner"]._is_audited():
+            self.skipTest("res.partner is audited in this database")
+
+    def test_unaudited_rule_lookup_without_query(self):
+        """No query is done to look up the rule of an unaudited model"""
+        with self.assertQueryCount(0):
+            for method in ("create", "write", "unlink"):
+                self.assertIsNone(self.partner._get_audit_rule(method))
+
+    def _write_query_count(self, comment):
+        self.partner.invalidate_recordset()
+        count = self.env.cr.sql_log_count
+        self.partner.write({"comment": comment})
+        self.partner.flush_recordset()
+        return self.env.cr.sql_log_count - count
+
+    def test_unaudited_write_fast_path(self):
+        """A write on an unaudited model does not look up the audit rules
+        and costs no query over a write skipping the audit check"""
+        self._write_query_count("warm up")
+        AuditRule = type(self.env["audit.rule"])
+        with patch.object(AuditRule, "_get_rules") as get_rules:
+            audited = self._write_query_count("There and back again")
+        get_rules.assert_not_called()
+        with patch.object(
+            type(self.partner), "_get_audit_rule", return_value=None
+        ):
+            unaudited = self._write_query_count("The Lonely Mountain")
+        self.assertEqual(audited, unaudited)
+
+    def test_unaudited_rule_lookup_without_groups(self):
+        """The user groups are not read to look up the rule of an unaudited
+        model"""
+        with patch.object(
+            type(self.env.user), "groups_id", new_callable=PropertyMock
+        ) as groups_id:
+            for method in ("create", "write", "unlink"):
+                self.assertIsNone(self.partner._get_audit_rule(method))
+        groups_id.assert_not_called()
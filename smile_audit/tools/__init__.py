@@ -1,4 +1,5 @@
 from .decorator import audit_decorator
+from .json_data import dump_data, load_data
 
 from odoo import models, api
 
@@ -14,11 +14,21 @@ def audit_decorator(method):  # noqa: CCR001
             elif type(values[key]) is dict:
                 update_type_defaultdict(values[key])
 
-    def get_new_values(self):
+    def get_audited_fields(self, vals):
+        # the written fields, and the stored fields of the model computed
+        # from them: the rest of the record cannot change
+        fnames = {fname for fname in vals if fname in self._fields}
+        for fname in list(fnames):
+            for field in self.pool.get_dependent_fields(self._fields[fname]):
+                if field.model_name == self._name and field.store:
+                    fnames.add(field.name)
+        return sorted(fnames)
+
+    def get_new_values(self, fnames):
         new_values = []
         for record in self:
-            vals = {}
-            for fname in self._fields:
+            vals = {"id": record.id}
+            for fname in fnames:
                 vals[fname] = self._fields[fname].convert_to_read(
                     record[fname], record, use_display_name=True
                 )
@@ -52,14 +62,20 @@ def audit_decorator(method):  # noqa: CCR001
             and self.ids != self._context.get("audit_rec_ids")
         ):
             rule = self._get_audit_rule("write")
+        if rule and not rule._is_sampled():
+            rule = None
+        if rule:
+            fnames = rule._filter_fields(get_audited_fields(self, vals))
+            if not fnames:
+                rule = None
         if rule:
-            old_values = self.sudo().read(load="_classic_write")
+            old_values = self.sudo().read(fnames, load="_classic_write")
         result = audit_write.origin(self, vals)
         if rule:
             if audit_write.origin.__name__ == "_write":
-                new_values = get_new_values(self)
+                new_values = get_new_values(self, fnames)
             else:
-                new_values = self.sudo().read(load="_classic_write")
+                new_values = self.sudo().read(fnames, load="_classic_write")
             if new_values:
                 keys = new_values[0].keys()
                 for key in keys:
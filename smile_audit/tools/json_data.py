@@ -0,0 +1,48 @@
+import base64
+from collections import defaultdict
+import datetime
+
+from markupsafe import Markup
+
+from odoo import fields
+
+# JSON has no date, datetime nor markup: such values are stored as
+# {"__type__": <type>, "value": <string>} and restored when loaded
+TYPE_KEY = "__type__"
+
+
+def dump_data(value):
+    """Convert audited values into plain JSON types"""
+    if isinstance(value, datetime.datetime):
+        return {TYPE_KEY: "datetime", "value": fields.Datetime.to_string(value)}
+    if isinstance(value, datetime.date):
+        return {TYPE_KEY: "date", "value": fields.Date.to_string(value)}
+    if isinstance(value, Markup):
+        return {TYPE_KEY: "markup", "value": str(value)}
+    if isinstance(value, bytes):
+        return {TYPE_KEY: "bytes", "value": base64.b64encode(value).decode()}
+    if isinstance(value, (dict, defaultdict)):
+        return {str(key): dump_data(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [dump_data(val) for val in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def load_data(value):
+    """Restore the values converted by dump_data"""
+    if isinstance(value, dict):
+        value_type = value.get(TYPE_KEY)
+        if value_type == "datetime":
+            return fields.Datetime.to_datetime(value["value"])
+        if value_type == "date":
+            return fields.Date.to_date(value["value"])
+        if value_type == "markup":
+            return Markup(value["value"])
+        if value_type == "bytes":
+            return base64.b64decode(value["value"])
+        return {key: load_data(val) for key, val in value.items()}
+    if isinstance(value, list):
+        return [load_data(val) for val in value]
+    return value